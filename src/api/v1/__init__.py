@@ -4,6 +4,7 @@ from .auth import router as auth_router
 from .books import router as books_router
 from .readers import router as readers_router
 from .library import router as library_router
+from .tech import router as tech_router
 
 from src.core.settings import settings
 
@@ -33,3 +34,9 @@ router.include_router(
     prefix=settings.tags.LIBRARY_PREFIX,
     tags=[settings.tags.LIBRARY_TAG]
 )
+
+router.include_router(
+    tech_router,
+    prefix=settings.tags.TECH_PREFIX,
+    tags=[settings.tags.TECH_TAG]
+)
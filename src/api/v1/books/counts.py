@@ -0,0 +1,13 @@
+from src.core.cache import ModelQueryCache
+from src.core.config import CacheConfigurer
+from src.core.models import Book
+from src.core.settings import settings
+
+
+#  Точные X-Total-Count списка книг по подписи фильтра: живут CACHE_COUNT_TTL секунд и сбрасываются изменениями
+counts_cache = ModelQueryCache(
+    model=Book,
+    cache=CacheConfigurer.entities,
+    ttl=settings.cache.CACHE_COUNT_TTL,
+    max_size=settings.cache.CACHE_COUNT_MAX_SIZE,
+)
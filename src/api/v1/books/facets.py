@@ -0,0 +1,13 @@
+from src.core.cache import ModelQueryCache
+from src.core.config import CacheConfigurer
+from src.core.models import Book
+from src.core.settings import settings
+
+
+#  Счетчики GET /books/facets по подписи фильтра: сбрасываются любым изменением книги, у каждого воркера свои
+facets_cache = ModelQueryCache(
+    model=Book,
+    cache=CacheConfigurer.entities,
+    ttl=settings.book.BOOKS_FACETS_CACHE_TTL,
+    max_size=settings.book.BOOKS_FACETS_CACHE_MAX_SIZE,
+)
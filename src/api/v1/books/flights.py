@@ -0,0 +1,11 @@
+from src.core.cache import SingleFlight
+from src.core.config import CacheConfigurer
+from src.core.models import Book
+
+
+#  Одновременные GET /books/{id}/full одной книги (с одним history_limit) выполняют одно чтение и получают общий результат
+full_flight = SingleFlight("books_full")
+
+
+def get_flight_key(id: int, history_limit: int) -> str:
+    return "%s:%s" % (CacheConfigurer.entities.get_flight_key(CacheConfigurer.entities.get_key(Book, id)), history_limit)
@@ -1,16 +1,26 @@
 import logging
 
 from fastapi import status
-from typing import TYPE_CHECKING, Union, Optional
+from typing import TYPE_CHECKING, Any, AsyncIterator, Union, Optional, Sequence
 
-from sqlalchemy import select, Result
+from sqlalchemy import (
+    select, update, func, cast, or_, and_, any_, tuple_, bindparam, literal_column, Result, Select,
+    case, Table, Column, MetaData, Integer, String,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, REGCONFIG, insert
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import joinedload
 
-from src.core.models import Book
+from src.core.models import Book, BorrowedBook, Reader
+from src.core.cache import PrefixIndex
+from src.core.config import CacheConfigurer
+from src.core.settings import settings
+from src.tools.data_loader import DataLoader
+from src.tools.etag import ETag
 from src.tools.exceptions import CustomException
+from src.tools.total_count import TotalCount
 from .exceptions import Errors
+from .suggestions import suggestions
 
 if TYPE_CHECKING:
     from .schemas import (
@@ -21,8 +31,41 @@ if TYPE_CHECKING:
 
 CLASS = "Book"
 
+#  Промежуточная таблица импорта: временная, своя у соединения, удаляется при COMMIT. Не входит в метаданные моделей
+IMPORT_TABLE = Table(
+    "pat_book_import",
+    MetaData(),
+    Column("line", Integer),
+    Column("name", String),
+    Column("author", String),
+    Column("description", String),
+    Column("published_at", Integer),
+    Column("isbn", String),
+    Column("quantity", Integer),
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="DROP",
+)
+
 
 class BookRepository:
+    #  Колонки списков: читаются Core-запросом в легкие Row (кортежи с доступом по имени) без сборки
+    # ORM-объектов и регистрации их в identity map
+    LIST_COLUMNS = (Book.id, Book.name, Book.author, Book.description, Book.published_at, Book.isbn, Book.quantity, Book.updated_at)
+    #  Служебные колонки читаются при любом fields=: по ним строятся курсор и ETag страницы
+    REQUIRED_COLUMNS = ("id", "updated_at")
+    #  Сортировки списка: колонка и направление. Вторым ключом всегда идет id по возрастанию - порядок однозначен,
+    # keyset-курсор - пара (значение, id). Каждую сортировку обслуживает составной индекс (колонка, id)
+    SORTS = {
+        "name": (Book.name, False),
+        "author": (Book.author, False),
+        "published_at": (Book.published_at, False),
+        "-quantity": (Book.quantity, True),
+    }
+    #  Значения GROUPING(author, decade, available) для наборов группировки фасетов: бит 1 - колонка свернута
+    FACET_GROUPINGS = {"author": 0b011, "decade": 0b101, "available": 0b110}
+    FACET_NAMES = {grouping: facet for facet, grouping in FACET_GROUPINGS.items()}
+    FACET_TOTAL = 0b111
+
     def __init__(
             self,
             session: AsyncSession,
@@ -30,30 +73,251 @@ class BookRepository:
         self.session = session
         self.logger = logging.getLogger(__name__)
 
+    @staticmethod
+    def paginate(
+            stmt: Select,
+            page: Optional[int] = 1,
+            size: Optional[int] = 10,
+            after_id: Optional[int] = None,
+    ) -> Select:
+        #  Keyset-режим: страница начинается сразу за последним id предыдущей страницы,
+        # без OFFSET и чтения всех предшествующих строк
+        if after_id is not None:
+            return stmt.where(Book.id > after_id).order_by(Book.id).limit(size)
+        return stmt.order_by(Book.id).offset((page - 1) * size).limit(size)
+
+    @classmethod
+    def sort(
+            cls,
+            stmt: Select,
+            sort: str,
+            page: Optional[int] = 1,
+            size: Optional[int] = 10,
+            after: Optional[Sequence] = None,
+    ) -> Select:
+        column, descending = cls.SORTS[sort]
+        if descending:
+            #  По убыванию идут и колонка, и id: индекс (колонка, id) обходится в обратном порядке, и сравнение
+            # строк (колонка, id) < (значение, id) - такая же граница диапазона, как при сортировке по возрастанию
+            stmt = stmt.order_by(column.desc(), Book.id.desc()).limit(size)
+        else:
+            stmt = stmt.order_by(column, Book.id).limit(size)
+        if after is None:
+            return stmt.offset((page - 1) * size)
+        after_value, after_id = after
+        if after_value is None:
+            #  NULL при сортировке по возрастанию идут последними: дальше - только NULL с большим id
+            return stmt.where(column.is_(None), Book.id > after_id)
+        if descending:
+            return stmt.where(tuple_(column, Book.id) < tuple_(after_value, after_id))
+        #  Сравнение строк (колонка, id) > (значение, id) - граница диапазона в индексе (колонка, id)
+        return stmt.where(tuple_(column, Book.id) > tuple_(after_value, after_id))
+
+    @staticmethod
+    def filter(
+            stmt: Select,
+            author: Optional[str] = None,
+            published_from: Optional[int] = None,
+            published_to: Optional[int] = None,
+            available: Optional[bool] = None,
+    ) -> Select:
+        if author is not None:
+            stmt = stmt.where(Book.author == author)
+        if published_from is not None:
+            stmt = stmt.where(Book.published_at >= published_from)
+        if published_to is not None:
+            stmt = stmt.where(Book.published_at <= published_to)
+        if available is not None:
+            stmt = stmt.where(Book.quantity > 0 if available else Book.quantity == 0)
+        return stmt
+
+    @classmethod
+    def get_columns(
+            cls,
+            fields: Optional[Sequence[str]] = None,
+    ) -> tuple:
+        #  Sparse fieldsets: SELECT только запрошенных колонок (самая крупная - description) и служебных
+        if fields is None:
+            return cls.LIST_COLUMNS
+        return tuple(
+            column for column in cls.LIST_COLUMNS
+            if column.key in fields or column.key in cls.REQUIRED_COLUMNS
+        )
+
+    def get_all_stmt(
+            self,
+            page: Optional[int] = 1,
+            size: Optional[int] = 10,
+            after_id: Optional[int] = None,
+            fields: Optional[Sequence[str]] = None,
+            sort: Optional[str] = None,
+            after: Optional[Sequence] = None,
+            **filters,
+    ) -> Select:
+        columns = self.get_columns(fields)
+        if sort is None:
+            return self.paginate(self.filter(select(*columns), **filters), page=page, size=size, after_id=after_id)
+        #  Колонка сортировки читается всегда: ее значение последней строки попадает в курсор
+        sort_column, _ = self.SORTS[sort]
+        if sort_column.key not in {column.key for column in columns}:
+            columns = (*columns, sort_column)
+        return self.sort(self.filter(select(*columns), **filters), sort=sort, page=page, size=size, after=after)
+
     async def get_all(
             self,
             page: Optional[int] = 1,
             size: Optional[int] = 10,
+            after_id: Optional[int] = None,
+            fields: Optional[Sequence[str]] = None,
+            sort: Optional[str] = None,
+            after: Optional[Sequence] = None,
+            author: Optional[str] = None,
+            published_from: Optional[int] = None,
+            published_to: Optional[int] = None,
+            available: Optional[bool] = None,
     ):
-        stmt = select(Book).order_by(Book.id).offset((page - 1) * size).limit(size)
+        filters = dict(author=author, published_from=published_from, published_to=published_to, available=available)
+        stmt = self.get_all_stmt(page=page, size=size, after_id=after_id, fields=fields, sort=sort, after=after, **filters)
         result: Result = await self.session.execute(stmt)
-        return result.unique().scalars().all()
+        items = result.all()
+        if sort is None or after is None or after[0] is None or len(items) == size:
+            return items
+        sort_column, _ = self.SORTS[sort]
+        if not sort_column.expression.nullable:
+            return items
+        #  Неполная страница после строк со значением: условие (колонка, id) > (...) не включает NULL,
+        # они дочитываются отдельным запросом по тому же индексу (IS NULL - условие индекса)
+        stmt = self.get_all_stmt(
+            size=size - len(items), fields=fields, sort=sort, after=(None, 0), **filters,
+        )
+        result = await self.session.execute(stmt)
+        return items + result.all()
 
-    async def get_all_full(
+    async def count(
             self,
-            page: Optional[int] = 1,
+            estimated: bool = False,
+            **filters,
+    ) -> int:
+        #  Количество книг под тем же фильтром, что и список
+        stmt = self.filter(select(Book.id), **filters)
+        if estimated:
+            return await TotalCount.estimated(self.session, stmt)
+        return await TotalCount.exact(self.session, stmt)
+
+    async def get_facets(
+            self,
+            authors_limit: int = settings.book.BOOKS_FACETS_AUTHORS_LIMIT,
+            **filters,
+    ) -> dict[str, Any]:
+        #  Счетчики по автору, десятилетию и наличию одним проходом по отфильтрованным книгам: GROUPING SETS
+        # группирует одни и те же строки по каждому набору, пустой набор () - общее количество.
+        # GROUPING(author, decade, available) - битовая маска свернутых колонок, по ней строка относится к фасету
+        decade = (Book.published_at // 10 * 10).label("decade")
+        available = (Book.quantity > 0).label("available")
+        grouping = func.grouping(Book.author, decade, available)
+        count = func.count().label("count")
+        stmt = self.filter(
+            select(Book.author, decade, available, count, grouping.label("grouping")),
+            **filters,
+        ).group_by(
+            func.grouping_sets(tuple_(Book.author), tuple_(decade), tuple_(available), tuple_())
+        ).subquery()
+        #  Авторов может быть десятки тысяч - из базы возвращаются только самые частые
+        position = func.row_number().over(
+            partition_by=stmt.c.grouping,
+            order_by=(stmt.c.count.desc(), stmt.c.author),
+        ).label("position")
+        ranked = select(stmt, position).subquery()
+        result: Result = await self.session.execute(
+            select(ranked).where(
+                or_(ranked.c.grouping != self.FACET_GROUPINGS["author"], ranked.c.position <= authors_limit)
+            )
+        )
+        facets: dict[str, Any] = {"total": 0, **{facet: [] for facet in self.FACET_GROUPINGS}}
+        for row in result:
+            if row.grouping == self.FACET_TOTAL:
+                facets["total"] = row.count
+                continue
+            facet = self.FACET_NAMES[row.grouping]
+            facets[facet].append({"value": getattr(row, facet), "count": row.count})
+        facets["author"].sort(key=lambda item: (-item["count"], item["value"]))
+        facets["decade"].sort(key=lambda item: (item["value"] is None, item["value"] or 0))
+        facets["available"].sort(key=lambda item: item["value"], reverse=True)
+        return facets
+
+    async def search(
+            self,
+            q: str,
             size: Optional[int] = 10,
+            after: Optional[Sequence] = None,
+            fields: Optional[Sequence[str]] = None,
+            rank_window: int = settings.book.BOOKS_SEARCH_RANK_WINDOW,
     ):
-        stmt = (select(Book).options(joinedload(Book.borrowed_books))
-                .order_by(Book.id).offset((page - 1) * size).limit(size))
+        #  Запрос в синтаксисе websearch ("фраза", or, -исключение) по GIN-индексу search_vector.
+        # Ранжируются только первые по id rank_window совпадений: для частых слов (сотни тысяч строк) ранг всех
+        # совпадений считается секундами. Окно упорядочено, чтобы каждая страница ранжировала один и тот же
+        # набор строк - иначе keyset по паре (rank, id) пропускал бы или повторял книги. Порядок -
+        # релевантность с учетом весов колонок, затем id
+        query = func.websearch_to_tsquery(cast(Book.SEARCH_CONFIG, REGCONFIG), q)
+        columns = self.get_columns(fields)
+        matches = (
+            select(*columns, Book.search_vector)
+            .where(Book.search_vector.op("@@")(query))
+            .order_by(Book.id)
+            .limit(rank_window)
+            .subquery()
+        )
+        rank = func.ts_rank_cd(matches.c.search_vector, query)
+        stmt = select(*(matches.c[column.key] for column in columns), rank.label("rank"))
+        if after is not None:
+            after_rank, after_id = after
+            stmt = stmt.where(or_(rank < after_rank, and_(rank == after_rank, matches.c.id > after_id)))
+        stmt = stmt.order_by(rank.desc(), matches.c.id).limit(size)
         result: Result = await self.session.execute(stmt)
-        return result.unique().scalars().all()
+        return result.all()
+
+    async def suggest(
+            self,
+            prefix: str,
+            limit: int,
+    ) -> list[tuple[str, str]]:
+        #  Подсказки из индекса в памяти процесса; пока он не построен - из базы по btree-индексам
+        # lower(name|author) text_pattern_ops: диапазон [префикс, следующий префикс) в побайтовом порядке
+        found = await suggestions.suggest(self.session, prefix=prefix, limit=limit)
+        if found is not None:
+            return found
+        prefix = PrefixIndex.normalize(prefix)
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        found = []
+        for field in suggestions.fields:
+            column = getattr(Book, field)
+            key = func.lower(column)
+            stmt = (
+                select(column)
+                .where(key.op("~>=~")(prefix), key.op("~<~")(upper))
+                .distinct(key)
+                .order_by(literal_column(f"lower({Book.__tablename__}.{field}) USING ~<~"))
+                .limit(limit)
+            )
+            result: Result = await self.session.execute(stmt)
+            found.extend((field, value) for value in result.scalars())
+        found.sort(key=lambda item: (PrefixIndex.normalize(item[1]), item[0]))
+        return found[:limit]
+
+    @property
+    def loader(self) -> DataLoader:
+        #  Загрузчик книг по id на время запроса: get_one из разных зависимостей, вызванные за один проход
+        # цикла событий, читаются одним запросом id IN (...), повторные - из памяти
+        return DataLoader.of(
+            self.session, "books",
+            lambda ids: CacheConfigurer.entities.get_many(self.session, Book, ids),
+        )
 
     async def get_one(
             self,
             id: int
     ):
-        orm_model = await self.session.get(Book, id)
+        orm_model = await self.loader.load(id)
         if not orm_model:
             raise CustomException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -61,23 +325,103 @@ class BookRepository:
             )
         return orm_model
 
-    async def get_one_complex(
+    async def get_many(
             self,
-            id: int = None,
+            keys: Sequence,
+            by: str = "id",
     ):
-        stmt = select(Book).where(Book.id == id)
-        stmt = stmt.options(
-            joinedload(Book.borrowed_books)
+        #  По id - через загрузчик запроса: попадания из кеша записей, промахи одним запросом id IN (...),
+        # и те же записи уже загружены для других зависимостей запроса
+        if by == "id":
+            found = await self.loader.load_many(dict.fromkeys(keys))
+            return [orm_model for orm_model in found if orm_model is not None]
+        #  Пакетное чтение одним запросом: колонка = ANY(массив) - один параметр и один план при любом числе ключей
+        column = getattr(Book, by)
+        stmt = select(*self.LIST_COLUMNS).where(
+            column == any_(bindparam("keys", list(set(keys)), type_=ARRAY(column.type)))
         )
         result: Result = await self.session.execute(stmt)
-        orm_model: Book | None = result.unique().scalar_one_or_none()
+        return result.all()
 
-        if not orm_model:
+    async def export(
+            self,
+            batch_size: int,
+    ) -> AsyncIterator[Sequence]:
+        #  Весь каталог по id серверным курсором: в памяти одна пачка batch_size строк.
+        # Курсор живет в транзакции - сессия должна быть открыта на все время чтения
+        stmt = select(*self.LIST_COLUMNS).order_by(Book.id).execution_options(yield_per=batch_size)
+        result = await self.session.stream(stmt)
+        async for partition in result.partitions():
+            yield partition
+
+    async def get_snapshot_time(self):
+        #  Время начала транзакции - момент снимка REPEATABLE READ
+        return await self.session.scalar(select(func.now()))
+
+    async def get_one_values(
+            self,
+            id: int
+    ):
+        #  Только для чтения: значения колонок из кеша записей (при промахе - Core-запрос), без ORM-объекта
+        values = await CacheConfigurer.entities.get_values(self.session, Book, id)
+        if values is None:
             raise CustomException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 msg=Errors.NOT_EXISTS_ID(id)
             )
-        return orm_model
+        return values
+
+    async def import_many(
+            self,
+            rows: list[tuple],
+    ) -> tuple[int, int]:
+        #  Загрузка пачки проверенных строк (line, name, author, description, published_at, isbn, quantity):
+        # COPY во временную таблицу и один INSERT ... SELECT с ON CONFLICT (isbn). Из повторов одного isbn в пачке
+        # берется последний. У существующей книги обновляются описательные поля, остаток не трогается - его ведут
+        # выдачи; строка без изменений не перезаписывается. Возвращает (добавлено, обновлено)
+        connection = await self.session.connection()
+        await connection.run_sync(IMPORT_TABLE.create)
+        raw = await connection.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            IMPORT_TABLE.name, records=rows, columns=[column.name for column in IMPORT_TABLE.columns],
+        )
+
+        staged = IMPORT_TABLE.c
+        #  Строки без isbn не схлопываются DISTINCT ON: для них ключ уникален (номер строки)
+        single = case((staged.isbn.is_(None), staged.line))
+        source = (
+            select(
+                staged.name, staged.author, func.coalesce(staged.description, Book.description.default.arg),
+                staged.published_at, staged.isbn, func.coalesce(staged.quantity, Book.quantity.default.arg),
+            )
+            .distinct(staged.isbn, single)
+            .order_by(staged.isbn, single, staged.line.desc())
+        )
+        stmt = insert(Book).from_select(
+            ["name", "author", "description", "published_at", "isbn", "quantity"], source,
+        )
+        described = ("name", "author", "description", "published_at")
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Book.isbn],
+            set_={**{field: stmt.excluded[field] for field in described}, "updated_at": func.now()},
+            where=tuple_(*(getattr(Book, field) for field in described)).is_distinct_from(
+                tuple_(*(stmt.excluded[field] for field in described))
+            ),
+        ).returning(Book.id, literal_column("xmax = 0"))
+        try:
+            changed = (await self.session.execute(stmt)).all()
+            ids = [row[0] for row in changed]
+            await CacheConfigurer.entities.publish(self.session, Book, *ids)
+            await self.session.commit()
+        except IntegrityError as exc:
+            await self.session.rollback()
+            self.logger.error("Error while importing books", exc_info=exc)
+            raise CustomException(
+                msg=Errors.DATABASE_ERROR()
+            )
+        await CacheConfigurer.entities.invalidate(Book, *ids)
+        inserted = sum(1 for row in changed if row[1])
+        return inserted, len(changed) - inserted
 
     async def create_one(
             self,
@@ -86,8 +430,11 @@ class BookRepository:
         orm_model = Book(**instance.model_dump())
         try:
             self.session.add(orm_model)
+            await self.session.flush()
+            await CacheConfigurer.entities.publish(self.session, Book, orm_model.id)
             await self.session.commit()
             await self.session.refresh(orm_model)
+            await CacheConfigurer.entities.invalidate(Book, orm_model.id)
             self.logger.info("%r was successfully created" % orm_model)
             return orm_model
         except IntegrityError as error:
@@ -102,8 +449,27 @@ class BookRepository:
     ) -> None:
         try:
             self.logger.info(f"Deleting %r from database" % orm_model)
+            #  Невозвращенные выдачи удаляются вместе с книгой, поэтому счетчики книг "на руках"
+            # их читателей уменьшаются в той же транзакции
+            stmt = (
+                update(Reader)
+                .where(
+                    Reader.id.in_(
+                        select(BorrowedBook.reader_id)
+                        .where(BorrowedBook.book_id == orm_model.id, BorrowedBook.return_date.is_(None))
+                    )
+                )
+                .values(active_loans=Reader.active_loans - 1)
+                .returning(Reader.id)
+            )
+            reader_ids = (await self.session.scalars(stmt)).all()
             await self.session.delete(orm_model)
+            await CacheConfigurer.entities.publish(self.session, Book, orm_model.id)
+            await CacheConfigurer.entities.publish(self.session, Reader, *reader_ids)
             await self.session.commit()
+            self.loader.clear(orm_model.id)
+            await CacheConfigurer.entities.invalidate(Book, orm_model.id)
+            await CacheConfigurer.entities.invalidate(Reader, *reader_ids)
         except IntegrityError as exc:
             self.logger.error("Error while deleting data from database", exc_info=exc)
             raise CustomException(
@@ -114,8 +480,21 @@ class BookRepository:
             self,
             instance:  Union["BookUpdate", "BookUpdatePartial"],
             orm_model: Book,
-            is_partial: bool = False
+            is_partial: bool = False,
+            if_match: Optional[str] = None,
     ):
+        if if_match is not None:
+            #  Версия сверяется под блокировкой строки: между проверкой и COMMIT книгу никто не изменит
+            updated_at = await self.session.scalar(
+                select(Book.updated_at).where(Book.id == orm_model.id).with_for_update()
+            )
+            if not ETag.matches(if_match, ETag.make(orm_model.id, updated_at, weak=False), weak=False):
+                await self.session.rollback()
+                raise CustomException(
+                    status_code=status.HTTP_412_PRECONDITION_FAILED,
+                    msg=Errors.PRECONDITION_FAILED()
+                )
+
         for key, val in instance.model_dump(
                 exclude_unset=is_partial,
                 exclude_none=is_partial,
@@ -124,8 +503,10 @@ class BookRepository:
 
         self.logger.warning(f"Editing %r in database" % orm_model)
         try:
+            await CacheConfigurer.entities.publish(self.session, Book, orm_model.id)
             await self.session.commit()
             await self.session.refresh(orm_model)
+            await CacheConfigurer.entities.invalidate(Book, orm_model.id)
             self.logger.info("%r was successfully edited" % orm_model)
             return orm_model
         except IntegrityError as exc:
@@ -1,6 +1,8 @@
-from typing import Annotated, Optional, Any
+from typing import Annotated, Optional, Any, Literal, Union
 
-from pydantic import BaseModel, ConfigDict, Field, conint
+from pydantic import BaseModel, ConfigDict, Field, conint, model_validator
+
+from src.core.settings import settings
 
 base_name_field = Annotated[str, Field(
     title="Book's name",
@@ -45,6 +47,7 @@ class BookLibList(BookShort):
 
 
 class BookRead(BookShort):
+    id: int
     quantity: base_quantity_field
 
 
@@ -64,3 +67,57 @@ class BookUpdatePartial(BaseBook):
 
 class BookExtended(BookRead):
     borrowed_books: Any
+    borrowed_total: Optional[int] = None
+
+
+class BookSuggestion(BaseModel):
+    field: Literal["name", "author"]
+    value: str
+
+
+class BookFacetCount(BaseModel):
+    value: Union[str, int, bool, None]
+    count: int
+
+
+class BookFacets(BaseModel):
+    total: int
+    author: list[BookFacetCount]
+    decade: list[BookFacetCount]
+    available: list[BookFacetCount]
+
+
+class BookAvailability(BookRead):
+    available: bool
+
+
+class BookBatch(BaseModel):
+    ids: Optional[list[int]] = Field(None, min_length=1, max_length=settings.book.BOOKS_BATCH_MAX_SIZE)
+    isbns: Optional[list[str]] = Field(None, min_length=1, max_length=settings.book.BOOKS_BATCH_MAX_SIZE)
+
+    @model_validator(mode="after")
+    def check_one_key(self):
+        if (self.ids is None) == (self.isbns is None):
+            raise ValueError("Exactly one of ids or isbns is required")
+        return self
+
+
+class BookBatchItem(BaseModel):
+    key: Union[int, str]
+    found: bool
+    item: Optional[BookAvailability] = None
+
+
+class BookImportError(BaseModel):
+    line: int
+    detail: str
+
+
+class BookImportReport(BaseModel):
+    rows: int
+    inserted: int
+    updated: int
+    unchanged: int
+    failed: int
+    errors: list[BookImportError]
+    errors_truncated: bool
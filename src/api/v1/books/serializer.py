@@ -1,11 +1,57 @@
-from typing import Any
+from typing import Any, Iterable, Optional
 
+from src.tools.fast_json import Projection
 from .schemas import (
+    BookShort,
+    BookRead,
     BookExtended,
+    BookAvailability,
 )
 
 
-async def serialize(model: Any) -> BookExtended:
+async def serialize(
+        model: Any,
+        borrowed_books: Optional[Iterable[Any]] = None,
+        borrowed_total: Optional[int] = None,
+) -> BookExtended:
     from ..library import serializer as library_serializer
-    borrowed_books = await library_serializer.serialize_many(model)
-    return BookExtended(**model.to_dict(), borrowed_books=borrowed_books)
+    borrowed_books = await library_serializer.serialize_many(model, borrowed_books=borrowed_books)
+    if borrowed_total is None:
+        borrowed_total = len(borrowed_books)
+    return BookExtended(**model.to_dict(), borrowed_books=borrowed_books, borrowed_total=borrowed_total)
+
+
+short_projection = Projection(BookShort)
+read_projection = Projection(BookRead)
+extended_projection = Projection(BookExtended, exclude=("borrowed_books", "borrowed_total"))
+availability_projection = Projection(BookAvailability, exclude=("available",))
+
+
+def project_many(
+        models: Iterable[Any],
+        history: Optional[dict[int, list[Any]]] = None,
+        totals: Optional[dict[int, int]] = None,
+) -> list[dict[str, Any]]:
+    #  Быстрый путь списков: dict в порядке полей схемы ответа, без промежуточных моделей pydantic
+    if history is None:
+        return short_projection.many(models)
+    from ..library import serializer as library_serializer
+    items = []
+    for model in models:
+        item = extended_projection(model)
+        item["borrowed_books"] = library_serializer.project_many(history.get(model.id, []))
+        item["borrowed_total"] = totals.get(model.id, 0)
+        items.append(item)
+    return items
+
+
+def get_availability(row: Any) -> dict[str, Any]:
+    return {"available": row.quantity > 0}
+
+
+def project_batch(
+        keys: Iterable[Any],
+        rows: Iterable[Any],
+        by: str = "id",
+) -> list[dict[str, Any]]:
+    return availability_projection.batch(keys, rows, by=by, extend=get_availability)
@@ -1,18 +1,35 @@
 import logging
-from typing import TYPE_CHECKING, Optional
+import zlib
+from datetime import datetime
+from typing import TYPE_CHECKING, AsyncIterator, Literal, Optional
 
-from fastapi.responses import ORJSONResponse
+import orjson
+from fastapi import Response
+from pydantic import ValidationError
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.core.config import DBConfigurer
+from src.core.settings import settings
+from src.tools.cursor import Cursor
+from src.tools.etag import ETag
 from src.tools.exceptions import CustomException
+from src.tools.fast_json import FastJSON
+from src.tools.row_stream import RowStream
+from src.tools.total_count import TotalCount
 from .repository import BookRepository
+from .counts import counts_cache
+from .facets import facets_cache
+from .flights import full_flight, get_flight_key
 from .exceptions import Errors
 from .validators import Validator
-from .serializer import serialize
+from .serializer import serialize, project_many, project_batch, short_projection, read_projection
 from .schemas import (
     BookCreate,
     BookUpdate,
     BookUpdatePartial,
+    BookBatch,
 )
 
 if TYPE_CHECKING:
@@ -36,28 +53,283 @@ class BookService:
             self,
             page: Optional[int] = 1,
             size: Optional[int] = 10,
+            cursor: Optional[str] = None,
+            response: Optional[Response] = None,
+            if_none_match: Optional[str] = None,
+            fields: Optional[str] = None,
+            sort: Optional[str] = None,
+            author: Optional[str] = None,
+            published_from: Optional[int] = None,
+            published_to: Optional[int] = None,
+            available: Optional[bool] = None,
+            include_total: Optional[str] = None,
     ):
+        try:
+            after_id, after = None, None
+            if cursor and sort is None:
+                after_id = Cursor.decode_id(cursor)
+            elif cursor:
+                after = self.decode_sorted_cursor(cursor, sort=sort)
+            #  По умолчанию - прежний состав списка, в fields доступны все поля книги
+            projection = read_projection.only(fields) if fields else short_projection
+        except CustomException as exc:
+            return ORJSONResponse(
+                status_code=exc.status_code,
+                content={
+                    "message": Errors.HANDLER_MESSAGE(),
+                    "detail": exc.msg,
+                }
+            )
         repository: BookRepository = BookRepository(
             session=self.session
         )
-        return await repository.get_all(
+        result = await repository.get_all(
             page=page,
             size=size,
+            after_id=after_id,
+            fields=projection.fields,
+            sort=sort,
+            after=after,
+            author=author,
+            published_from=published_from,
+            published_to=published_to,
+            available=available,
+        )
+        if sort is None:
+            Cursor.set_next(response=response, items=result, size=size)
+        else:
+            key = BookRepository.SORTS[sort][0].key
+            Cursor.set_next(
+                response=response,
+                items=result,
+                size=size,
+                key=lambda item: (sort, getattr(item, key), item.id),
+            )
+        if include_total is not None:
+            total = await self.get_total(
+                mode=include_total,
+                author=author,
+                published_from=published_from,
+                published_to=published_to,
+                available=available,
+            )
+            TotalCount.set(response=response, total=total)
+
+        #  Версия страницы - набор полей ответа и (id, updated_at) ее книг: другой fields, изменение, добавление
+        # или удаление книги на странице меняет ETag. Совпадение - ответ 304 без сериализации списка
+        etag = ETag.make(projection.fields, *((item.id, item.updated_at) for item in result))
+        if ETag.is_not_modified(etag, if_none_match=if_none_match):
+            return ETag.not_modified({**(response.headers if response else {}), **ETag.get_headers(etag)})
+        if response is not None:
+            response.headers.update(ETag.get_headers(etag))
+        return FastJSON.response(projection.many(result), response=response)
+
+    async def get_total(
+            self,
+            mode: str,
+            **filters,
+    ) -> int:
+        repository: BookRepository = BookRepository(
+            session=self.session
         )
+        if mode == "estimated":
+            return await repository.count(estimated=True, **filters)
+        #  Точное количество кешируется ненадолго: при обходе страниц клиент повторяет один и тот же COUNT(*)
+        signature = orjson.dumps(filters, option=orjson.OPT_SORT_KEYS).decode()
+        return await counts_cache.get_or_compute(
+            signature=signature,
+            compute=lambda: repository.count(**filters),
+        )
+
+    @staticmethod
+    def decode_sorted_cursor(
+            cursor: str,
+            sort: str,
+    ) -> list:
+        #  Курсор сортированного списка - (сортировка, значение, id): курсор другой сортировки или с
+        # значением не того типа - ошибка 400, а не неверная страница
+        cursor_sort, value, after_id = Cursor.decode(cursor, length=3)
+        column, _ = BookRepository.SORTS[sort]
+        if (
+                cursor_sort != sort
+                or not Cursor.is_id(after_id)
+                or not (value is None or isinstance(value, column.type.python_type))
+                or isinstance(value, bool)
+        ):
+            raise CustomException(msg=Errors.INVALID_CURSOR())
+        return [value, after_id]
+
+    @staticmethod
+    def decode_search_cursor(
+            cursor: str,
+    ) -> list:
+        #  Курсор поиска - (ранг, id) последней книги страницы
+        rank, after_id = Cursor.decode(cursor, length=2)
+        if isinstance(rank, bool) or not isinstance(rank, (int, float)) or not Cursor.is_id(after_id):
+            raise CustomException(msg=Errors.INVALID_CURSOR())
+        return [rank, after_id]
 
     async def get_all_full(
             self,
             page: Optional[int] = 1,
             size: Optional[int] = 10,
+            cursor: Optional[str] = None,
+            history_limit: Optional[int] = settings.library.LIBRARY_HISTORY_LIMIT,
+            response: Optional[Response] = None,
     ):
+        from ..library.repository import LibraryRepository
+
+        try:
+            after_id = Cursor.decode_id(cursor) if cursor else None
+        except CustomException as exc:
+            return ORJSONResponse(
+                status_code=exc.status_code,
+                content={
+                    "message": Errors.HANDLER_MESSAGE(),
+                    "detail": exc.msg,
+                }
+            )
         repository: BookRepository = BookRepository(
             session=self.session
         )
-        result = await repository.get_all_full(
+        result = await repository.get_all(
             page=page,
             size=size,
+            after_id=after_id,
+        )
+        Cursor.set_next(response=response, items=result, size=size)
+
+        #  История выдач грузится отдельным запросом на всю страницу и ограничена history_limit
+        # последними выдачами на каждый объект
+        library_repository: LibraryRepository = LibraryRepository(
+            session=self.session
+        )
+        history, totals = await library_repository.get_history(
+            owner="book_id",
+            ids=[item.id for item in result],
+            limit=history_limit,
+        )
+        return FastJSON.response(
+            project_many(result, history=history, totals=totals),
+            response=response,
+        )
+
+    async def search(
+            self,
+            q: str,
+            size: Optional[int] = 10,
+            cursor: Optional[str] = None,
+            response: Optional[Response] = None,
+            fields: Optional[str] = None,
+    ):
+        try:
+            after = self.decode_search_cursor(cursor) if cursor else None
+            projection = read_projection.only(fields)
+        except CustomException as exc:
+            return ORJSONResponse(
+                status_code=exc.status_code,
+                content={
+                    "message": Errors.HANDLER_MESSAGE(),
+                    "detail": exc.msg,
+                }
+            )
+        repository: BookRepository = BookRepository(
+            session=self.session
+        )
+        result = await repository.search(
+            q=q,
+            size=size,
+            after=after,
+            fields=projection.fields,
+        )
+        Cursor.set_next(response=response, items=result, size=size, key=lambda item: (item.rank, item.id))
+        return FastJSON.response(projection.many(result), response=response)
+
+    @staticmethod
+    async def export(
+            gzip: bool = False,
+    ):
+        #  Выгрузка каталога в NDJSON (одна книга - одна строка) из отдельной сессии со снимком базы: копия
+        # согласована на момент X-Export-As-Of, как бы долго ни читал клиент. Заголовки уходят сразу,
+        # строки - пачками по BOOKS_EXPORT_BATCH_SIZE; сессия закрывается по окончании или обрыве передачи
+        session = await DBConfigurer.snapshot_session()
+        try:
+            repository: BookRepository = BookRepository(
+                session=session
+            )
+            as_of = await repository.get_snapshot_time()
+        except BaseException:
+            await session.close()
+            raise
+
+        async def body():
+            compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16) if gzip else None
+            try:
+                async for rows in repository.export(batch_size=settings.book.BOOKS_EXPORT_BATCH_SIZE):
+                    chunk = b"".join(orjson.dumps(item, option=orjson.OPT_APPEND_NEWLINE) for item in read_projection.many(rows))
+                    yield compressor.compress(chunk) if compressor else chunk
+                if compressor:
+                    yield compressor.flush()
+            finally:
+                await session.close()
+
+        headers = {
+            "Content-Disposition": 'attachment; filename="books.ndjson"',
+            "X-Export-As-Of": as_of.isoformat(),
+        }
+        if gzip:
+            headers["Content-Encoding"] = "gzip"
+        #  Закрытие в фоне - на случай, если клиент отключился до начала передачи и генератор не запускался
+        return StreamingResponse(
+            body(), media_type="application/x-ndjson", headers=headers, background=BackgroundTask(session.close),
+        )
+
+    async def get_facets(
+            self,
+            author: Optional[str] = None,
+            published_from: Optional[int] = None,
+            published_to: Optional[int] = None,
+            available: Optional[bool] = None,
+    ):
+        #  Подпись фильтра - ключ кеша счетчиков: одинаковые фильтры в любом порядке параметров - одна запись
+        filters = dict(author=author, published_from=published_from, published_to=published_to, available=available)
+        signature = orjson.dumps(filters, option=orjson.OPT_SORT_KEYS).decode()
+        repository: BookRepository = BookRepository(
+            session=self.session
+        )
+        facets = await facets_cache.get_or_compute(
+            signature=signature,
+            compute=lambda: repository.get_facets(**filters),
         )
-        return [await serialize(model=item) for item in result]
+        return FastJSON.response(facets)
+
+    async def suggest(
+            self,
+            prefix: str,
+            limit: int = settings.book.BOOKS_SUGGEST_LIMIT,
+    ):
+        repository: BookRepository = BookRepository(
+            session=self.session
+        )
+        found = await repository.suggest(
+            prefix=prefix,
+            limit=limit,
+        )
+        return FastJSON.response([{"field": field, "value": value} for field, value in found])
+
+    async def get_batch(
+            self,
+            batch: BookBatch,
+    ):
+        by, keys = ("id", batch.ids) if batch.ids is not None else ("isbn", batch.isbns)
+        repository: BookRepository = BookRepository(
+            session=self.session
+        )
+        rows = await repository.get_many(
+            keys=keys,
+            by=by,
+        )
+        return FastJSON.response(project_batch(keys, rows, by=by))
 
     async def get_one(
             self,
@@ -77,15 +349,120 @@ class BookService:
                 }
             )
 
+    async def get_one_values(
+            self,
+            id: int,
+            response: Optional[Response] = None,
+            if_none_match: Optional[str] = None,
+            if_modified_since: Optional[str] = None,
+            fields: Optional[str] = None,
+    ):
+        #  Путь только для чтения (GET /books/{id}): значения колонок без ORM-объекта и модели pydantic.
+        # Зависимости, которым нужен объект в сессии (выдача, изменение), используют get_one
+        repository: BookRepository = BookRepository(
+            session=self.session
+        )
+        try:
+            projection = read_projection.only(fields)
+            values = await repository.get_one_values(id=id)
+        except CustomException as exc:
+            return ORJSONResponse(
+                status_code=exc.status_code,
+                content={
+                    "message": Errors.HANDLER_MESSAGE(),
+                    "detail": exc.msg,
+                }
+            )
+
+        #  Версия берется из кеша записей: при совпадении ответ 304 без запроса к бд и сериализации.
+        # Ответ с fields - другое представление записи, и у него свой ETag
+        etag = ETag.make(
+            values["id"],
+            values["updated_at"],
+            *(projection.fields if projection is not read_projection else ()),
+            weak=False,
+        )
+        headers = ETag.get_headers(etag, last_modified=values["updated_at"])
+        if ETag.is_not_modified(
+                headers["ETag"],
+                last_modified=values["updated_at"],
+                if_none_match=if_none_match,
+                if_modified_since=if_modified_since,
+        ):
+            return ETag.not_modified(headers)
+        if response is not None:
+            response.headers.update(headers)
+        return FastJSON.response(projection.from_mapping(values), response=response)
+
     async def get_one_complex(
             self,
-            id: int
+            id: int,
+            history_limit: Optional[int] = settings.library.LIBRARY_HISTORY_LIMIT,
     ):
+        #  Результат (или 404) одного чтения получают все одновременные запросы той же книги
+        try:
+            return await full_flight.do(
+                get_flight_key(id, history_limit),
+                lambda: self.load_one_complex(id=id, history_limit=history_limit),
+            )
+        except CustomException as exc:
+            return ORJSONResponse(
+                status_code=exc.status_code,
+                content={
+                    "message": Errors.HANDLER_MESSAGE(),
+                    "detail": exc.msg,
+                }
+            )
+
+    async def load_one_complex(
+            self,
+            id: int,
+            history_limit: int,
+    ):
+        from ..library.repository import LibraryRepository
+
+        #  Книга - из кеша записей, история - не больше history_limit последних выдач (полная история -
+        # постранично в GET /books/{id}/loans), borrowed_total - общее количество выдач
         repository: BookRepository = BookRepository(
             session=self.session
         )
+        result = await repository.get_one(id=id)
+        library_repository: LibraryRepository = LibraryRepository(
+            session=self.session
+        )
+        history, totals = await library_repository.get_history(
+            owner="book_id",
+            ids=[id],
+            limit=history_limit,
+        )
+        return await serialize(model=result, borrowed_books=history.get(id, []), borrowed_total=totals.get(id, 0))
+
+    async def get_loans(
+            self,
+            id: int,
+            size: Optional[int] = 10,
+            cursor: Optional[str] = None,
+            status: Optional[Literal["active", "returned"]] = None,
+            borrowed_from: Optional[datetime] = None,
+            borrowed_to: Optional[datetime] = None,
+            response: Optional[Response] = None,
+    ):
+        from ..library.service import LibraryService
+
+        library_service: LibraryService = LibraryService(
+            session=self.session
+        )
         try:
-            result = await repository.get_one_complex(id=id)
+            return await library_service.get_loans(
+                owner="book_id",
+                id=id,
+                size=size,
+                cursor=cursor,
+                status=status,
+                borrowed_from=borrowed_from,
+                borrowed_to=borrowed_to,
+                response=response,
+            )
         except CustomException as exc:
             return ORJSONResponse(
                 status_code=exc.status_code,
@@ -94,7 +471,6 @@ class BookService:
                     "detail": exc.msg,
                 }
             )
-        return await serialize(model=result)
 
     async def create_one(
             self,
@@ -123,6 +499,65 @@ class BookService:
                 }
             )
 
+    async def import_many(
+            self,
+            chunks: AsyncIterator[bytes],
+            format: Literal["csv", "ndjson"],
+    ):
+        #  Строки проверяются по BookCreate и правилу года публикации по мере чтения тела запроса и загружаются
+        # пачками по BOOKS_IMPORT_CHUNK_SIZE (каждая - своя транзакция). В памяти - одна пачка и не более
+        # BOOKS_IMPORT_MAX_ERRORS ошибок; остальные ошибки только считаются
+        repository: BookRepository = BookRepository(
+            session=self.session
+        )
+        report = {"rows": 0, "inserted": 0, "updated": 0, "unchanged": 0, "failed": 0, "errors": [], "errors_truncated": False}
+
+        def fail(line: int, detail: str) -> None:
+            report["failed"] += 1
+            if len(report["errors"]) < settings.book.BOOKS_IMPORT_MAX_ERRORS:
+                report["errors"].append({"line": line, "detail": detail})
+            else:
+                report["errors_truncated"] = True
+
+        async def load(chunk: list[tuple]) -> None:
+            try:
+                inserted, updated = await repository.import_many(rows=chunk)
+            except CustomException as exc:
+                for row in chunk:
+                    fail(row[0], exc.msg)
+                return
+            report["inserted"] += inserted
+            report["updated"] += updated
+            report["unchanged"] += len(chunk) - inserted - updated
+
+        chunk: list[tuple] = []
+        async for line, row, error in RowStream.rows(chunks, format=format):
+            report["rows"] += 1
+            if error is not None:
+                fail(line, error)
+                continue
+            try:
+                instance = BookCreate.model_validate(row)
+            except ValidationError as exc:
+                fail(line, RowStream.errors(exc))
+                continue
+            is_valid_published_at_or_exc = await Validator.validate_published_at(
+                instance.published_at
+            )
+            if isinstance(is_valid_published_at_or_exc, ORJSONResponse):
+                fail(line, orjson.loads(is_valid_published_at_or_exc.body)["detail"])
+                continue
+            chunk.append((
+                line, instance.name, instance.author, instance.description,
+                instance.published_at, instance.isbn, instance.quantity,
+            ))
+            if len(chunk) >= settings.book.BOOKS_IMPORT_CHUNK_SIZE:
+                await load(chunk)
+                chunk = []
+        if chunk:
+            await load(chunk)
+        return report
+
     async def delete_one(
             self,
             orm_model: "Book",
@@ -149,7 +584,9 @@ class BookService:
             self,
             orm_model: "Book",
             instance: BookUpdate | BookUpdatePartial,
-            is_partial: bool = False
+            is_partial: bool = False,
+            response: Optional[Response] = None,
+            if_match: Optional[str] = None,
     ):
         #  Вернет ответ с ошибкой ORJSONResponse, если нет записей в бд по выбранному id
         if orm_model and isinstance(orm_model, ORJSONResponse):
@@ -166,11 +603,13 @@ class BookService:
             session=self.session
         )
 
+        #  Вернет ответ с ошибкой ORJSONResponse (412), если If-Match не совпадает с текущей версией книги
         try:
-            return await repository.edit_one(
+            orm_model = await repository.edit_one(
                 orm_model=orm_model,
                 instance=instance,
                 is_partial=is_partial,
+                if_match=if_match,
             )
         except CustomException as exc:
             return ORJSONResponse(
@@ -180,3 +619,6 @@ class BookService:
                     "detail": exc.msg,
                 }
             )
+        if response is not None:
+            response.headers.update(ETag.get_headers(ETag.of(orm_model), last_modified=orm_model.updated_at))
+        return orm_model
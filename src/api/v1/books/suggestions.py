@@ -0,0 +1,14 @@
+from src.core.cache import ModelPrefixIndex
+from src.core.config import CacheConfigurer, DBConfigurer
+from src.core.models import Book
+from src.core.settings import settings
+
+
+#  Префиксный индекс названий и авторов для GET /books/suggest: у каждого воркера свой, строится при старте
+suggestions = ModelPrefixIndex(
+    model=Book,
+    fields=("name", "author"),
+    cache=CacheConfigurer.entities,
+    session_factory=DBConfigurer.Session,
+    max_rows=settings.book.BOOKS_SUGGEST_INDEX_MAX_ROWS,
+)
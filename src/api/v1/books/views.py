@@ -1,9 +1,13 @@
-from typing import TYPE_CHECKING
+from datetime import datetime
+from typing import TYPE_CHECKING, Literal, Optional
 
-from fastapi import APIRouter, status, Depends, Query
+from fastapi import APIRouter, status, Depends, Query, Response, Header, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.core.config import DBConfigurer
+from src.core.settings import settings
+from src.tools.row_stream import RowStream
 from .schemas import (
     BookShort,
     BookRead,
@@ -11,10 +15,16 @@ from .schemas import (
     BookCreate,
     BookUpdate,
     BookUpdatePartial,
+    BookSuggestion,
+    BookFacets,
+    BookBatch,
+    BookBatchItem,
+    BookImportReport,
 )
 from .service import BookService
 from . import dependencies as deps
 from ..auth.dependencies import current_user
+from ..library.schemas import BorrowedBookRead
 
 if TYPE_CHECKING:
     from src.core.models import (
@@ -33,6 +43,20 @@ router = APIRouter()
         description="Get the list of the all items",
         responses={
             200: {
+                "headers": {
+                    "X-Next-Cursor": {
+                        "description": "Cursor of the next page, absent on the last page",
+                        "schema": {"type": "string"},
+                    },
+                    "ETag": {
+                        "description": "Weak version of the page, send it back in If-None-Match",
+                        "schema": {"type": "string"},
+                    },
+                    "X-Total-Count": {
+                        "description": "Total number of items, only with include_total (estimated - approximate)",
+                        "schema": {"type": "integer"},
+                    },
+                },
                 "content": {
                     "application/json": {
                         "examples": {
@@ -59,6 +83,32 @@ router = APIRouter()
                     }
                 }
             },
+            304: {
+                "description": "Page is not modified since the version from If-None-Match",
+            },
+            400: {
+                "description": "Unknown field requested in fields or invalid cursor",
+                "content": {
+                    "application/json": {
+                        "examples": {
+                            "unknown field": {
+                                "summary": "Unknown field requested",
+                                "value": {
+                                    "message": "Handled by Books exception handler",
+                                    "detail": "Unknown fields requested: title. Allowed fields: name, author, published_at, isbn, description, id, quantity",
+                                }
+                            },
+                            "invalid cursor": {
+                                "summary": "Cursor of another sort order",
+                                "value": {
+                                    "message": "Handled by Books exception handler",
+                                    "detail": "Invalid pagination cursor",
+                                }
+                            }
+                        }
+                    }
+                }
+            },
             422: {
                 "description": "Validation Error",
                 "content": {
@@ -83,8 +133,31 @@ router = APIRouter()
         }
 )
 async def get_all(
+        response: Response,
         page: int = Query(1, gt=0, description="Result list page number, greater than 0"),
         size: int = Query(10, gt=0, description="Result list page size, greater than 0"),
+        cursor: Optional[str] = Query(
+            None,
+            description="Opaque cursor from the X-Next-Cursor header of the previous page, page is ignored",
+        ),
+        if_none_match: Optional[str] = Header(None),
+        fields: Optional[str] = Query(
+            None,
+            description="Comma-separated response fields (sparse fieldset), e.g. id,name,author",
+        ),
+        sort: Optional[Literal["name", "author", "published_at", "-quantity"]] = Query(
+            None,
+            description="Sort order (ties broken by id in the same direction), by id if not set; \"-\" - descending",
+        ),
+        author: Optional[str] = Query(None, description="Books of this author only (exact match)"),
+        published_from: Optional[int] = Query(None, description="Published in this year or later"),
+        published_to: Optional[int] = Query(None, description="Published in this year or earlier"),
+        available: Optional[bool] = Query(None, description="true - in stock (quantity > 0), false - out of stock"),
+        include_total: Optional[Literal["exact", "estimated"]] = Query(
+            None,
+            description="Return the total number of items in the X-Total-Count header: "
+                        "exact - COUNT(*), estimated - planner statistics, without reading the table",
+        ),
         session: AsyncSession = Depends(DBConfigurer.session_getter)
 ):
     service: BookService = BookService(
@@ -93,6 +166,16 @@ async def get_all(
     return await service.get_all(
         page=page,
         size=size,
+        cursor=cursor,
+        response=response,
+        if_none_match=if_none_match,
+        fields=fields,
+        sort=sort,
+        author=author,
+        published_from=published_from,
+        published_to=published_to,
+        available=available,
+        include_total=include_total,
     )
 
 
@@ -105,6 +188,12 @@ async def get_all(
         description="Get the list of the all items (for librarians only)",
         responses={
             200: {
+                "headers": {
+                    "X-Next-Cursor": {
+                        "description": "Cursor of the next page, absent on the last page",
+                        "schema": {"type": "string"},
+                    }
+                },
                 "content": {
                     "application/json": {
                         "examples": {
@@ -134,7 +223,8 @@ async def get_all(
                                                 "borrow_date": "2022-06-04T17:28:17.170342",
                                                 "return_date": "2022-09-04T17:28:17.170342"
                                             }
-                                        ]
+                                        ],
+                                        "borrowed_total": 2
                                     },
                                     {
                                         "id": 2,
@@ -159,7 +249,8 @@ async def get_all(
                                                 "borrow_date": "2022-06-04T17:28:17.170342",
                                                 "return_date": "2022-09-04T17:28:17.170342"
                                             }
-                                        ]
+                                        ],
+                                        "borrowed_total": 2
                                     }
                                 ]
                             }
@@ -204,8 +295,19 @@ async def get_all(
         }
 )
 async def get_all(
+        response: Response,
         page: int = Query(1, gt=0, description="Result list page number, greater than 0"),
         size: int = Query(10, gt=0, description="Result list page size, greater than 0"),
+        cursor: Optional[str] = Query(
+            None,
+            description="Opaque cursor from the X-Next-Cursor header of the previous page, page is ignored",
+        ),
+        history_limit: int = Query(
+            settings.library.LIBRARY_HISTORY_LIMIT,
+            gt=0,
+            le=settings.library.LIBRARY_HISTORY_MAX_LIMIT,
+            description="Max number of the most recent loans returned for every item",
+        ),
         session: AsyncSession = Depends(DBConfigurer.session_getter)
 ):
     service: BookService = BookService(
@@ -214,6 +316,304 @@ async def get_all(
     return await service.get_all_full(
         page=page,
         size=size,
+        cursor=cursor,
+        history_limit=history_limit,
+        response=response,
+    )
+
+
+# 1_2
+@router.get(
+        "/search",
+        response_model=list[BookRead],
+        status_code=status.HTTP_200_OK,
+        description=(
+            "Full-text search over name, author and description, the most relevant items first. Only the first "
+            f"{settings.book.BOOKS_SEARCH_RANK_WINDOW} matches in id order are ranked: for frequent terms "
+            "narrow the query to reach less common books"
+        ),
+        responses={
+            200: {
+                "headers": {
+                    "X-Next-Cursor": {
+                        "description": "Cursor of the next page of results, absent on the last page",
+                        "schema": {"type": "string"},
+                    },
+                },
+                "content": {
+                    "application/json": {
+                        "examples": {
+                            "example1": {
+                                "summary": "Books found by q=musketeers",
+                                "value": [
+                                    {
+                                        "name": "The Three Musketeers",
+                                        "author": "A.Dumas",
+                                        "published_at": 2000,
+                                        "isbn": "978-3-16-148410-0",
+                                        "description": "Unknown",
+                                        "id": 1,
+                                        "quantity": 14
+                                    },
+                                ]
+                            }
+                        }
+                    }
+                }
+            },
+            400: {
+                "description": "Invalid cursor or unknown field requested in fields",
+                "content": {
+                    "application/json": {
+                        "example": {
+                            "message": "Handled by Books exception handler",
+                            "detail": "Invalid pagination cursor",
+                        }
+                    }
+                }
+            },
+            422: {
+                "description": "Validation Error",
+                "content": {
+                    "application/json": {
+                        "examples": {
+                            "invalid input": {
+                                "summary": "Invalid input data",
+                                "value": {
+                                    "detail": [
+                                        {
+                                            "loc": ["query", "q"],
+                                            "msg": "String should have at least 1 character",
+                                            "type": "string_too_short"
+                                        }
+                                    ]
+                                }
+                            }
+                        }
+                    }
+                }
+            },
+        }
+)
+async def search(
+        response: Response,
+        q: str = Query(
+            min_length=1,
+            max_length=256,
+            description='Search query: words, "quoted phrase", or, -excluded word; English and Russian',
+        ),
+        size: int = Query(10, gt=0, description="Result list page size, greater than 0"),
+        cursor: Optional[str] = Query(
+            None,
+            description="Opaque cursor from the X-Next-Cursor header of the previous page",
+        ),
+        fields: Optional[str] = Query(
+            None,
+            description="Comma-separated response fields (sparse fieldset), e.g. id,name,author",
+        ),
+        session: AsyncSession = Depends(DBConfigurer.session_getter)
+):
+    service: BookService = BookService(
+        session=session,
+    )
+    return await service.search(
+        q=q,
+        size=size,
+        cursor=cursor,
+        response=response,
+        fields=fields,
+    )
+
+
+# 1_3
+@router.get(
+        "/suggest",
+        response_model=list[BookSuggestion],
+        status_code=status.HTTP_200_OK,
+        description="Typeahead: book names and authors starting with the prefix, case-insensitive",
+        responses={
+            200: {
+                "content": {
+                    "application/json": {
+                        "examples": {
+                            "example1": {
+                                "summary": "Suggestions for prefix=the th",
+                                "value": [
+                                    {
+                                        "field": "name",
+                                        "value": "The Three Musketeers"
+                                    },
+                                    {
+                                        "field": "author",
+                                        "value": "The Thompsons"
+                                    },
+                                ]
+                            }
+                        }
+                    }
+                }
+            },
+            422: {
+                "description": "Validation Error",
+                "content": {
+                    "application/json": {
+                        "examples": {
+                            "invalid input": {
+                                "summary": "Invalid input data",
+                                "value": {
+                                    "detail": [
+                                        {
+                                            "loc": ["query", "prefix"],
+                                            "msg": "String should have at least 1 character",
+                                            "type": "string_too_short"
+                                        }
+                                    ]
+                                }
+                            }
+                        }
+                    }
+                }
+            },
+        }
+)
+async def suggest(
+        prefix: str = Query(min_length=1, max_length=100, description="Beginning of a book name or author"),
+        limit: int = Query(
+            settings.book.BOOKS_SUGGEST_LIMIT,
+            gt=0,
+            le=settings.book.BOOKS_SUGGEST_MAX_LIMIT,
+            description="Maximum number of suggestions",
+        ),
+        session: AsyncSession = Depends(DBConfigurer.session_getter)
+):
+    service: BookService = BookService(
+        session=session,
+    )
+    return await service.suggest(
+        prefix=prefix,
+        limit=limit,
+    )
+
+
+# 1_4
+@router.get(
+        "/facets",
+        response_model=BookFacets,
+        status_code=status.HTTP_200_OK,
+        description="Facet counts of the catalog for the filter: by author (most frequent), by decade, by availability",
+        responses={
+            200: {
+                "content": {
+                    "application/json": {
+                        "examples": {
+                            "example1": {
+                                "summary": "Facet counts of books published since 1970",
+                                "value": {
+                                    "total": 3,
+                                    "author": [
+                                        {"value": "A.Dumas", "count": 2},
+                                        {"value": "M.Mitchell", "count": 1}
+                                    ],
+                                    "decade": [
+                                        {"value": 1970, "count": 1},
+                                        {"value": 2000, "count": 2}
+                                    ],
+                                    "available": [
+                                        {"value": True, "count": 2},
+                                        {"value": False, "count": 1}
+                                    ]
+                                }
+                            }
+                        }
+                    }
+                }
+            },
+            422: {
+                "description": "Validation Error",
+                "content": {
+                    "application/json": {
+                        "examples": {
+                            "invalid input": {
+                                "summary": "Invalid input data",
+                                "value": {
+                                    "detail": [
+                                        {
+                                            "loc": ["query", "published_from"],
+                                            "msg": "Input should be a valid integer, unable to parse string as an integer",
+                                            "type": "int_parsing"
+                                        }
+                                    ]
+                                }
+                            }
+                        }
+                    }
+                }
+            },
+        }
+)
+async def get_facets(
+        author: Optional[str] = Query(None, description="Books of this author only (exact match)"),
+        published_from: Optional[int] = Query(None, description="Published in this year or later"),
+        published_to: Optional[int] = Query(None, description="Published in this year or earlier"),
+        available: Optional[bool] = Query(None, description="true - in stock (quantity > 0), false - out of stock"),
+        session: AsyncSession = Depends(DBConfigurer.session_getter)
+):
+    service: BookService = BookService(
+        session=session,
+    )
+    return await service.get_facets(
+        author=author,
+        published_from=published_from,
+        published_to=published_to,
+        available=available,
+    )
+
+
+# 1_5
+@router.get(
+        "/export",
+        dependencies=[Depends(current_user),],
+        status_code=status.HTTP_200_OK,
+        response_class=StreamingResponse,
+        description="The whole catalog as NDJSON, one book per line in id order, "
+                    "consistent as of X-Export-As-Of (for librarians only)",
+        responses={
+            200: {
+                "description": "NDJSON stream (Content-Encoding: gzip with gzip=true)",
+                "headers": {
+                    "X-Export-As-Of": {
+                        "description": "Moment of the database snapshot the export was read from",
+                        "schema": {"type": "string", "format": "date-time"},
+                    },
+                },
+                "content": {
+                    "application/x-ndjson": {
+                        "schema": {"type": "string"},
+                        "example": '{"name":"The Three Musketeers","author":"A.Dumas","published_at":2000,'
+                                   '"isbn":"978-3-16-148410-0","description":"Unknown","id":1,"quantity":1}\n'
+                                   '{"name":"Gone with the Wind","author":"M.Mitchell","published_at":1936,'
+                                   '"isbn":null,"description":"Unknown","id":2,"quantity":3}\n',
+                    }
+                }
+            },
+            401: {
+                "description": "Unauthorized",
+                "content": {
+                    "application/json": {
+                        "example": {
+                            "summary": "User is not authenticated",
+                            "value": "Unauthorized"
+                        }
+                    }
+                }
+            },
+        }
+)
+async def export(
+        gzip: bool = Query(False, description="Compress the stream (Content-Encoding: gzip)"),
+):
+    return await BookService.export(
+        gzip=gzip,
     )
 
 
@@ -226,6 +626,16 @@ async def get_all(
         description="Get the item by id (for librarians only)",
         responses={
             200: {
+                "headers": {
+                    "ETag": {
+                        "description": "Weak version of the book, send it back in If-None-Match or If-Match",
+                        "schema": {"type": "string"},
+                    },
+                    "Last-Modified": {
+                        "description": "Time of the last change of the book",
+                        "schema": {"type": "string"},
+                    },
+                },
                 "content": {
                     "application/json": {
                         "examples": {
@@ -245,6 +655,20 @@ async def get_all(
                     }
                 }
             },
+            304: {
+                "description": "Book is not modified since the version from If-None-Match or If-Modified-Since",
+            },
+            400: {
+                "description": "Unknown field requested in fields",
+                "content": {
+                    "application/json": {
+                        "example": {
+                            "message": "Handled by Books exception handler",
+                            "detail": "Unknown fields requested: title. Allowed fields: name, author, published_at, isbn, description, id, quantity",
+                        }
+                    }
+                }
+            },
             401: {
                 "description": "Unauthorized",
                 "content": {
@@ -271,13 +695,24 @@ async def get_all(
 )
 async def get_one(
         id: int,
+        response: Response,
+        if_none_match: Optional[str] = Header(None),
+        if_modified_since: Optional[str] = Header(None),
+        fields: Optional[str] = Query(
+            None,
+            description="Comma-separated response fields (sparse fieldset), e.g. id,name,author",
+        ),
         session: AsyncSession = Depends(DBConfigurer.session_getter)
 ):
     service: BookService = BookService(
         session=session
     )
-    return await service.get_one(
-        id=id
+    return await service.get_one_values(
+        id=id,
+        response=response,
+        if_none_match=if_none_match,
+        if_modified_since=if_modified_since,
+        fields=fields,
     )
 
 
@@ -287,7 +722,7 @@ async def get_one(
     dependencies=[Depends(current_user), ],
     status_code=status.HTTP_200_OK,
     response_model=BookExtended,
-    description="Get the item by id with all relations (for librarians only)",
+    description="Get the item by id with the most recent loans and their total (for librarians only)",
     responses={
         200: {
             "content": {
@@ -318,7 +753,8 @@ async def get_one(
                                         "borrow_date": "2022-06-04T17:28:17.170342",
                                         "return_date": "2022-09-04T17:28:17.170342"
                                     }
-                                ]
+                                ],
+                                "borrowed_total": 2
                             },
                         }
                     }
@@ -351,13 +787,143 @@ async def get_one(
 )
 async def get_one_complex(
         id: int,
+        history_limit: int = Query(
+            settings.library.LIBRARY_HISTORY_LIMIT,
+            gt=0,
+            le=settings.library.LIBRARY_HISTORY_MAX_LIMIT,
+            description="Max number of the most recent loans returned, the whole history is at /{id}/loans",
+        ),
         session: AsyncSession = Depends(DBConfigurer.session_getter)
 ):
     service: BookService = BookService(
         session=session
     )
     return await service.get_one_complex(
-        id=id
+        id=id,
+        history_limit=history_limit,
+    )
+
+
+# 2_2
+@router.get(
+    "/{id}/loans",
+    dependencies=[Depends(current_user), ],
+    status_code=status.HTTP_200_OK,
+    response_model=list[BorrowedBookRead],
+    description="Loan history of the book, the most recent first, page by page (for librarians only)",
+    responses={
+        200: {
+            "headers": {
+                "X-Next-Cursor": {
+                    "description": "Cursor of the next page, absent on the last page",
+                    "schema": {"type": "string"},
+                },
+            },
+            "content": {
+                "application/json": {
+                    "examples": {
+                        "example1": {
+                            "summary": "A page of the loan history",
+                            "value": [
+                                {
+                                    "id": 21,
+                                    "book_id": 1,
+                                    "reader_id": 24,
+                                    "borrow_date": "2022-09-04T17:28:17.170342",
+                                    "return_date": None
+                                },
+                                {
+                                    "id": 1,
+                                    "book_id": 1,
+                                    "reader_id": 18,
+                                    "borrow_date": "2022-06-04T17:28:17.170342",
+                                    "return_date": "2022-07-04T17:28:17.170342"
+                                }
+                            ],
+                        }
+                    }
+                }
+            }
+        },
+        400: {
+            "description": "Bad Request",
+            "content": {
+                "application/json": {
+                    "examples": {
+                        "example1": {
+                            "summary": "Invalid cursor",
+                            "value": {
+                                "message": "Handled by Books exception handler",
+                                "detail": "Invalid pagination cursor"
+                            }
+                        },
+                        "example2": {
+                            "summary": "Invalid period",
+                            "value": {
+                                "message": "Handled by Books exception handler",
+                                "detail": "borrowed_from must be earlier than borrowed_to"
+                            }
+                        }
+                    }
+                }
+            }
+        },
+        401: {
+            "description": "Unauthorized",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "summary": "User is not authenticated",
+                        "value": "Unauthorized"
+                    }
+                }
+            }
+        },
+        404: {
+            "description": "Book not found",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "message": "Handled by Books exception handler",
+                        "detail": "Book with id=7 not exists",
+                    }
+                }
+            }
+        }
+    }
+)
+async def get_loans(
+        id: int,
+        response: Response,
+        size: int = Query(
+            10,
+            gt=0,
+            le=settings.library.LIBRARY_HISTORY_MAX_LIMIT,
+            description="Result list page size, greater than 0",
+        ),
+        cursor: Optional[str] = Query(
+            None,
+            description="Opaque cursor from the X-Next-Cursor header of the previous page",
+        ),
+        status: Optional[Literal["active", "returned"]] = Query(
+            None,
+            description="active - not returned yet, returned - returned loans only",
+        ),
+        borrowed_from: Optional[datetime] = Query(None, description="Loans borrowed at or after this moment"),
+        borrowed_to: Optional[datetime] = Query(None, description="Loans borrowed before this moment"),
+        session: AsyncSession = Depends(DBConfigurer.session_getter)
+):
+    service: BookService = BookService(
+        session=session
+    )
+    return await service.get_loans(
+        id=id,
+        size=size,
+        cursor=cursor,
+        status=status,
+        borrowed_from=borrowed_from,
+        borrowed_to=borrowed_to,
+        response=response,
     )
 
 
@@ -450,6 +1016,172 @@ async def create_one(
     )
 
 
+# 3_1
+@router.post(
+    "/batch",
+    dependencies=[Depends(current_user),],
+    status_code=status.HTTP_200_OK,
+    response_model=list[BookBatchItem],
+    description="Get many items by ids or ISBNs in one request, in the order of the request (for librarians only)",
+    responses={
+        200: {
+            "content": {
+                "application/json": {
+                    "examples": {
+                        "example1": {
+                            "summary": "Books by ids, id=7 not found",
+                            "value": [
+                                {
+                                    "key": 1,
+                                    "found": True,
+                                    "item": {
+                                        "name": "The Three Musketeers",
+                                        "author": "A.Dumas",
+                                        "published_at": 2000,
+                                        "isbn": "978-3-16-148410-0",
+                                        "description": "Unknown",
+                                        "id": 1,
+                                        "quantity": 0,
+                                        "available": False
+                                    }
+                                },
+                                {
+                                    "key": 7,
+                                    "found": False,
+                                    "item": None
+                                }
+                            ]
+                        }
+                    }
+                }
+            }
+        },
+        401: {
+            "description": "Unauthorized",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "summary": "User is not authenticated",
+                        "value": "Unauthorized"
+                    }
+                }
+            }
+        },
+        422: {
+            "description": "Invalid JSON-format or data.",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "message": "Handled by Application Exception Handler",
+                        "detail": [
+                            {
+                                "type": "value_error",
+                                "loc": ["body"],
+                                "msg": "Value error, Exactly one of ids or isbns is required",
+                                "input": {},
+                            }
+                        ]
+                    }
+                }
+            }
+        }
+    }
+)
+async def get_batch(
+        batch: BookBatch,
+        session: AsyncSession = Depends(DBConfigurer.session_getter)
+):
+    service: BookService = BookService(
+        session=session
+    )
+    return await service.get_batch(
+        batch=batch,
+    )
+
+
+# 3_2
+@router.post(
+    "/import",
+    dependencies=[Depends(current_user),],
+    status_code=status.HTTP_200_OK,
+    response_model=BookImportReport,
+    description="Bulk import of books from a CSV (with header) or NDJSON request body, upsert by ISBN (for librarians only)",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "text/csv": {
+                    "schema": {"type": "string"},
+                    "example": "name,author,published_at,isbn,quantity\n"
+                               "The Three Musketeers,A.Dumas,2000,978-3-16-148410-0,3\n",
+                },
+                "application/x-ndjson": {
+                    "schema": {"type": "string"},
+                    "example": '{"name": "The Three Musketeers", "author": "A.Dumas", "isbn": "978-3-16-148410-0"}\n',
+                },
+            },
+        },
+    },
+    responses={
+        200: {
+            "content": {
+                "application/json": {
+                    "examples": {
+                        "example1": {
+                            "summary": "Import report, two rows rejected",
+                            "value": {
+                                "rows": 100000,
+                                "inserted": 99120,
+                                "updated": 870,
+                                "unchanged": 8,
+                                "failed": 2,
+                                "errors": [
+                                    {
+                                        "line": 17,
+                                        "detail": "author: Field required"
+                                    },
+                                    {
+                                        "line": 4031,
+                                        "detail": "Published year can't be greater than current year"
+                                    }
+                                ],
+                                "errors_truncated": False
+                            }
+                        }
+                    }
+                }
+            }
+        },
+        401: {
+            "description": "Unauthorized",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "summary": "User is not authenticated",
+                        "value": "Unauthorized"
+                    }
+                }
+            }
+        },
+    }
+)
+async def import_many(
+        request: Request,
+        format: Optional[Literal["csv", "ndjson"]] = Query(
+            None,
+            description="Body format; by default taken from Content-Type (application/x-ndjson - NDJSON, otherwise CSV)",
+        ),
+        session: AsyncSession = Depends(DBConfigurer.session_getter)
+):
+    service: BookService = BookService(
+        session=session
+    )
+    return await service.import_many(
+        chunks=request.stream(),
+        format=RowStream.get_format(request.headers.get("content-type"), format),
+    )
+
+
 # 4
 @router.delete(
     "/{id}",
@@ -518,6 +1250,12 @@ async def delete_one(
     description="Edit one item (for librarians only)",
     responses={
         200: {
+            "headers": {
+                "ETag": {
+                    "description": "Weak version of the edited book",
+                    "schema": {"type": "string"},
+                },
+            },
             "content": {
                 "application/json": {
                     "examples": {
@@ -573,6 +1311,17 @@ async def delete_one(
                 }
             }
         },
+        412: {
+            "description": "Book was modified since the version from If-Match",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "message": "Handled by Books exception handler",
+                        "detail": "Book was modified, If-Match precondition failed",
+                    }
+                }
+            }
+        },
         422: {
             "description": "Invalid JSON-format or data.",
             "content": {
@@ -598,6 +1347,8 @@ async def delete_one(
 )
 async def edit_one(
         instance: BookUpdate,
+        response: Response,
+        if_match: Optional[str] = Header(None),
         orm_model: "Book" = Depends(deps.get_one),
         session: AsyncSession = Depends(DBConfigurer.session_getter)
 ):
@@ -608,6 +1359,8 @@ async def edit_one(
     return await service.edit_one(
         orm_model=orm_model,
         instance=instance,
+        response=response,
+        if_match=if_match,
     )
 
 
@@ -620,6 +1373,12 @@ async def edit_one(
     description="Edit item partially (for librarians only)",
     responses={
         200: {
+            "headers": {
+                "ETag": {
+                    "description": "Weak version of the edited book",
+                    "schema": {"type": "string"},
+                },
+            },
             "content": {
                 "application/json": {
                     "examples": {
@@ -675,6 +1434,17 @@ async def edit_one(
                 }
             }
         },
+        412: {
+            "description": "Book was modified since the version from If-Match",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "message": "Handled by Books exception handler",
+                        "detail": "Book was modified, If-Match precondition failed",
+                    }
+                }
+            }
+        },
         422: {
             "description": "Invalid JSON-format or data.",
             "content": {
@@ -700,6 +1470,8 @@ async def edit_one(
 )
 async def edit_one_partial(
         instance: BookUpdatePartial,
+        response: Response,
+        if_match: Optional[str] = Header(None),
         orm_model: "Book" = Depends(deps.get_one),
         session: AsyncSession = Depends(DBConfigurer.session_getter)
 ):
@@ -711,4 +1483,6 @@ async def edit_one_partial(
         orm_model=orm_model,
         instance=instance,
         is_partial=True,
+        response=response,
+        if_match=if_match,
     )
@@ -24,3 +24,7 @@ class Errors(ErrorsBase):
     @staticmethod
     def SIMILAR_EXISTS():
         return "Impossible to borrow similar item"
+
+    @staticmethod
+    def READER_INACTIVE():
+        return "Reader is not active"
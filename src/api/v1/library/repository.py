@@ -1,14 +1,26 @@
+import asyncio
 import logging
-from typing import TYPE_CHECKING
+from collections import defaultdict
+from datetime import datetime
+from typing import TYPE_CHECKING, AsyncIterator, Literal, Optional, Sequence
 
+from fastapi import status
+from sqlalchemy import select, insert, update, func, literal, tuple_, bindparam, true, Integer, Result
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 
 from src.core.models import (
+    Book,
     BorrowedBook,
+    Reader,
 )
+from src.core.config import CacheConfigurer
 from src.tools.exceptions import CustomException
 from .exceptions import Errors
+from ..books.exceptions import Errors as BookErrors
+from ..readers.exceptions import Errors as ReaderErrors
 
 if TYPE_CHECKING:
     from .schemas import (
@@ -19,6 +31,17 @@ CLASS = "BorrowedBook"
 
 
 class LibraryRepository:
+    ACTIVE_LOAN_INDEX = "uq_pat_borrowed_book_active_reader_id_book_id"
+    #  Колонки выгрузки истории и их типы в нотации pyarrow
+    EXPORT_COLUMNS = {
+        "id": "int64",
+        "book_id": "int64",
+        "reader_id": "int64",
+        "borrow_date": "timestamp[us]",
+        "return_date": "timestamp[us]",
+    }
+    EXPORT_QUEUE_SIZE = 16
+
     def __init__(
             self,
             session: AsyncSession,
@@ -26,45 +49,299 @@ class LibraryRepository:
         self.session = session
         self.logger = logging.getLogger(__name__)
 
-    async def get_one(
+    async def get_history(
             self,
-            id: int
+            owner: Literal["book_id", "reader_id"],
+            ids: Sequence[int],
+            limit: int,
     ):
-        orm_model = await self.session.get(BorrowedBook, id)
-        if not orm_model:
+        #  Не более limit последних выдач на каждый объект страницы и общее количество его выдач - два запроса
+        # на всю страницу. Последние выдачи - LATERAL-подзапрос с LIMIT на каждый id: обратный проход составного
+        # индекса (owner, borrow_date, id), без сортировки всей истории; количество - index-only scan того же индекса
+        if not ids:
+            return {}, {}
+        owner_column = getattr(BorrowedBook, owner)
+        owners = select(
+            func.unnest(bindparam("ids", list(set(ids)), type_=ARRAY(Integer))).column_valued("owner_id")
+        ).subquery()
+        recent = (
+            select(*BorrowedBook.__table__.c)
+            .where(owner_column == owners.c.owner_id)
+            .order_by(BorrowedBook.borrow_date.desc(), BorrowedBook.id.desc())
+            .limit(limit)
+            .lateral()
+        )
+        result: Result = await self.session.execute(select(recent).select_from(owners).join(recent, true()))
+        history = defaultdict(list)
+        for row in result.all():
+            history[getattr(row, owner)].append(row)
+
+        stmt = (
+            select(owner_column, func.count())
+            .where(owner_column.in_(ids))
+            .group_by(owner_column)
+        )
+        totals = dict((await self.session.execute(stmt)).all())
+        return history, totals
+
+    async def get_loans(
+            self,
+            owner: Literal["book_id", "reader_id"],
+            id: int,
+            size: int,
+            after: Optional[tuple[datetime, int]] = None,
+            status: Optional[Literal["active", "returned"]] = None,
+            borrowed_from: Optional[datetime] = None,
+            borrowed_to: Optional[datetime] = None,
+    ) -> Sequence:
+        #  Страница истории одного объекта от новых выдач к старым. Ключ курсора (borrow_date, id) продолжает
+        # составной индекс (owner, borrow_date, id): условие по строке (borrow_date, id) < (...) - граница
+        # обратного прохода индекса, поэтому любая страница читает не больше size строк, без OFFSET и сортировки.
+        # Фильтры status и период проверяются на тех же строках индекса
+        stmt = select(*BorrowedBook.__table__.c).where(getattr(BorrowedBook, owner) == id)
+        if after is not None:
+            stmt = stmt.where(tuple_(BorrowedBook.borrow_date, BorrowedBook.id) < tuple_(*after))
+        if status == "active":
+            stmt = stmt.where(BorrowedBook.return_date.is_(None))
+        elif status == "returned":
+            stmt = stmt.where(BorrowedBook.return_date.is_not(None))
+        if borrowed_from is not None:
+            stmt = stmt.where(BorrowedBook.borrow_date >= borrowed_from)
+        if borrowed_to is not None:
+            stmt = stmt.where(BorrowedBook.borrow_date < borrowed_to)
+        stmt = stmt.order_by(BorrowedBook.borrow_date.desc(), BorrowedBook.id.desc()).limit(size)
+        result: Result = await self.session.execute(stmt)
+        return result.all()
+
+    async def get_owner(
+            self,
+            owner: Literal["book_id", "reader_id"],
+            id: int,
+    ) -> dict:
+        model, errors = (Book, BookErrors) if owner == "book_id" else (Reader, ReaderErrors)
+        values = await CacheConfigurer.entities.get_values(self.session, model, id)
+        if values is None:
             raise CustomException(
-                msg=Errors.NOT_EXISTS_ID(id)
+                status_code=status.HTTP_404_NOT_FOUND,
+                msg=errors.NOT_EXISTS_ID(id)
             )
-        return orm_model
+        return values
 
-    async def create_one(
+    async def export(
             self,
-            instance: "BorrowedBookCreate"
+            borrowed_from: Optional[datetime] = None,
+            borrowed_to: Optional[datetime] = None,
+    ) -> AsyncIterator[bytes]:
+        #  История выдач за период [borrowed_from, borrowed_to) по id в CSV колонок EXPORT_COLUMNS через
+        # COPY (SELECT ...) TO STDOUT в транзакции сессии: строки не собираются в объекты Python ни драйвером,
+        # ни ORM. Фрагменты передаются через ограниченную очередь - чтение из базы ждет медленного клиента
+        stmt = select(*(getattr(BorrowedBook, name) for name in self.EXPORT_COLUMNS))
+        if borrowed_from is not None:
+            stmt = stmt.where(BorrowedBook.borrow_date >= borrowed_from)
+        if borrowed_to is not None:
+            stmt = stmt.where(BorrowedBook.borrow_date < borrowed_to)
+        compiled = stmt.order_by(BorrowedBook.id).compile(dialect=self.session.bind.dialect)
+        connection = await self.session.connection()
+        raw = await connection.get_raw_connection()
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.EXPORT_QUEUE_SIZE)
+
+        async def copy():
+            try:
+                await raw.driver_connection.copy_from_query(
+                    str(compiled), *(compiled.params[name] for name in compiled.positiontup),
+                    output=queue.put, format="csv",
+                )
+            except Exception as exc:
+                await queue.put(exc)
+            else:
+                await queue.put(None)
+
+        task = asyncio.create_task(copy())
+        try:
+            while (chunk := await queue.get()) is not None:
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield chunk
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def get_snapshot_time(self):
+        #  Время начала транзакции - момент снимка REPEATABLE READ
+        return await self.session.scalar(select(func.now()))
+
+    async def get_actual_books(
+            self,
+            reader_id: int,
     ):
-        orm_model = BorrowedBook(**instance.model_dump())
+        #  Книги "на руках" читаются по частичному индексу невозвращенных выдач (reader_id, book_id):
+        # история выдач читателя не сканируется, порядок по book_id отдает сам индекс
+        stmt = (
+            select(Book)
+            .join(BorrowedBook, BorrowedBook.book_id == Book.id)
+            .where(BorrowedBook.reader_id == reader_id, BorrowedBook.return_date.is_(None))
+            .order_by(BorrowedBook.book_id)
+        )
+        result: Result = await self.session.execute(stmt)
+        return result.scalars().all()
+
+    async def publish(self, orm_model: BorrowedBook) -> None:
+        #  Выдача и возврат меняют остаток книги и счетчик читателя - их записи в кеше устаревают:
+        # в других воркерах по NOTIFY этой транзакции, в своем - invalidate после COMMIT
+        await CacheConfigurer.entities.publish(self.session, Book, orm_model.book_id)
+        await CacheConfigurer.entities.publish(self.session, Reader, orm_model.reader_id)
+
+    @staticmethod
+    async def invalidate(orm_model: BorrowedBook) -> None:
+        await CacheConfigurer.entities.invalidate(Book, orm_model.book_id)
+        await CacheConfigurer.entities.invalidate(Reader, orm_model.reader_id)
+
+    @staticmethod
+    def get_constraint_name(error: IntegrityError):
+        #  asyncpg сохраняет имя нарушенного ограничения в исходном исключении драйвера
+        return getattr(error.orig.__cause__, "constraint_name", None)
+
+    async def borrow_one(
+            self,
+            instance: "BorrowedBookCreate",
+            max_items: int,
+    ):
+        #  Выдача - один запрос в одной транзакции:
+        # - счетчик книг "на руках" увеличивается, только если лимит читателя не достигнут. Строка
+        #   читателя заблокирована до конца транзакции, и конкурентная выдача тому же читателю проверит
+        #   лимит уже по обновленному значению; выдачи разным читателям друг друга не ждут
+        # - остаток книги уменьшается, только если счетчик читателя обновлен и книга есть в наличии
+        # - INSERT выдачи выполняется, только если обновлены обе строки. Повторная выдача той же
+        #   книги отсекается частичным уникальным индексом
+        reader = (
+            update(Reader)
+            .where(Reader.id == instance.reader_id, Reader.is_active, Reader.active_loans < max_items)
+            .values(active_loans=Reader.active_loans + 1)
+            .returning(Reader.id)
+            .cte("reader")
+        )
+        stock = (
+            update(Book)
+            .where(Book.id == instance.book_id, Book.quantity > 0, select(reader.c.id).exists())
+            .values(quantity=Book.quantity - 1)
+            .returning(Book.id)
+            .cte("stock")
+        )
+        stmt = (
+            insert(BorrowedBook)
+            .from_select(
+                ["book_id", "reader_id"],
+                select(stock.c.id, literal(instance.reader_id)),
+            )
+            .returning(BorrowedBook)
+        )
         try:
-            self.session.add(orm_model)
-            await self.session.commit()
-            await self.session.refresh(orm_model)
-            self.logger.info("%r was successfully created" % orm_model)
-            return orm_model
+            orm_model: BorrowedBook | None = (await self.session.scalars(stmt)).one_or_none()
         except IntegrityError as error:
+            await self.session.rollback()
+            if self.get_constraint_name(error) == self.ACTIVE_LOAN_INDEX:
+                raise CustomException(
+                    msg=Errors.SIMILAR_EXISTS()
+                )
             self.logger.error(f"Error while orm_model creating", exc_info=error)
             raise CustomException(
                 msg=Errors.DATABASE_ERROR()
             )
 
-    async def save(
+        if orm_model is None:
+            #  Запрос не создал выдачу: откатываем возможное увеличение счетчика читателя и
+            # различаем отсутствие читателя или книги, деактивированного читателя, нулевой остаток и достигнутый лимит
+            await self.session.rollback()
+            active_loans, is_active, quantity = (await self.session.execute(
+                select(
+                    select(Reader.active_loans).where(Reader.id == instance.reader_id).scalar_subquery(),
+                    select(Reader.is_active).where(Reader.id == instance.reader_id).scalar_subquery(),
+                    select(Book.quantity).where(Book.id == instance.book_id).scalar_subquery(),
+                )
+            )).one()
+            await self.session.rollback()
+            if active_loans is None:
+                raise CustomException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    msg=ReaderErrors.NOT_EXISTS_ID(instance.reader_id)
+                )
+            if quantity is None:
+                raise CustomException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    msg=BookErrors.NOT_EXISTS_ID(instance.book_id)
+                )
+            if not is_active:
+                raise CustomException(
+                    msg=Errors.READER_INACTIVE()
+                )
+            if quantity < 1:
+                raise CustomException(
+                    msg=Errors.NOT_ENOUGH_QUANTITY()
+                )
+            raise CustomException(
+                msg=Errors.LIMIT_REACHED()
+            )
+
+        await self.publish(orm_model)
+        await self.session.commit()
+        await self.invalidate(orm_model)
+        self.logger.info("%r was successfully created" % orm_model)
+        return orm_model
+
+    async def return_one(
             self,
-            orm_model: BorrowedBook
+            id: int
     ):
+        #  Фиксация возврата, возврат экземпляра на склад и уменьшение счетчика книг "на руках"
+        # читателя - один запрос в одной транзакции: остаток и счетчик меняются, только если выдача
+        # еще не была закрыта
+        loan = (
+            update(BorrowedBook)
+            .where(BorrowedBook.id == id, BorrowedBook.return_date.is_(None))
+            .values(return_date=func.now())
+            .returning(*BorrowedBook.__table__.c)
+            .cte("loan")
+        )
+        stock = (
+            update(Book)
+            .where(Book.id == loan.c.book_id)
+            .values(quantity=Book.quantity + 1)
+            .cte("stock")
+        )
+        reader = (
+            update(Reader)
+            .where(Reader.id == loan.c.reader_id)
+            .values(active_loans=Reader.active_loans - 1)
+            .cte("reader")
+        )
+        stmt = (
+            select(aliased(BorrowedBook, loan))
+            .add_cte(stock, reader)
+            .execution_options(populate_existing=True)
+        )
         try:
+            orm_model: BorrowedBook | None = (await self.session.scalars(stmt)).one_or_none()
+            if orm_model is None:
+                #  Запрос ничего не изменил: различаем отсутствие выдачи и повторный возврат
+                borrow_id = await self.session.scalar(select(BorrowedBook.id).where(BorrowedBook.id == id))
+                await self.session.rollback()
+                if borrow_id is None:
+                    raise CustomException(
+                        status_code=status.HTTP_404_NOT_FOUND,
+                        msg=Errors.NOT_EXISTS_ID(id)
+                    )
+                raise CustomException(
+                    msg=Errors.INVALID_OPERATION()
+                )
+            await self.publish(orm_model)
             await self.session.commit()
-            await self.session.refresh(orm_model)
+            await self.invalidate(orm_model)
             self.logger.info("%r was successfully saved" % orm_model)
             return orm_model
         except IntegrityError as error:
+            await self.session.rollback()
             self.logger.error(f"Error while orm_model saving", exc_info=error)
             raise CustomException(
-                msg=Errors.ALREADY_EXISTS()
+                msg=Errors.DATABASE_ERROR()
             )
@@ -1,5 +1,6 @@
-from typing import TYPE_CHECKING, Union
+from typing import TYPE_CHECKING, Any, Iterable, Optional, Union
 
+from src.tools.fast_json import Projection
 from .schemas import (
     BorrowedBookRead,
 )
@@ -17,11 +18,19 @@ async def serialize(model: "BorrowedBook") -> BorrowedBookRead:
 
 
 async def serialize_many(
-        model: Union["Book", "Reader"]
+        model: Union["Book", "Reader"],
+        borrowed_books: Optional[Iterable[Any]] = None,
 ):
-    bor_books_list = []
-    if hasattr(model, "borrowed_books"):
-        bor_books_list = [
-            await serialize(borrowed_book) for borrowed_book in model.borrowed_books
-        ]
+    if borrowed_books is None:
+        borrowed_books = model.borrowed_books if hasattr(model, "borrowed_books") else []
+    bor_books_list = [
+        await serialize(borrowed_book) for borrowed_book in borrowed_books
+    ]
     return sorted(bor_books_list, key=lambda x: x.id)
+
+
+borrowed_book_projection = Projection(BorrowedBookRead)
+
+
+def project_many(borrowed_books: Iterable[Any]) -> list[dict[str, Any]]:
+    return sorted(borrowed_book_projection.many(borrowed_books), key=lambda x: x["id"])
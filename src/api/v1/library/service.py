@@ -1,24 +1,27 @@
 import logging
+from contextlib import aclosing
+from datetime import datetime, timezone
 
-from datetime import datetime
-from fastapi import status
-from fastapi.responses import ORJSONResponse
+from fastapi import Response, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import TYPE_CHECKING
+from starlette.background import BackgroundTask
+from typing import TYPE_CHECKING, Literal, Optional
 
+from src.core.config import DBConfigurer
 from src.core.settings import settings
+from src.tools.columnar_stream import ColumnarStream
+from src.tools.cursor import Cursor
 from src.tools.exceptions import CustomException
+from src.tools.fast_json import FastJSON
 from .repository import LibraryRepository
 from .exceptions import Errors
 from .schemas import BorrowedBookCreate
-from ..books.schemas import BookUpdatePartial
-from ..books.service import BookService
+from .serializer import borrowed_book_projection
 
 if TYPE_CHECKING:
     from src.core.models import (
         Reader,
-        Book,
-        BorrowedBook,
     )
 
 CLASS = "Library"
@@ -33,15 +36,30 @@ class LibraryService:
         self.session = session
         self.logger = logging.getLogger(__name__)
 
-    async def get_one(
+    async def borrow_one(
             self,
-            id: int
+            book_id: int,
+            reader_id: int,
     ):
+        instance: BorrowedBookCreate = BorrowedBookCreate(
+            book_id=book_id,
+            reader_id=reader_id,
+        )
+
+        #  Создание выдачи и уменьшение количества экземпляров книги на складе на 1 выполняются
+        # одной транзакцией, все проверки делает база данных. Вернет ответ с ошибкой ORJSONResponse:
+        # - если нет записей в бд по выбранным reader_id и book_id
+        # - если количество выбранной позиции < 1
+        # - если превышен лимит на количество книг "на руках"
+        # - если у читателя уже есть такая книга "на руках"
         repository: LibraryRepository = LibraryRepository(
             session=self.session
         )
         try:
-            return await repository.get_one(id=id)
+            return await repository.borrow_one(
+                instance=instance,
+                max_items=settings.reader.READERS_MAX_ITEMS_AT_ONCE,
+            )
         except CustomException as exc:
             return ORJSONResponse(
                 status_code=exc.status_code,
@@ -51,66 +69,18 @@ class LibraryService:
                 }
             )
 
-    async def borrow_one(
+    async def return_one(
             self,
-            book: "Book",
-            reader: "Reader"
+            id: int
     ):
-        #  Вернет ответ с ошибкой ORJSONResponse, если нет записей в бд по выбранным reader_id и book_id
-        if isinstance(book, ORJSONResponse):
-            return book
-        if isinstance(reader, ORJSONResponse):
-            return reader
-
-        #  Вернет ответ с ошибкой ORJSONResponse, если количество выбранной позиции < 1
-        if book.quantity < 1:
-            return ORJSONResponse(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                content={
-                    "message": Errors.HANDLER_MESSAGE(),
-                    "detail": Errors.NOT_ENOUGH_QUANTITY(),
-                }
-            )
-
-        #  Вернет ответ с ошибкой ORJSONResponse, если превышен лимит на количество книг "на руках"
-        # В borrowed_books по выборке попадают только "актуальные" (невозвращенные) книги читателя
-        if len(reader.borrowed_books) >= settings.reader.READERS_MAX_ITEMS_AT_ONCE:
-            return ORJSONResponse(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                content={
-                    "message": Errors.HANDLER_MESSAGE(),
-                    "detail": Errors.LIMIT_REACHED()
-                }
-            )
-
-        #  Вернет ответ с ошибкой ORJSONResponse, если у читателя уже есть такая книга "на руках"
-        # В borrowed_books по выборке попадают только "актуальные" (невозвращенные) книги читателя
-        reader_books = [book.book_id for book in reader.borrowed_books]
-        if book.id in reader_books:
-            return ORJSONResponse(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                content={
-                    "message": Errors.HANDLER_MESSAGE(),
-                    "detail": Errors.SIMILAR_EXISTS()
-                }
-            )
-
-        instance: BorrowedBookCreate = BorrowedBookCreate(
-            book_id=book.id,
-            reader_id=reader.id,
-        )
-
-        book_instance: BookUpdatePartial = BookUpdatePartial(
-            quantity=book.quantity - 1
-        )
-
+        #  Фиксация даты возврата и увеличение количества экземпляров книги на складе на 1
+        # выполняются одной транзакцией. Вернет ответ с ошибкой ORJSONResponse, если нет записей
+        # в бд по выбранному borrow_id или книга уже возвращена
         repository: LibraryRepository = LibraryRepository(
             session=self.session
         )
         try:
-            result = await repository.create_one(
-                instance=instance
-            )
+            return await repository.return_one(id=id)
         except CustomException as exc:
             return ORJSONResponse(
                 status_code=exc.status_code,
@@ -120,46 +90,106 @@ class LibraryService:
                 }
             )
 
-        #  В случае успешного создания экземпляра "выдачи" BorrowedBook уменьшаем количество
-        # экземпляров текущей книги на складе на 1
-        if result:
-            book_service: BookService = BookService(
-                session=self.session
-            )
-            edition_result = await book_service.edit_one(
-                orm_model=book,
-                instance=book_instance,
-                is_partial=True,
-            )
-            if isinstance(edition_result, ORJSONResponse):
-                return edition_result
-        return result
-
-    async def return_one(
+    async def get_actual_info(
             self,
-            orm_model: "BorrowedBook"
+            reader: "Reader"
     ):
-        #  Вернет ответ с ошибкой ORJSONResponse, если нет записей в бд по выбранному  borrowed_id
-        if isinstance(orm_model, ORJSONResponse):
-            return orm_model
+        #  Вернет ответ с ошибкой ORJSONResponse, если нет читателя в бд по выбранному  id
+        if isinstance(reader, ORJSONResponse):
+            return reader
 
-        #  Вернет ответ с ошибкой ORJSONResponse, если книга уже возвращена
-        if orm_model.return_date is not None:
-            return ORJSONResponse(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                content={
-                    "message": Errors.HANDLER_MESSAGE(),
-                    "detail": Errors.INVALID_OPERATION(),
-                }
+        repository: LibraryRepository = LibraryRepository(
+            session=self.session
+        )
+        return await repository.get_actual_books(reader_id=reader.id)
+
+    @staticmethod
+    def to_naive_utc(
+            value: Optional[datetime],
+    ) -> Optional[datetime]:
+        #  borrow_date - timestamp without time zone, now() базы в UTC: момент с поясом (...Z, +03:00)
+        # приводится к UTC без пояса, иначе его нельзя ни сравнить с моментом без пояса, ни передать в asyncpg
+        if value is None or value.tzinfo is None:
+            return value
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+    @staticmethod
+    def validate_period(
+            borrowed_from: Optional[datetime],
+            borrowed_to: Optional[datetime],
+    ) -> tuple[Optional[datetime], Optional[datetime]]:
+        #  Возвращает границы периода, приведенные к UTC без пояса
+        borrowed_from, borrowed_to = LibraryService.to_naive_utc(borrowed_from), LibraryService.to_naive_utc(borrowed_to)
+        if borrowed_from is not None and borrowed_to is not None and borrowed_from >= borrowed_to:
+            raise CustomException(
+                msg=Errors.INVALID_PERIOD()
             )
+        return borrowed_from, borrowed_to
+
+    @staticmethod
+    def decode_loans_cursor(
+            cursor: str,
+    ) -> tuple[datetime, int]:
+        #  Курсор истории - (borrow_date в ISO 8601, id) последней выдачи страницы
+        borrow_date, id = Cursor.decode(cursor, length=2)
+        try:
+            if not Cursor.is_id(id):
+                raise TypeError
+            return datetime.fromisoformat(borrow_date), id
+        except (TypeError, ValueError):
+            raise CustomException(msg=Errors.INVALID_CURSOR())
 
-        #  Фиксируем в бд дату и время возврата книги
+    async def get_loans(
+            self,
+            owner: Literal["book_id", "reader_id"],
+            id: int,
+            size: int = 10,
+            cursor: Optional[str] = None,
+            status: Optional[Literal["active", "returned"]] = None,
+            borrowed_from: Optional[datetime] = None,
+            borrowed_to: Optional[datetime] = None,
+            response: Optional[Response] = None,
+    ):
+        #  Страница истории выдач книги или читателя. Ошибки (курсор, период, 404) - CustomException:
+        # ответ с ошибкой формирует сервис книг или читателей
+        borrowed_from, borrowed_to = self.validate_period(borrowed_from, borrowed_to)
+        after = self.decode_loans_cursor(cursor) if cursor else None
         repository: LibraryRepository = LibraryRepository(
             session=self.session
         )
-        orm_model.return_date = datetime.now()
+        result = await repository.get_loans(
+            owner=owner,
+            id=id,
+            size=size,
+            after=after,
+            status=status,
+            borrowed_from=borrowed_from,
+            borrowed_to=borrowed_to,
+        )
+        if not result:
+            #  Пустая страница: отличаем отсутствие книги или читателя от пустой истории (из кеша записей)
+            await repository.get_owner(owner=owner, id=id)
+        Cursor.set_next(
+            response=response,
+            items=result,
+            size=size,
+            key=lambda item: (item.borrow_date.isoformat(), item.id),
+        )
+        return FastJSON.response(borrowed_book_projection.many(result), response=response)
+
+    @staticmethod
+    async def export(
+            format: Literal["parquet", "arrow"] = "parquet",
+            borrowed_from: Optional[datetime] = None,
+            borrowed_to: Optional[datetime] = None,
+    ):
+        #  Выгрузка истории выдач для аналитики в Parquet или Arrow IPC из отдельной сессии со снимком базы:
+        # CSV из COPY собирается в колонки по LIBRARY_EXPORT_BATCH_SIZE строк, и каждая пачка сразу уходит
+        # клиенту record batch'ем (группой строк). Вернет ответ с ошибкой ORJSONResponse, если период задан
+        # неверно (400) или не установлен pyarrow (501)
         try:
-            result = await repository.save(orm_model)
+            borrowed_from, borrowed_to = LibraryService.validate_period(borrowed_from, borrowed_to)
+            ColumnarStream.get_arrow(format)
         except CustomException as exc:
             return ORJSONResponse(
                 status_code=exc.status_code,
@@ -169,42 +199,37 @@ class LibraryService:
                 }
             )
 
-        # В случае успешного добавления времени возрата книги в бд увеличиваем количество экземпляров
-        # возвращенной книги на 1
-        if result:
-            book_service: BookService = BookService(
-                session=self.session
+        session = await DBConfigurer.snapshot_session()
+        try:
+            repository: LibraryRepository = LibraryRepository(
+                session=session
             )
+            as_of = await repository.get_snapshot_time()
+        except BaseException:
+            await session.close()
+            raise
+
+        async def body():
+            #  При обрыве передачи вложенные генераторы закрываются явно и по порядку: COPY должен
+            # завершиться до закрытия сессии, иначе соединение занято и откат невозможен
             try:
-                book = await book_service.get_one(
-                    id=result.book_id
-                )
-            except CustomException as exc:
-                return ORJSONResponse(
-                    status_code=exc.status_code,
-                    content={
-                        "message": Errors.HANDLER_MESSAGE(),
-                        "detail": exc.msg,
-                    }
-                )
-            book_instance: BookUpdatePartial = BookUpdatePartial(
-                quantity=book.quantity + 1
-            )
-            edition_result = await book_service.edit_one(
-                orm_model=book,
-                instance=book_instance,
-                is_partial=True,
-            )
-            if isinstance(edition_result, ORJSONResponse):
-                return edition_result
-        return result
-
-    async def get_actual_info(
-            self,
-            reader: "Reader"
-    ):
-        #  Вернет ответ с ошибкой ORJSONResponse, если нет читателя в бд по выбранному  id
-        if isinstance(reader, ORJSONResponse):
-            return reader
-
-        return sorted([b_book.book for b_book in reader.borrowed_books], key=lambda x: x.id)
+                async with (
+                    aclosing(repository.export(borrowed_from=borrowed_from, borrowed_to=borrowed_to)) as rows,
+                    aclosing(ColumnarStream.write(
+                        rows, repository.EXPORT_COLUMNS, format, batch_size=settings.library.LIBRARY_EXPORT_BATCH_SIZE,
+                    )) as chunks,
+                ):
+                    async for chunk in chunks:
+                        yield chunk
+            finally:
+                await session.close()
+
+        headers = {
+            "Content-Disposition": 'attachment; filename="loans.%s"' % ColumnarStream.EXTENSIONS[format],
+            "X-Export-As-Of": as_of.isoformat(),
+        }
+        #  Закрытие в фоне - на случай, если клиент отключился до начала передачи и генератор не запускался
+        return StreamingResponse(
+            body(), media_type=ColumnarStream.MEDIA_TYPES[format], headers=headers,
+            background=BackgroundTask(session.close),
+        )
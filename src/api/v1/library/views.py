@@ -1,6 +1,8 @@
-from typing import TYPE_CHECKING
+from datetime import datetime
+from typing import TYPE_CHECKING, Literal, Optional
 
-from fastapi import APIRouter, status, Depends
+from fastapi import APIRouter, status, Depends, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.core.config import DBConfigurer
@@ -15,9 +17,7 @@ from ..books.schemas import BookLibList
 
 if TYPE_CHECKING:
     from src.core.models import (
-        Book,
         Reader,
-        BorrowedBook,
     )
 
 
@@ -79,7 +79,7 @@ router = APIRouter()
             "content": {
                 "application/json": {
                     "example": {
-                        "message": "Handled by Books exception handler",
+                        "message": "Handled by Library exception handler",
                         "detail": "Book with id=7 not exists",
                     }
                 }
@@ -88,8 +88,8 @@ router = APIRouter()
     }
 )
 async def borrow_one(
-        book: "Book" = Depends(deps.get_book),
-        reader: "Reader" = Depends(deps.get_reader_complex_actual),
+        book_id: int,
+        reader_id: int,
         session: AsyncSession = Depends(DBConfigurer.session_getter)
 ):
 
@@ -97,8 +97,8 @@ async def borrow_one(
         session=session
     )
     return await service.borrow_one(
-        book=book,
-        reader=reader,
+        book_id=book_id,
+        reader_id=reader_id,
     )
 
 
@@ -166,14 +166,14 @@ async def borrow_one(
     }
 )
 async def return_one(
-        borrowed_book: "BorrowedBook" = Depends(deps.get_one),
+        borrow_id: int,
         session: AsyncSession = Depends(DBConfigurer.session_getter)
 ):
     service: LibraryService = LibraryService(
         session=session
     )
     return await service.return_one(
-        orm_model=borrowed_book,
+        id=borrow_id,
     )
 
 
@@ -238,7 +238,7 @@ async def return_one(
     }
 )
 async def info(
-    reader: "Reader" = Depends(deps.get_reader_full_actual),
+    reader: "Reader" = Depends(deps.get_reader),
     session: AsyncSession = Depends(DBConfigurer.session_getter)
 ):
     service: LibraryService = LibraryService(
@@ -247,3 +247,78 @@ async def info(
     return await service.get_actual_info(
         reader=reader
     )
+
+
+@router.get(
+    "/loans/export",
+    dependencies=[Depends(current_user),],
+    status_code=status.HTTP_200_OK,
+    response_class=StreamingResponse,
+    description="Loan history (id, book_id, reader_id, borrow_date, return_date) in a columnar format for analytics, "
+                "consistent as of X-Export-As-Of (for librarians only)",
+    responses={
+        200: {
+            "description": "Parquet file or Arrow IPC stream, one row group (record batch) per LIBRARY_EXPORT_BATCH_SIZE loans",
+            "headers": {
+                "X-Export-As-Of": {
+                    "description": "Moment of the database snapshot the export was read from",
+                    "schema": {"type": "string", "format": "date-time"},
+                },
+            },
+            "content": {
+                "application/vnd.apache.parquet": {
+                    "schema": {"type": "string", "format": "binary"},
+                },
+                "application/vnd.apache.arrow.stream": {
+                    "schema": {"type": "string", "format": "binary"},
+                },
+            }
+        },
+        400: {
+            "description": "Bad Request",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "summary": "Invalid period",
+                        "value": {
+                            "message": "Handled by Library exception handler",
+                            "detail": "borrowed_from must be earlier than borrowed_to"
+                        }
+                    }
+                }
+            }
+        },
+        401: {
+            "description": "Unauthorized",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "summary": "User is not authenticated",
+                        "value": "Unauthorized"
+                    }
+                }
+            }
+        },
+        501: {
+            "description": "Columnar formats are not available",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "message": "Handled by Library exception handler",
+                        "detail": "Format parquet is not available: pyarrow is not installed",
+                    }
+                }
+            }
+        }
+    }
+)
+async def export_loans(
+        format: Literal["parquet", "arrow"] = Query("parquet", description="parquet - file, arrow - Arrow IPC stream"),
+        borrowed_from: Optional[datetime] = Query(None, description="Loans borrowed at or after this moment"),
+        borrowed_to: Optional[datetime] = Query(None, description="Loans borrowed before this moment"),
+):
+    return await LibraryService.export(
+        format=format,
+        borrowed_from=borrowed_from,
+        borrowed_to=borrowed_to,
+    )
@@ -1,14 +1,21 @@
 import logging
 
 from fastapi import status
-from sqlalchemy import select, Result
+from sqlalchemy import (
+    select, update, func, text, any_, bindparam, or_, exists, literal_column, true, Result, Select,
+    Table, Column, MetaData, Integer, String, Boolean,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, insert
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import joinedload, with_loader_criteria
-from typing import TYPE_CHECKING, Union, Optional
+from sqlalchemy.orm import joinedload, selectinload
+from typing import TYPE_CHECKING, Union, Optional, Sequence
 
 from src.core.models import Reader, BorrowedBook
+from src.core.config import CacheConfigurer
+from src.tools.data_loader import DataLoader
 from src.tools.exceptions import CustomException
+from src.tools.total_count import TotalCount
 from .exceptions import Errors
 
 if TYPE_CHECKING:
@@ -20,8 +27,27 @@ if TYPE_CHECKING:
 
 CLASS = "Reader"
 
+#  Промежуточная таблица синхронизации: весь список читателей в одной транзакции, удаляется при COMMIT.
+# Строки, не прошедшие проверку, тоже попадают сюда (valid=false): их email защищает читателя от деактивации
+SYNC_TABLE = Table(
+    "pat_reader_sync",
+    MetaData(),
+    Column("line", Integer),
+    Column("name", String),
+    Column("email", String),
+    Column("valid", Boolean),
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="DROP",
+)
+
 
 class ReaderRepository:
+    #  Колонки списков: читаются Core-запросом в легкие Row (кортежи с доступом по имени) без сборки
+    # ORM-объектов и регистрации их в identity map
+    LIST_COLUMNS = (Reader.id, Reader.name, Reader.email, Reader.active_loans, Reader.is_active)
+    #  Служебные колонки читаются при любом fields=: по ним строятся курсор страницы
+    REQUIRED_COLUMNS = ("id",)
+
     def __init__(
             self,
             session: AsyncSession,
@@ -29,30 +55,69 @@ class ReaderRepository:
         self.session = session
         self.logger = logging.getLogger(__name__)
 
-    async def get_all(
-            self,
+    @staticmethod
+    def paginate(
+            stmt: Select,
             page: Optional[int] = 1,
             size: Optional[int] = 10,
-    ):
-        stmt = select(Reader).order_by(Reader.id).offset((page - 1) * size).limit(size)
-        result: Result = await self.session.execute(stmt)
-        return result.unique().scalars().all()
+            after_id: Optional[int] = None,
+    ) -> Select:
+        #  Keyset-режим: страница начинается сразу за последним id предыдущей страницы,
+        # без OFFSET и чтения всех предшествующих строк
+        if after_id is not None:
+            return stmt.where(Reader.id > after_id).order_by(Reader.id).limit(size)
+        return stmt.order_by(Reader.id).offset((page - 1) * size).limit(size)
+
+    @classmethod
+    def get_columns(
+            cls,
+            fields: Optional[Sequence[str]] = None,
+    ) -> tuple:
+        #  Sparse fieldsets: SELECT только запрошенных колонок и служебных
+        if fields is None:
+            return cls.LIST_COLUMNS
+        return tuple(
+            column for column in cls.LIST_COLUMNS
+            if column.key in fields or column.key in cls.REQUIRED_COLUMNS
+        )
 
-    async def get_all_full(
+    async def get_all(
             self,
             page: Optional[int] = 1,
             size: Optional[int] = 10,
+            after_id: Optional[int] = None,
+            fields: Optional[Sequence[str]] = None,
     ):
-        stmt = (select(Reader).options(joinedload(Reader.borrowed_books))
-                .order_by(Reader.id).offset((page - 1) * size).limit(size))
+        stmt = self.paginate(select(*self.get_columns(fields)), page=page, size=size, after_id=after_id)
         result: Result = await self.session.execute(stmt)
-        return result.unique().scalars().all()
+        return result.all()
+
+    async def count(
+            self,
+            estimated: bool = False,
+    ) -> int:
+        stmt = select(Reader.id)
+        if estimated:
+            return await TotalCount.estimated(self.session, stmt)
+        return await TotalCount.exact(self.session, stmt)
+
+    @property
+    def loader(self) -> DataLoader:
+        #  Загрузчик читателей по id на время запроса: см. BookRepository.loader
+        return DataLoader.of(
+            self.session, "readers",
+            lambda ids: CacheConfigurer.entities.get_many(self.session, Reader, ids),
+        )
+
+    @property
+    def actual_loader(self) -> DataLoader:
+        return DataLoader.of(self.session, "readers_actual", self.get_many_actual)
 
     async def get_one(
             self,
             id: int
     ):
-        orm_model = await self.session.get(Reader, id)
+        orm_model = await self.loader.load(id)
         if not orm_model:
             raise CustomException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -67,10 +132,12 @@ class ReaderRepository:
     ):
         stmt = select(Reader).where(Reader.id == id)
         if actual:
+            #  Невозвращенные книги догружаются отдельным запросом "reader_id IN (...) AND return_date IS NULL",
+            # который целиком покрывается частичным индексом выдач, без JOIN по всей истории читателя
             stmt = stmt.options(
-                joinedload(Reader.borrowed_books).
-                joinedload(BorrowedBook.book),
-                with_loader_criteria(BorrowedBook, BorrowedBook.return_date == None)
+                selectinload(
+                    Reader.borrowed_books.and_(BorrowedBook.return_date.is_(None))
+                ).joinedload(BorrowedBook.book, innerjoin=True)
             )
         else:
             stmt = stmt.options(
@@ -87,23 +154,63 @@ class ReaderRepository:
             )
         return orm_model
 
+    async def get_many(
+            self,
+            keys: Sequence,
+            by: str = "id",
+    ):
+        #  По id - через загрузчик запроса: попадания из кеша записей, промахи одним запросом id IN (...),
+        # и те же записи уже загружены для других зависимостей запроса
+        if by == "id":
+            found = await self.loader.load_many(dict.fromkeys(keys))
+            return [orm_model for orm_model in found if orm_model is not None]
+        #  Пакетное чтение одним запросом: колонка = ANY(массив) - один параметр и один план при любом числе ключей
+        column = getattr(Reader, by)
+        stmt = select(*self.LIST_COLUMNS).where(
+            column == any_(bindparam("keys", list(set(keys)), type_=ARRAY(column.type)))
+        )
+        result: Result = await self.session.execute(stmt)
+        return result.all()
+
+    async def get_one_values(
+            self,
+            id: int
+    ):
+        #  Только для чтения: значения колонок из кеша записей (при промахе - Core-запрос), без ORM-объекта
+        values = await CacheConfigurer.entities.get_values(self.session, Reader, id)
+        if values is None:
+            raise CustomException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                msg=Errors.NOT_EXISTS_ID(id)
+            )
+        return values
+
+    async def get_many_actual(
+            self,
+            ids: list[int],
+    ) -> dict[int, Reader]:
+        #  Читатели с невозвращенными книгами: два запроса на любой набор id (читатели и их открытые выдачи)
+        stmt = select(Reader).where(Reader.id.in_(ids)).options(
+            selectinload(
+                Reader.borrowed_books.and_(BorrowedBook.return_date.is_(None))
+            )
+        )
+        result: Result = await self.session.execute(stmt)
+        return {orm_model.id: orm_model for orm_model in result.scalars()}
+
     async def get_one_complex(
             self,
             id: int = None,
             actual: bool = False,
     ):
-        stmt = select(Reader).where(Reader.id == id)
         if actual:
-            stmt = stmt.options(
-                joinedload(Reader.borrowed_books),
-                with_loader_criteria(BorrowedBook, BorrowedBook.return_date == None)
-            )
+            orm_model: Reader | None = await self.actual_loader.load(id)
         else:
-            stmt = stmt.options(
+            stmt = select(Reader).where(Reader.id == id).options(
                 joinedload(Reader.borrowed_books)
             )
-        result: Result = await self.session.execute(stmt)
-        orm_model: Reader | None = result.unique().scalar_one_or_none()
+            result: Result = await self.session.execute(stmt)
+            orm_model: Reader | None = result.unique().scalar_one_or_none()
 
         if not orm_model:
             raise CustomException(
@@ -112,6 +219,72 @@ class ReaderRepository:
             )
         return orm_model
 
+    async def sync_begin(self) -> None:
+        connection = await self.session.connection()
+        await connection.run_sync(SYNC_TABLE.create)
+
+    async def sync_many(
+            self,
+            rows: list[tuple],
+    ) -> tuple[int, int, list[int]]:
+        #  Пачка строк списка (line, name, email, valid): COPY в промежуточную таблицу и один
+        # INSERT ... ON CONFLICT (email) DO UPDATE по ее проверенным строкам. Повтор email - берется последняя строка;
+        # читатель без изменений не перезаписывается. Возвращает (добавлено, обновлено, id измененных)
+        connection = await self.session.connection()
+        raw = await connection.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            SYNC_TABLE.name, records=rows, columns=[column.name for column in SYNC_TABLE.columns],
+        )
+
+        staged = SYNC_TABLE.c
+        source = (
+            select(staged.name, staged.email, true())
+            .where(staged.valid, staged.line >= rows[0][0])
+            .distinct(staged.email)
+            .order_by(staged.email, staged.line.desc())
+        )
+        stmt = insert(Reader).from_select(["name", "email", "is_active"], source)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Reader.email],
+            set_={"name": stmt.excluded.name, "is_active": True},
+            where=or_(Reader.name != stmt.excluded.name, Reader.is_active.is_(False)),
+        ).returning(Reader.id, literal_column("xmax = 0"))
+        try:
+            changed = (await self.session.execute(stmt)).all()
+        except IntegrityError as exc:
+            await self.session.rollback()
+            self.logger.error("Error while syncing readers", exc_info=exc)
+            raise CustomException(
+                msg=Errors.DATABASE_ERROR()
+            )
+        ids = [row[0] for row in changed]
+        await CacheConfigurer.entities.publish(self.session, Reader, *ids)
+        inserted = sum(1 for row in changed if row[1])
+        return inserted, len(changed) - inserted, ids
+
+    async def sync_deactivate(self) -> list[int]:
+        #  Активные читатели, чьих email нет в списке. Временная таблица не анализируется автоматически, а
+        # статистика читателей сразу после загрузки списка устарела: планировщик может выбрать вложенные циклы
+        # с полным чтением списка на каждого читателя. С индексом по email любой план - поиск по индексу
+        await self.session.execute(text(f"CREATE INDEX ON {SYNC_TABLE.name} (email)"))
+        await self.session.execute(text(f"ANALYZE {SYNC_TABLE.name}"))
+        stmt = (
+            update(Reader)
+            .where(Reader.is_active, ~exists().where(SYNC_TABLE.c.email == Reader.email))
+            .values(is_active=False)
+            .returning(Reader.id)
+        )
+        ids = (await self.session.scalars(stmt)).all()
+        await CacheConfigurer.entities.publish(self.session, Reader, *ids)
+        return list(ids)
+
+    async def sync_commit(
+            self,
+            ids: list[int],
+    ) -> None:
+        await self.session.commit()
+        await CacheConfigurer.entities.invalidate(Reader, *ids)
+
     async def create_one(
             self,
             instance: "ReaderCreate"
@@ -119,8 +292,11 @@ class ReaderRepository:
         orm_model = Reader(**instance.model_dump())
         try:
             self.session.add(orm_model)
+            await self.session.flush()
+            await CacheConfigurer.entities.publish(self.session, Reader, orm_model.id)
             await self.session.commit()
             await self.session.refresh(orm_model)
+            await CacheConfigurer.entities.invalidate(Reader, orm_model.id)
             self.logger.info("%r was successfully created" % orm_model)
             return orm_model
         except IntegrityError as error:
@@ -136,7 +312,11 @@ class ReaderRepository:
         try:
             self.logger.info(f"Deleting %r from database" % orm_model)
             await self.session.delete(orm_model)
+            await CacheConfigurer.entities.publish(self.session, Reader, orm_model.id)
             await self.session.commit()
+            self.loader.clear(orm_model.id)
+            self.actual_loader.clear(orm_model.id)
+            await CacheConfigurer.entities.invalidate(Reader, orm_model.id)
         except IntegrityError as exc:
             self.logger.error("Error while deleting data from database", exc_info=exc)
             raise CustomException(
@@ -157,8 +337,10 @@ class ReaderRepository:
 
         self.logger.warning(f"Editing %r in database" % orm_model)
         try:
+            await CacheConfigurer.entities.publish(self.session, Reader, orm_model.id)
             await self.session.commit()
             await self.session.refresh(orm_model)
+            await CacheConfigurer.entities.invalidate(Reader, orm_model.id)
             self.logger.info("%r was successfully edited" % orm_model)
             return orm_model
         except IntegrityError as exc:
@@ -166,3 +348,29 @@ class ReaderRepository:
             raise CustomException(
                 msg=Errors.ALREADY_EXISTS()
             )
+
+    async def recount_active_loans(self) -> int:
+        #  Таблица читателей закрыта для изменений на время пересчета (выдачи и возвраты подождут,
+        # чтение не блокируется), поэтому счетчики сверяются с фактическими выдачами без гонок
+        await self.session.execute(
+            text(f"LOCK TABLE {Reader.__tablename__} IN SHARE ROW EXCLUSIVE MODE")
+        )
+        actual_loans = (
+            select(func.count())
+            .where(BorrowedBook.reader_id == Reader.id, BorrowedBook.return_date.is_(None))
+            .scalar_subquery()
+        )
+        stmt = (
+            update(Reader)
+            .where(Reader.active_loans != actual_loans)
+            .values(active_loans=actual_loans)
+            .returning(Reader.id)
+        )
+        result: Result = await self.session.execute(stmt)
+        fixed_ids = result.scalars().all()
+        await CacheConfigurer.entities.publish(self.session, Reader, *fixed_ids)
+        await self.session.commit()
+        await CacheConfigurer.entities.invalidate(Reader, *fixed_ids)
+        if fixed_ids:
+            self.logger.warning("Active loans counter was recounted for readers %s" % fixed_ids)
+        return len(fixed_ids)
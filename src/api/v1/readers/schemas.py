@@ -1,6 +1,9 @@
-from typing import Annotated, Optional, Any
+from typing import Annotated, Optional, Any, Union
 
-from pydantic import BaseModel, ConfigDict, Field, EmailStr
+from pydantic import AfterValidator, BaseModel, ConfigDict, Field, EmailStr, model_validator
+
+from src.core.settings import settings
+from .validators import Validator
 
 base_name_field = Annotated[str, Field(
     title="Reader's name",
@@ -10,6 +13,14 @@ base_email_field = Annotated[EmailStr, Field(
     title="Reader's email"
 )]
 
+base_active_loans_field = Annotated[int, Field(
+    title="Reader's number of items on hands"
+)]
+
+base_is_active_field = Annotated[bool, Field(
+    title="Reader is present in the last roster sync"
+)]
+
 
 class BaseReader(BaseModel):
     model_config = ConfigDict(from_attributes=True)
@@ -20,6 +31,8 @@ class BaseReader(BaseModel):
 
 class ReaderRead(BaseReader):
     id: int
+    active_loans: base_active_loans_field = 0
+    is_active: base_is_active_field = True
 
 
 class ReaderCreate(BaseReader):
@@ -37,3 +50,47 @@ class ReaderUpdatePartial(BaseReader):
 
 class ReaderExtended(ReaderRead):
     borrowed_books: Any
+    borrowed_total: Optional[int] = None
+
+
+class ReaderAvailability(ReaderRead):
+    can_borrow: bool
+
+
+class ReaderBatch(BaseModel):
+    ids: Optional[list[int]] = Field(None, min_length=1, max_length=settings.reader.READERS_BATCH_MAX_SIZE)
+    emails: Optional[list[str]] = Field(None, min_length=1, max_length=settings.reader.READERS_BATCH_MAX_SIZE)
+
+    @model_validator(mode="after")
+    def check_one_key(self):
+        if (self.ids is None) == (self.emails is None):
+            raise ValueError("Exactly one of ids or emails is required")
+        return self
+
+
+class ReaderBatchItem(BaseModel):
+    key: Union[int, str]
+    found: bool
+    item: Optional[ReaderAvailability] = None
+
+
+class ReaderSyncItem(BaseModel):
+    #  Строка списка синхронизации: те же поля и правила, что у ReaderCreate, email проверяется быстрее
+    name: base_name_field
+    email: Annotated[str, AfterValidator(Validator.validate_email), Field(title="Reader's email")]
+
+
+class ReaderSyncError(BaseModel):
+    line: int
+    detail: str
+
+
+class ReaderSyncReport(BaseModel):
+    rows: int
+    inserted: int
+    updated: int
+    unchanged: int
+    deactivated: int
+    failed: int
+    errors: list[ReaderSyncError]
+    errors_truncated: bool
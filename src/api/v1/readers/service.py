@@ -1,17 +1,28 @@
 import logging
-from typing import TYPE_CHECKING, Optional
+from datetime import datetime
+from typing import TYPE_CHECKING, AsyncIterator, Literal, Optional
 
+from fastapi import Response
 from fastapi.responses import ORJSONResponse
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.core.settings import settings
+from src.tools.cursor import Cursor
 from src.tools.exceptions import CustomException
+from src.tools.fast_json import FastJSON
+from src.tools.row_stream import RowStream
+from src.tools.total_count import TotalCount
 from .repository import ReaderRepository
+from .counts import counts_cache
 from .exceptions import Errors
-from .serializer import serialize
+from .serializer import serialize, project_many, project_batch, short_projection
 from .schemas import (
     ReaderCreate,
     ReaderUpdate,
     ReaderUpdatePartial,
+    ReaderBatch,
+    ReaderSyncItem,
 )
 
 if TYPE_CHECKING:
@@ -35,28 +46,108 @@ class ReaderService:
             self,
             page: Optional[int] = 1,
             size: Optional[int] = 10,
+            cursor: Optional[str] = None,
+            response: Optional[Response] = None,
+            fields: Optional[str] = None,
+            include_total: Optional[str] = None,
     ):
+        try:
+            after_id = Cursor.decode_id(cursor) if cursor else None
+            projection = short_projection.only(fields)
+        except CustomException as exc:
+            return ORJSONResponse(
+                status_code=exc.status_code,
+                content={
+                    "message": Errors.HANDLER_MESSAGE(),
+                    "detail": exc.msg,
+                }
+            )
         repository: ReaderRepository = ReaderRepository(
             session=self.session
         )
-        return await repository.get_all(
+        result = await repository.get_all(
             page=page,
             size=size,
+            after_id=after_id,
+            fields=projection.fields,
+        )
+        Cursor.set_next(response=response, items=result, size=size)
+        if include_total is not None:
+            TotalCount.set(response=response, total=await self.get_total(mode=include_total))
+        return FastJSON.response(projection.many(result), response=response)
+
+    async def get_total(
+            self,
+            mode: str,
+    ) -> int:
+        repository: ReaderRepository = ReaderRepository(
+            session=self.session
+        )
+        if mode == "estimated":
+            return await repository.count(estimated=True)
+        return await counts_cache.get_or_compute(
+            signature="",
+            compute=lambda: repository.count(),
         )
 
     async def get_all_full(
             self,
             page: Optional[int] = 1,
             size: Optional[int] = 10,
+            cursor: Optional[str] = None,
+            history_limit: Optional[int] = settings.library.LIBRARY_HISTORY_LIMIT,
+            response: Optional[Response] = None,
     ):
+        from ..library.repository import LibraryRepository
+
+        try:
+            after_id = Cursor.decode_id(cursor) if cursor else None
+        except CustomException as exc:
+            return ORJSONResponse(
+                status_code=exc.status_code,
+                content={
+                    "message": Errors.HANDLER_MESSAGE(),
+                    "detail": exc.msg,
+                }
+            )
         repository: ReaderRepository = ReaderRepository(
             session=self.session
         )
-        result = await repository.get_all_full(
+        result = await repository.get_all(
             page=page,
             size=size,
+            after_id=after_id,
+        )
+        Cursor.set_next(response=response, items=result, size=size)
+
+        #  История выдач грузится отдельным запросом на всю страницу и ограничена history_limit
+        # последними выдачами на каждый объект
+        library_repository: LibraryRepository = LibraryRepository(
+            session=self.session
+        )
+        history, totals = await library_repository.get_history(
+            owner="reader_id",
+            ids=[item.id for item in result],
+            limit=history_limit,
+        )
+        return FastJSON.response(
+            project_many(result, history=history, totals=totals),
+            response=response,
         )
-        return [await serialize(model=item) for item in result]
+
+    async def get_batch(
+            self,
+            batch: ReaderBatch,
+    ):
+        by, keys = ("id", batch.ids) if batch.ids is not None else ("email", batch.emails)
+        repository: ReaderRepository = ReaderRepository(
+            session=self.session
+        )
+        rows = await repository.get_many(
+            keys=keys,
+            by=by,
+        )
+        return FastJSON.response(project_batch(keys, rows, by=by))
 
     async def get_one(
             self,
@@ -76,19 +167,97 @@ class ReaderService:
                 }
             )
 
+    async def get_one_values(
+            self,
+            id: int,
+            fields: Optional[str] = None,
+    ):
+        #  Путь только для чтения (GET /readers/{id}): значения колонок без ORM-объекта и модели pydantic.
+        # Зависимости, которым нужен объект в сессии (выдача, изменение), используют get_one
+        repository: ReaderRepository = ReaderRepository(
+            session=self.session
+        )
+        try:
+            projection = short_projection.only(fields)
+            values = await repository.get_one_values(id=id)
+        except CustomException as exc:
+            return ORJSONResponse(
+                status_code=exc.status_code,
+                content={
+                    "message": Errors.HANDLER_MESSAGE(),
+                    "detail": exc.msg,
+                }
+            )
+        return FastJSON.response(projection.from_mapping(values))
+
     async def get_one_complex(
             self,
             id: int,
             actual: bool = False,
-            to_schema: bool = True
+            to_schema: bool = True,
+            history_limit: Optional[int] = settings.library.LIBRARY_HISTORY_LIMIT,
     ):
+        from ..library.repository import LibraryRepository
+
         repository: ReaderRepository = ReaderRepository(
             session=self.session
         )
         try:
-            result = await repository.get_one_complex(
+            if actual:
+                result = await repository.get_one_complex(
+                    id=id,
+                    actual=actual,
+                )
+            else:
+                result = await repository.get_one(id=id)
+        except CustomException as exc:
+            return ORJSONResponse(
+                status_code=exc.status_code,
+                content={
+                    "message": Errors.HANDLER_MESSAGE(),
+                    "detail": exc.msg,
+                }
+            )
+        if actual:
+            return await serialize(model=result) if to_schema else result
+
+        #  Не больше history_limit последних выдач (полная история - постранично в GET /readers/{id}/loans),
+        # borrowed_total - общее количество выдач
+        library_repository: LibraryRepository = LibraryRepository(
+            session=self.session
+        )
+        history, totals = await library_repository.get_history(
+            owner="reader_id",
+            ids=[id],
+            limit=history_limit,
+        )
+        return await serialize(model=result, borrowed_books=history.get(id, []), borrowed_total=totals.get(id, 0))
+
+    async def get_loans(
+            self,
+            id: int,
+            size: Optional[int] = 10,
+            cursor: Optional[str] = None,
+            status: Optional[Literal["active", "returned"]] = None,
+            borrowed_from: Optional[datetime] = None,
+            borrowed_to: Optional[datetime] = None,
+            response: Optional[Response] = None,
+    ):
+        from ..library.service import LibraryService
+
+        library_service: LibraryService = LibraryService(
+            session=self.session
+        )
+        try:
+            return await library_service.get_loans(
+                owner="reader_id",
                 id=id,
-                actual=actual,
+                size=size,
+                cursor=cursor,
+                status=status,
+                borrowed_from=borrowed_from,
+                borrowed_to=borrowed_to,
+                response=response,
             )
         except CustomException as exc:
             return ORJSONResponse(
@@ -98,9 +267,6 @@ class ReaderService:
                     "detail": exc.msg,
                 }
             )
-        if to_schema:
-            return await serialize(model=result)
-        return result
 
     async def get_one_full(
             self,
@@ -144,6 +310,73 @@ class ReaderService:
                 }
             )
 
+    async def sync_many(
+            self,
+            chunks: AsyncIterator[bytes],
+            format: Literal["csv", "ndjson"],
+            deactivate_missing: bool = False,
+    ):
+        #  Весь список применяется в одной транзакции: пачки по READERS_SYNC_CHUNK_SIZE строк загружаются по мере
+        # чтения тела запроса, деактивация отсутствующих - после последней пачки. Оборванная передача или ошибка
+        # базы не оставляет частично примененного списка. Пустой список никого не деактивирует
+        repository: ReaderRepository = ReaderRepository(
+            session=self.session
+        )
+        report = {
+            "rows": 0, "inserted": 0, "updated": 0, "unchanged": 0, "deactivated": 0, "failed": 0,
+            "errors": [], "errors_truncated": False,
+        }
+        changed: list[int] = []
+
+        def fail(line: int, detail: str) -> None:
+            report["failed"] += 1
+            if len(report["errors"]) < settings.reader.READERS_SYNC_MAX_ERRORS:
+                report["errors"].append({"line": line, "detail": detail})
+            else:
+                report["errors_truncated"] = True
+
+        async def load(chunk: list[tuple]) -> None:
+            inserted, updated, ids = await repository.sync_many(rows=chunk)
+            valid = sum(1 for row in chunk if row[3])
+            report["inserted"] += inserted
+            report["updated"] += updated
+            report["unchanged"] += valid - inserted - updated
+            changed.extend(ids)
+
+        try:
+            await repository.sync_begin()
+            chunk: list[tuple] = []
+            async for line, row, error in RowStream.rows(chunks, format=format):
+                report["rows"] += 1
+                try:
+                    if error is not None:
+                        raise ValueError(error)
+                    instance = ReaderSyncItem.model_validate(row)
+                    chunk.append((line, instance.name, instance.email, True))
+                except (ValueError, ValidationError) as exc:
+                    fail(line, RowStream.errors(exc))
+                    email = (row or {}).get("email")
+                    chunk.append((line, None, email if isinstance(email, str) else None, False))
+                if len(chunk) >= settings.reader.READERS_SYNC_CHUNK_SIZE:
+                    await load(chunk)
+                    chunk = []
+            if chunk:
+                await load(chunk)
+            if deactivate_missing and report["rows"]:
+                deactivated = await repository.sync_deactivate()
+                report["deactivated"] = len(deactivated)
+                changed.extend(deactivated)
+            await repository.sync_commit(ids=changed)
+        except CustomException as exc:
+            return ORJSONResponse(
+                status_code=exc.status_code,
+                content={
+                    "message": Errors.HANDLER_MESSAGE(),
+                    "detail": exc.msg,
+                }
+            )
+        return report
+
     async def delete_one(
             self,
             orm_model: "Reader",
@@ -1,19 +1,26 @@
-from typing import TYPE_CHECKING
+from datetime import datetime
+from typing import TYPE_CHECKING, Literal, Optional
 
-from fastapi import APIRouter, status, Depends, Query
+from fastapi import APIRouter, status, Depends, Query, Response, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.core.config import DBConfigurer
+from src.core.settings import settings
+from src.tools.row_stream import RowStream
 from .schemas import (
     ReaderRead,
     ReaderExtended,
     ReaderCreate,
     ReaderUpdate,
     ReaderUpdatePartial,
+    ReaderBatch,
+    ReaderBatchItem,
+    ReaderSyncReport,
 )
 from .service import ReaderService
 from . import dependencies as deps
 from ..auth.dependencies import current_user
+from ..library.schemas import BorrowedBookRead
 
 if TYPE_CHECKING:
     from src.core.models import (
@@ -33,6 +40,16 @@ router = APIRouter()
         description="Get the list of the all items (for librarians only)",
         responses={
             200: {
+                "headers": {
+                    "X-Next-Cursor": {
+                        "description": "Cursor of the next page, absent on the last page",
+                        "schema": {"type": "string"},
+                    },
+                    "X-Total-Count": {
+                        "description": "Total number of items, only with include_total (estimated - approximate)",
+                        "schema": {"type": "integer"},
+                    },
+                },
                 "content": {
                     "application/json": {
                         "examples": {
@@ -43,11 +60,15 @@ router = APIRouter()
                                         "id": 1,
                                         "name": "Angelina",
                                         "email": "angel@mail.ru",
+                                        "active_loans": 1,
+                                        "is_active": True,
                                     },
                                     {
                                         "id": 75,
                                         "name": "Alexey",
                                         "email": "a234@gmail.com",
+                                        "active_loans": 1,
+                                        "is_active": True,
                                     }
                                 ]
                             }
@@ -55,6 +76,17 @@ router = APIRouter()
                     }
                 }
             },
+            400: {
+                "description": "Unknown field requested in fields",
+                "content": {
+                    "application/json": {
+                        "example": {
+                            "message": "Handled by Readers exception handler",
+                            "detail": "Unknown fields requested: title. Allowed fields: name, email, id, active_loans",
+                        }
+                    }
+                }
+            },
             401: {
                 "description": "Unauthorized",
                 "content": {
@@ -92,8 +124,22 @@ router = APIRouter()
         }
 )
 async def get_all(
+        response: Response,
         page: int = Query(1, gt=0, description="Result list page number, greater than 0"),
         size: int = Query(10, gt=0, description="Result list page size, greater than 0"),
+        cursor: Optional[str] = Query(
+            None,
+            description="Opaque cursor from the X-Next-Cursor header of the previous page, page is ignored",
+        ),
+        fields: Optional[str] = Query(
+            None,
+            description="Comma-separated response fields (sparse fieldset), e.g. id,name",
+        ),
+        include_total: Optional[Literal["exact", "estimated"]] = Query(
+            None,
+            description="Return the total number of items in the X-Total-Count header: "
+                        "exact - COUNT(*), estimated - planner statistics, without reading the table",
+        ),
         session: AsyncSession = Depends(DBConfigurer.session_getter)
 ):
     service: ReaderService = ReaderService(
@@ -102,6 +148,10 @@ async def get_all(
     return await service.get_all(
         page=page,
         size=size,
+        cursor=cursor,
+        response=response,
+        fields=fields,
+        include_total=include_total,
     )
 
 
@@ -114,6 +164,12 @@ async def get_all(
         description="Get the list of the all items (for librarians only)",
         responses={
             200: {
+                "headers": {
+                    "X-Next-Cursor": {
+                        "description": "Cursor of the next page, absent on the last page",
+                        "schema": {"type": "string"},
+                    }
+                },
                 "content": {
                     "application/json": {
                         "examples": {
@@ -124,6 +180,8 @@ async def get_all(
                                         "id": 1,
                                         "name": "Angelina",
                                         "email": "angel@mail.ru",
+                                        "active_loans": 1,
+                                        "is_active": True,
                                         "borrowed_books": [
                                             {
                                                 "id": 1,
@@ -139,12 +197,15 @@ async def get_all(
                                                 "borrow_date": "2022-06-04T17:28:17.170342",
                                                 "return_date": "2022-09-04T17:28:17.170342"
                                             }
-                                        ]
+                                        ],
+                                        "borrowed_total": 2
                                     },
                                     {
                                         "id": 75,
                                         "name": "Alexey",
                                         "email": "a234@gmail.com",
+                                        "active_loans": 1,
+                                        "is_active": True,
                                         "borrowed_books": [
                                             {
                                                 "id": 1,
@@ -160,7 +221,8 @@ async def get_all(
                                                 "borrow_date": "2022-06-04T17:28:17.170342",
                                                 "return_date": "2022-09-04T17:28:17.170342"
                                             }
-                                        ]
+                                        ],
+                                        "borrowed_total": 2
                                     }
                                 ]
                             }
@@ -205,8 +267,19 @@ async def get_all(
         }
 )
 async def get_all(
+        response: Response,
         page: int = Query(1, gt=0, description="Result list page number, greater than 0"),
         size: int = Query(10, gt=0, description="Result list page size, greater than 0"),
+        cursor: Optional[str] = Query(
+            None,
+            description="Opaque cursor from the X-Next-Cursor header of the previous page, page is ignored",
+        ),
+        history_limit: int = Query(
+            settings.library.LIBRARY_HISTORY_LIMIT,
+            gt=0,
+            le=settings.library.LIBRARY_HISTORY_MAX_LIMIT,
+            description="Max number of the most recent loans returned for every item",
+        ),
         session: AsyncSession = Depends(DBConfigurer.session_getter)
 ):
     service: ReaderService = ReaderService(
@@ -215,6 +288,9 @@ async def get_all(
     return await service.get_all_full(
         page=page,
         size=size,
+        cursor=cursor,
+        history_limit=history_limit,
+        response=response,
     )
 
 
@@ -236,12 +312,25 @@ async def get_all(
                                 "id": 1,
                                 "name": "Angelina",
                                 "email": "angel@mail.ru",
+                                "active_loans": 1,
+                                "is_active": True,
                             },
                         }
                     }
                 }
             }
         },
+        400: {
+            "description": "Unknown field requested in fields",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "message": "Handled by Readers exception handler",
+                        "detail": "Unknown fields requested: title. Allowed fields: name, email, id, active_loans",
+                    }
+                }
+            }
+        },
         401: {
             "description": "Unauthorized",
             "content": {
@@ -268,13 +357,18 @@ async def get_all(
 )
 async def get_one(
         id: int,
+        fields: Optional[str] = Query(
+            None,
+            description="Comma-separated response fields (sparse fieldset), e.g. id,name",
+        ),
         session: AsyncSession = Depends(DBConfigurer.session_getter)
 ):
     service: ReaderService = ReaderService(
         session=session
     )
-    return await service.get_one(
-        id=id
+    return await service.get_one_values(
+        id=id,
+        fields=fields,
     )
 
 
@@ -284,7 +378,7 @@ async def get_one(
     dependencies=[Depends(current_user), ],
     status_code=status.HTTP_200_OK,
     response_model=ReaderExtended,
-    description="Get the item by id with all relations (for librarians only)",
+    description="Get the item by id with the most recent loans and their total (for librarians only)",
     responses={
         200: {
             "content": {
@@ -296,6 +390,8 @@ async def get_one(
                                 "id": 1,
                                 "name": "Angelina",
                                 "email": "angel@mail.ru",
+                                "active_loans": 1,
+                                "is_active": True,
                                 "borrowed_books": [
                                     {
                                         "id": 1,
@@ -304,7 +400,8 @@ async def get_one(
                                         "borrow_date": "2022-06-04T17:28:17.170342",
                                         "return_date": None
                                     },
-                                ]
+                                ],
+                                "borrowed_total": 1
                             },
                         }
                     }
@@ -337,13 +434,20 @@ async def get_one(
 )
 async def get_one_complex(
         id: int,
+        history_limit: int = Query(
+            settings.library.LIBRARY_HISTORY_LIMIT,
+            gt=0,
+            le=settings.library.LIBRARY_HISTORY_MAX_LIMIT,
+            description="Max number of the most recent loans returned, the whole history is at /{id}/loans",
+        ),
         session: AsyncSession = Depends(DBConfigurer.session_getter)
 ):
     service: ReaderService = ReaderService(
         session=session
     )
     return await service.get_one_complex(
-        id=id
+        id=id,
+        history_limit=history_limit,
     )
 
 
@@ -365,6 +469,8 @@ async def get_one_complex(
                                 "id": 1,
                                 "name": "Angelina",
                                 "email": "angel@mail.ru",
+                                "active_loans": 1,
+                                "is_active": True,
                                 "borrowed_books": [
                                     {
                                         "id": 1,
@@ -373,7 +479,8 @@ async def get_one_complex(
                                         "borrow_date": "2022-06-04T17:28:17.170342",
                                         "return_date": None
                                     },
-                                ]
+                                ],
+                                "borrowed_total": 1
                             },
                         }
                     }
@@ -417,6 +524,129 @@ async def get_one_complex_actual(
     )
 
 
+# 2_3
+@router.get(
+    "/{id}/loans",
+    dependencies=[Depends(current_user), ],
+    status_code=status.HTTP_200_OK,
+    response_model=list[BorrowedBookRead],
+    description="Loan history of the reader, the most recent first, page by page (for librarians only)",
+    responses={
+        200: {
+            "headers": {
+                "X-Next-Cursor": {
+                    "description": "Cursor of the next page, absent on the last page",
+                    "schema": {"type": "string"},
+                },
+            },
+            "content": {
+                "application/json": {
+                    "examples": {
+                        "example1": {
+                            "summary": "A page of the loan history",
+                            "value": [
+                                {
+                                    "id": 21,
+                                    "book_id": 1,
+                                    "reader_id": 24,
+                                    "borrow_date": "2022-09-04T17:28:17.170342",
+                                    "return_date": None
+                                },
+                                {
+                                    "id": 1,
+                                    "book_id": 1,
+                                    "reader_id": 18,
+                                    "borrow_date": "2022-06-04T17:28:17.170342",
+                                    "return_date": "2022-07-04T17:28:17.170342"
+                                }
+                            ],
+                        }
+                    }
+                }
+            }
+        },
+        400: {
+            "description": "Bad Request",
+            "content": {
+                "application/json": {
+                    "examples": {
+                        "example1": {
+                            "summary": "Invalid cursor",
+                            "value": {
+                                "message": "Handled by Readers exception handler",
+                                "detail": "Invalid pagination cursor"
+                            }
+                        },
+                        "example2": {
+                            "summary": "Invalid period",
+                            "value": {
+                                "message": "Handled by Readers exception handler",
+                                "detail": "borrowed_from must be earlier than borrowed_to"
+                            }
+                        }
+                    }
+                }
+            }
+        },
+        401: {
+            "description": "Unauthorized",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "summary": "User is not authenticated",
+                        "value": "Unauthorized"
+                    }
+                }
+            }
+        },
+        404: {
+            "description": "Reader not found",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "message": "Handled by Readers exception handler",
+                        "detail": "Reader with id=7 not exists",
+                    }
+                }
+            }
+        }
+    }
+)
+async def get_loans(
+        id: int,
+        response: Response,
+        size: int = Query(
+            10,
+            gt=0,
+            le=settings.library.LIBRARY_HISTORY_MAX_LIMIT,
+            description="Result list page size, greater than 0",
+        ),
+        cursor: Optional[str] = Query(
+            None,
+            description="Opaque cursor from the X-Next-Cursor header of the previous page",
+        ),
+        status: Optional[Literal["active", "returned"]] = Query(
+            None,
+            description="active - not returned yet, returned - returned loans only",
+        ),
+        borrowed_from: Optional[datetime] = Query(None, description="Loans borrowed at or after this moment"),
+        borrowed_to: Optional[datetime] = Query(None, description="Loans borrowed before this moment"),
+        session: AsyncSession = Depends(DBConfigurer.session_getter)
+):
+    service: ReaderService = ReaderService(
+        session=session
+    )
+    return await service.get_loans(
+        id=id,
+        size=size,
+        cursor=cursor,
+        status=status,
+        borrowed_from=borrowed_from,
+        borrowed_to=borrowed_to,
+        response=response,
+    )
+
+
 # 3
 @router.post(
     "",
@@ -435,6 +665,8 @@ async def get_one_complex_actual(
                                 "id": 1,
                                 "name": "Angelina",
                                 "email": "angel@mail.ru",
+                                "active_loans": 1,
+                                "is_active": True,
                             },
                         }
                     }
@@ -502,6 +734,184 @@ async def create_one(
     )
 
 
+# 3_1
+@router.post(
+    "/batch",
+    dependencies=[Depends(current_user),],
+    status_code=status.HTTP_200_OK,
+    response_model=list[ReaderBatchItem],
+    description="Get many items by ids or emails in one request, in the order of the request (for librarians only)",
+    responses={
+        200: {
+            "content": {
+                "application/json": {
+                    "examples": {
+                        "example1": {
+                            "summary": "Readers by emails, one not found",
+                            "value": [
+                                {
+                                    "key": "angel@mail.ru",
+                                    "found": True,
+                                    "item": {
+                                        "name": "Angelina",
+                                        "email": "angel@mail.ru",
+                                        "id": 1,
+                                        "active_loans": 1,
+                                        "is_active": True,
+                                        "can_borrow": True
+                                    }
+                                },
+                                {
+                                    "key": "nobody@mail.ru",
+                                    "found": False,
+                                    "item": None
+                                }
+                            ]
+                        }
+                    }
+                }
+            }
+        },
+        401: {
+            "description": "Unauthorized",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "summary": "User is not authenticated",
+                        "value": "Unauthorized"
+                    }
+                }
+            }
+        },
+        422: {
+            "description": "Invalid JSON-format or data.",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "message": "Handled by Application Exception Handler",
+                        "detail": [
+                            {
+                                "type": "value_error",
+                                "loc": ["body"],
+                                "msg": "Value error, Exactly one of ids or emails is required",
+                                "input": {},
+                            }
+                        ]
+                    }
+                }
+            }
+        }
+    }
+)
+async def get_batch(
+        batch: ReaderBatch,
+        session: AsyncSession = Depends(DBConfigurer.session_getter)
+):
+    service: ReaderService = ReaderService(
+        session=session
+    )
+    return await service.get_batch(
+        batch=batch,
+    )
+
+
+# 3_2
+@router.post(
+    "/sync",
+    dependencies=[Depends(current_user),],
+    status_code=status.HTTP_200_OK,
+    response_model=ReaderSyncReport,
+    description="Apply a full reader roster (CSV with header or NDJSON: name, email) in one transaction, "
+                "upsert by email (for librarians only)",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "text/csv": {
+                    "schema": {"type": "string"},
+                    "example": "name,email\nIvan Petrov,ivan.petrov@mail.com\n",
+                },
+                "application/x-ndjson": {
+                    "schema": {"type": "string"},
+                    "example": '{"name": "Ivan Petrov", "email": "ivan.petrov@mail.com"}\n',
+                },
+            },
+        },
+    },
+    responses={
+        200: {
+            "content": {
+                "application/json": {
+                    "examples": {
+                        "example1": {
+                            "summary": "Nightly roster applied, missing readers deactivated",
+                            "value": {
+                                "rows": 200000,
+                                "inserted": 1200,
+                                "updated": 310,
+                                "unchanged": 198489,
+                                "deactivated": 95,
+                                "failed": 1,
+                                "errors": [
+                                    {
+                                        "line": 5120,
+                                        "detail": "email: value is not a valid email address: "
+                                                  "An email address must have an @-sign."
+                                    }
+                                ],
+                                "errors_truncated": False
+                            }
+                        }
+                    }
+                }
+            }
+        },
+        400: {
+            "description": "Bad Request",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "message": "Handled by Readers exception handler",
+                        "detail": "Error occurred while changing database data",
+                    }
+                }
+            }
+        },
+        401: {
+            "description": "Unauthorized",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "summary": "User is not authenticated",
+                        "value": "Unauthorized"
+                    }
+                }
+            }
+        },
+    }
+)
+async def sync_many(
+        request: Request,
+        format: Optional[Literal["csv", "ndjson"]] = Query(
+            None,
+            description="Body format; by default taken from Content-Type (application/x-ndjson - NDJSON, otherwise CSV)",
+        ),
+        deactivate_missing: bool = Query(
+            False,
+            description="Deactivate readers whose email is not in the roster (they can't borrow books)",
+        ),
+        session: AsyncSession = Depends(DBConfigurer.session_getter)
+):
+    service: ReaderService = ReaderService(
+        session=session
+    )
+    return await service.sync_many(
+        chunks=request.stream(),
+        format=RowStream.get_format(request.headers.get("content-type"), format),
+        deactivate_missing=deactivate_missing,
+    )
+
+
 # 4
 @router.delete(
     "/{id}",
@@ -579,6 +989,8 @@ async def delete_one(
                                 "id": 1,
                                 "name": "Angelina",
                                 "email": "angel@mail.ru",
+                                "active_loans": 1,
+                                "is_active": True,
                             },
                         }
                     }
@@ -677,6 +1089,8 @@ async def edit_one(
                                 "id": 1,
                                 "name": "Angelina",
                                 "email": "angel@mail.ru",
+                                "active_loans": 1,
+                                "is_active": True,
                             },
                         }
                     }
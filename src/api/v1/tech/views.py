@@ -0,0 +1,196 @@
+from fastapi import APIRouter, status, Depends
+
+from src.core.config import CacheConfigurer
+
+from ..auth.dependencies import current_user
+from ..books.facets import facets_cache
+from ..books.flights import full_flight
+from ..books.suggestions import suggestions
+
+
+router = APIRouter()
+
+
+@router.get(
+    "/cache",
+    dependencies=[Depends(current_user),],
+    status_code=status.HTTP_200_OK,
+    description="Entity cache counters of this application process (for librarians only)",
+    responses={
+        200: {
+            "content": {
+                "application/json": {
+                    "examples": {
+                        "example1": {
+                            "summary": "In-process cache counters",
+                            "value": {
+                                "backend": "MemoryCacheBackend",
+                                "hits": 1520,
+                                "misses": 87,
+                                "evictions": 3,
+                                "size": 84,
+                                "max_size": 10000,
+                                "negative_hits": 12
+                            }
+                        }
+                    }
+                }
+            }
+        },
+        401: {
+            "description": "Unauthorized",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "summary": "User is not authenticated",
+                        "value": "Unauthorized"
+                    }
+                }
+            }
+        },
+    }
+)
+async def cache_stats():
+    return await CacheConfigurer.entities.stats()
+
+
+@router.get(
+    "/suggestions",
+    dependencies=[Depends(current_user),],
+    status_code=status.HTTP_200_OK,
+    description="State of the in-process prefix index of book names and authors (for librarians only)",
+    responses={
+        200: {
+            "content": {
+                "application/json": {
+                    "examples": {
+                        "example1": {
+                            "summary": "Prefix index of this application process",
+                            "value": {
+                                "model": "Book",
+                                "ready": True,
+                                "rows": 100000,
+                                "values": {"name": 99412, "author": 10000},
+                                "build_seconds": 0.412,
+                                "refreshes": 17,
+                                "pending": 0,
+                                "memory_bytes": 27430112
+                            }
+                        }
+                    }
+                }
+            }
+        },
+        401: {
+            "description": "Unauthorized",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "summary": "User is not authenticated",
+                        "value": "Unauthorized"
+                    }
+                }
+            }
+        },
+    }
+)
+async def suggestions_stats():
+    return suggestions.stats()
+
+
+@router.get(
+    "/facets",
+    dependencies=[Depends(current_user),],
+    status_code=status.HTTP_200_OK,
+    description="Counters of the in-process cache of book facet counts (for librarians only)",
+    responses={
+        200: {
+            "content": {
+                "application/json": {
+                    "examples": {
+                        "example1": {
+                            "summary": "Facet cache of this application process",
+                            "value": {
+                                "backend": "MemoryCacheBackend",
+                                "hits": 310,
+                                "misses": 24,
+                                "evictions": 0,
+                                "size": 24,
+                                "max_size": 1000,
+                                "model": "Book",
+                                "generation": 11
+                            }
+                        }
+                    }
+                }
+            }
+        },
+        401: {
+            "description": "Unauthorized",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "summary": "User is not authenticated",
+                        "value": "Unauthorized"
+                    }
+                }
+            }
+        },
+    }
+)
+async def facets_stats():
+    return await facets_cache.stats()
+
+
+@router.get(
+    "/flights",
+    dependencies=[Depends(current_user),],
+    status_code=status.HTTP_200_OK,
+    description="Coalescing counters of concurrent identical lookups in this application process (for librarians only)",
+    responses={
+        200: {
+            "content": {
+                "application/json": {
+                    "examples": {
+                        "example1": {
+                            "summary": "Single-flight counters of this application process",
+                            "value": [
+                                {
+                                    "name": "entities",
+                                    "calls": 5200,
+                                    "executions": 140,
+                                    "coalesced": 4980,
+                                    "errors": 0,
+                                    "in_flight": 1,
+                                    "coalescing_ratio": 0.9577
+                                },
+                                {
+                                    "name": "books_full",
+                                    "calls": 310,
+                                    "executions": 42,
+                                    "coalesced": 268,
+                                    "errors": 0,
+                                    "in_flight": 0,
+                                    "coalescing_ratio": 0.8645
+                                }
+                            ]
+                        }
+                    }
+                }
+            }
+        },
+        401: {
+            "description": "Unauthorized",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "summary": "User is not authenticated",
+                        "value": "Unauthorized"
+                    }
+                }
+            }
+        },
+    }
+)
+async def flights_stats():
+    return [CacheConfigurer.entities.flight.stats(), full_flight.stats()]
@@ -0,0 +1,11 @@
+from .backends import (
+    CacheBackend,
+    MemoryCacheBackend,
+    RedisCacheBackend,
+    MISSING,
+)
+from .entity_cache import EntityCache
+from .bus import InvalidationBus
+from .prefix_index import PrefixIndex, ModelPrefixIndex
+from .query_cache import ModelQueryCache
+from .single_flight import SingleFlight
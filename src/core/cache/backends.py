@@ -0,0 +1,151 @@
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Optional
+
+import orjson
+
+
+#  Признак отсутствия ключа в кеше (None - допустимое значение: закешированный 404)
+MISSING = object()
+
+
+class CacheBackend(ABC):
+    #  Общий для всех воркеров бэкенд не нуждается в шине инвалидации
+    shared: bool = False
+
+    def __init__(
+            self,
+            ttl: int,
+    ):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @abstractmethod
+    async def get(self, key: str) -> Any:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        ...
+
+    @abstractmethod
+    async def delete(self, *keys: str) -> None:
+        ...
+
+    async def clear(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def stats(self) -> dict[str, Any]:
+        return {
+            "backend": self.__class__.__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class MemoryCacheBackend(CacheBackend):
+    #  LRU в памяти процесса: при переполнении вытесняется давно не читавшийся ключ,
+    # просроченные по TTL ключи удаляются при чтении и тоже считаются вытесненными
+    def __init__(
+            self,
+            ttl: int,
+            max_size: int,
+    ):
+        super().__init__(ttl=ttl)
+        self.max_size = max_size
+        self._items: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    async def get(self, key: str) -> Any:
+        item = self._items.get(key)
+        if item is None:
+            self.misses += 1
+            return MISSING
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._items[key]
+            self.evictions += 1
+            self.misses += 1
+            return MISSING
+        self._items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        self._items[key] = (time.monotonic() + (ttl or self.ttl), value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._items.pop(key, None)
+
+    async def clear(self) -> None:
+        self._items.clear()
+
+    async def stats(self) -> dict[str, Any]:
+        return {
+            **await super().stats(),
+            "size": len(self._items),
+            "max_size": self.max_size,
+        }
+
+
+class RedisCacheBackend(CacheBackend):
+    #  Внешний кеш, общий для всех воркеров. Клиент можно передать готовым (например, локальную
+    # замену с интерфейсом redis.asyncio.Redis), иначе он создается по url. Пакет redis -
+    # необязательная зависимость и импортируется только при выборе этого бэкенда
+    shared = True
+
+    def __init__(
+            self,
+            ttl: int,
+            url: str,
+            prefix: str,
+            client: Any = None,
+    ):
+        super().__init__(ttl=ttl)
+        if client is None:
+            try:
+                from redis import asyncio as redis
+            except ImportError as exc:
+                raise ImportError(
+                    "CACHE_BACKEND=redis requires the redis package: poetry install --extras redis"
+                ) from exc
+            client = redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Any:
+        raw = await self.client.get(self.prefix + key)
+        if raw is None:
+            self.misses += 1
+            return MISSING
+        self.hits += 1
+        return orjson.loads(raw)
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        await self.client.set(self.prefix + key, orjson.dumps(value), ex=ttl or self.ttl)
+
+    async def delete(self, *keys: str) -> None:
+        if keys:
+            await self.client.delete(*(self.prefix + key for key in keys))
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+    async def stats(self) -> dict[str, Any]:
+        #  Вытеснения считает сервер (по всем ключам, не только этого приложения)
+        info = await self.client.info("stats")
+        return {
+            **await super().stats(),
+            "evictions": info.get("evicted_keys", 0),
+        }
@@ -0,0 +1,81 @@
+import asyncio
+import logging
+from typing import Optional
+
+import asyncpg
+
+from .entity_cache import EntityCache
+
+
+class InvalidationBus:
+    #  Фоновая задача воркера: отдельное соединение asyncpg слушает канал LISTEN и вытесняет
+    # из локального кеша ключи, изменения которых закоммитили другие воркеры (EntityCache.publish).
+    # При общем бэкенде (redis) уведомления получают только подписчики кеша - производные структуры воркера.
+    # Пока соединение было потеряно, уведомления пропадают - после переподключения локальный кеш
+    # очищается целиком
+    def __init__(
+            self,
+            cache: EntityCache,
+            dsn: str,
+            reconnect_delay: float = 1.0,
+    ):
+        self.cache = cache
+        self.dsn = dsn
+        self.reconnect_delay = reconnect_delay
+        self.logger = logging.getLogger(__name__)
+        self.received = 0
+        self._task: Optional[asyncio.Task] = None
+        self._evictions: set[asyncio.Task] = set()
+        self._listening = asyncio.Event()
+
+    async def start(self, timeout: float = 5.0) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            try:
+                await asyncio.wait_for(self._listening.wait(), timeout)
+            except asyncio.TimeoutError:
+                self.logger.error("Cache invalidation bus is not listening yet, keeps reconnecting")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._listening.clear()
+
+    async def _run(self) -> None:
+        connected_before = False
+        while True:
+            connection: Optional[asyncpg.Connection] = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                lost = asyncio.Event()
+                connection.add_termination_listener(lambda _: lost.set())
+                await connection.add_listener(self.cache.channel, self._on_notify)
+                if connected_before:
+                    await self.cache.clear()
+                    self.logger.warning("Cache invalidation bus reconnected, local cache cleared")
+                connected_before = True
+                self._listening.set()
+                await lost.wait()
+                self._listening.clear()
+                self.logger.warning("Cache invalidation bus connection lost")
+            except (OSError, asyncpg.PostgresError) as exc:
+                self.logger.error("Cache invalidation bus connection error", exc_info=exc)
+            finally:
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(self.reconnect_delay)
+
+    def _on_notify(self, connection, pid, channel, payload: str) -> None:
+        self.received += 1
+        #  Общий бэкенд уже сброшен воркером-писателем: уведомляются только структуры в памяти процесса
+        if self.cache.backend.shared:
+            self.cache.notify(tuple(payload.split(",")))
+            return
+        task = asyncio.create_task(self.cache.evict(*payload.split(",")))
+        self._evictions.add(task)
+        task.add_done_callback(self._evictions.discard)
@@ -0,0 +1,233 @@
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Callable, Optional, TypeVar
+
+from sqlalchemy import DateTime, select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+
+from .backends import CacheBackend, MISSING
+from .single_flight import SingleFlight
+
+if TYPE_CHECKING:
+    from src.core.models import Base
+
+ModelType = TypeVar("ModelType", bound="Base")
+
+
+class EntityCache:
+    #  Read-through кеш строк по первичному ключу. Хранятся значения колонок (to_dict), а не ORM-объекты:
+    # при попадании объект собирается заново и присоединяется к сессии запроса без обращения к базе,
+    # поэтому дальнейшие изменения и удаление работают как с загруженным из базы объектом.
+    # Отсутствующая строка кешируется как None с отдельным (коротким) TTL
+
+    #  Ограничение размера payload NOTIFY (8000 байт) - ключи отправляются пачками
+    NOTIFY_KEYS_LIMIT = 300
+
+    def __init__(
+            self,
+            backend: CacheBackend,
+            negative_ttl: int,
+            channel: str,
+    ):
+        self.backend = backend
+        self.negative_ttl = negative_ttl
+        self.channel = channel
+        self.negative_hits = 0
+        #  Счетчик инвалидаций: значение, прочитанное из базы до инвалидации, в кеш уже не записывается
+        self._epoch = 0
+        #  Подписчики на инвалидации (производные структуры в памяти процесса): получают ключи или None при сбросе
+        self._listeners: list[Callable[[Optional[tuple[str, ...]]], None]] = []
+        #  Промахи по одному ключу из одновременных запросов читаются из базы один раз
+        self.flight = SingleFlight("entities")
+
+    @staticmethod
+    def get_key(model: type["Base"], id: int) -> str:
+        return f"{model.__tablename__}:{id}"
+
+    @staticmethod
+    def get_columns(model: type["Base"]) -> list:
+        #  Кешируются те же колонки, что загружает ORM: отложенные (поисковый вектор) пропускаются
+        return [attr.columns[0] for attr in model.__mapper__.column_attrs if not attr.deferred]
+
+    @staticmethod
+    def restore(model: type["Base"], values: dict[str, Any]) -> dict[str, Any]:
+        #  Внешний бэкенд хранит JSON: даты возвращаются строками ISO 8601
+        for column in model.__table__.columns:
+            value = values.get(column.name)
+            if isinstance(value, str) and isinstance(column.type, DateTime):
+                values[column.name] = datetime.fromisoformat(value)
+        return values
+
+    async def get_values(
+            self,
+            session: AsyncSession,
+            model: type["Base"],
+            id: int,
+    ) -> Optional[dict[str, Any]]:
+        #  Значения колонок строки без ORM: из кеша, а при промахе - Core-запросом по первичному ключу.
+        # Возвращенный dict - общий с кешем, изменять его нельзя
+        key = self.get_key(model, id)
+        cached = await self.backend.get(key)
+        if cached is None:
+            self.negative_hits += 1
+            return None
+        if cached is not MISSING:
+            return self.restore(model, cached)
+        return await self.flight.do(self.get_flight_key(key), lambda: self.load_values(session, model, id))
+
+    def get_flight_key(self, key: str) -> str:
+        #  Запрос, пришедший после инвалидации, не присоединяется к чтению, начатому до нее
+        return f"{self._epoch}:{key}"
+
+    async def load_values(
+            self,
+            session: AsyncSession,
+            model: type["Base"],
+            id: int,
+    ) -> Optional[dict[str, Any]]:
+        epoch = self._epoch
+        result = await session.execute(select(*self.get_columns(model)).where(model.__table__.c.id == id))
+        row = result.mappings().one_or_none()
+        values = dict(row) if row is not None else None
+        if epoch == self._epoch:
+            if values is None:
+                await self.backend.set(self.get_key(model, id), None, ttl=self.negative_ttl)
+            else:
+                await self.backend.set(self.get_key(model, id), values)
+        return values
+
+    async def get_many_values(
+            self,
+            session: AsyncSession,
+            model: type["Base"],
+            ids: list[int],
+    ) -> dict[int, dict[str, Any]]:
+        #  То же для набора ключей: попадания берутся из кеша, все промахи читаются одним запросом id IN (...).
+        # Отсутствующие строки в результат не попадают и кешируются как None
+        found: dict[int, dict[str, Any]] = {}
+        missed: list[int] = []
+        for id in dict.fromkeys(ids):
+            cached = await self.backend.get(self.get_key(model, id))
+            if cached is None:
+                self.negative_hits += 1
+            elif cached is MISSING:
+                missed.append(id)
+            else:
+                found[id] = self.restore(model, cached)
+        if not missed:
+            return found
+
+        flight_ids = {self.get_flight_key(self.get_key(model, id)): id for id in missed}
+
+        async def load(keys: list[str]) -> dict[str, dict[str, Any]]:
+            loaded = await self.load_many_values(session, model, [flight_ids[key] for key in keys])
+            return {key: loaded[flight_ids[key]] for key in keys if flight_ids[key] in loaded}
+
+        #  Ключи, которые уже читает другой запрос, ждут его результат; остальные - одним запросом
+        for key, values in (await self.flight.do_many(flight_ids, load)).items():
+            if values is not None:
+                found[flight_ids[key]] = values
+        return found
+
+    async def load_many_values(
+            self,
+            session: AsyncSession,
+            model: type["Base"],
+            ids: list[int],
+    ) -> dict[int, dict[str, Any]]:
+        epoch = self._epoch
+        result = await session.execute(select(*self.get_columns(model)).where(model.__table__.c.id.in_(ids)))
+        loaded = {row["id"]: dict(row) for row in result.mappings()}
+        if epoch == self._epoch:
+            for id in ids:
+                if id in loaded:
+                    await self.backend.set(self.get_key(model, id), loaded[id])
+                else:
+                    await self.backend.set(self.get_key(model, id), None, ttl=self.negative_ttl)
+        return loaded
+
+    @staticmethod
+    async def attach(
+            session: AsyncSession,
+            model: type[ModelType],
+            values: dict[str, Any],
+    ) -> ModelType:
+        orm_model = model(**values)
+        make_transient_to_detached(orm_model)
+        return await session.merge(orm_model, load=False)
+
+    async def get(
+            self,
+            session: AsyncSession,
+            model: type[ModelType],
+            id: int,
+    ) -> Optional[ModelType]:
+        values = await self.get_values(session, model, id)
+        if values is None:
+            return None
+        return await self.attach(session, model, values)
+
+    async def get_many(
+            self,
+            session: AsyncSession,
+            model: type[ModelType],
+            ids: list[int],
+    ) -> dict[int, ModelType]:
+        values = await self.get_many_values(session, model, ids)
+        return {id: await self.attach(session, model, row) for id, row in values.items()}
+
+    async def publish(
+            self,
+            session: AsyncSession,
+            model: type["Base"],
+            *ids: int,
+    ) -> None:
+        #  Вызывается внутри пишущей транзакции до COMMIT: NOTIFY доставляется другим воркерам только
+        # после фиксации и не доставляется при откате. Свой локальный кеш сбрасывается invalidate после COMMIT
+        keys = [self.get_key(model, id) for id in ids]
+        for start in range(0, len(keys), self.NOTIFY_KEYS_LIMIT):
+            payload = ",".join(keys[start:start + self.NOTIFY_KEYS_LIMIT])
+            await session.execute(select(func.pg_notify(self.channel, payload)))
+
+    async def invalidate(
+            self,
+            model: type["Base"],
+            *ids: int,
+    ) -> None:
+        await self.evict(*(self.get_key(model, id) for id in ids))
+
+    def subscribe(
+            self,
+            listener: Callable[[Optional[tuple[str, ...]]], None],
+    ) -> None:
+        self._listeners.append(listener)
+
+    @property
+    def has_listeners(self) -> bool:
+        return bool(self._listeners)
+
+    def notify(
+            self,
+            keys: Optional[tuple[str, ...]],
+    ) -> None:
+        for listener in self._listeners:
+            listener(keys)
+
+    async def evict(
+            self,
+            *keys: str,
+    ) -> None:
+        self._epoch += 1
+        self.notify(keys)
+        await self.backend.delete(*keys)
+
+    async def clear(self) -> None:
+        self._epoch += 1
+        self.notify(None)
+        await self.backend.clear()
+
+    async def stats(self):
+        return {
+            **await self.backend.stats(),
+            "negative_hits": self.negative_hits,
+        }
@@ -0,0 +1,234 @@
+import asyncio
+import logging
+import sys
+import time
+from bisect import bisect_left, insort
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Optional
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .entity_cache import EntityCache
+
+if TYPE_CHECKING:
+    from src.core.models import Base
+
+
+class PrefixIndex:
+    #  Отсортированный массив уникальных значений одного поля (порядок - по значению в нижнем регистре).
+    # Поиск по префиксу - бинарный поиск и проход вперед до первого несовпадения. Значение удаляется
+    # из массива, когда пропадает последняя строка с ним
+    def __init__(
+            self,
+            values: Iterable[str] = (),
+    ):
+        self.counts: dict[str, int] = {}
+        for value in values:
+            if value:
+                self.counts[value] = self.counts.get(value, 0) + 1
+        self.values: list[str] = sorted(self.counts, key=self.normalize)
+
+    @staticmethod
+    def normalize(value: str) -> str:
+        return value.lower()
+
+    def add(self, value: Optional[str]) -> None:
+        if not value:
+            return
+        if value not in self.counts:
+            self.counts[value] = 0
+            insort(self.values, value, key=self.normalize)
+        self.counts[value] += 1
+
+    def remove(self, value: Optional[str]) -> None:
+        if not value or value not in self.counts:
+            return
+        self.counts[value] -= 1
+        if self.counts[value] == 0:
+            del self.counts[value]
+            position = bisect_left(self.values, self.normalize(value), key=self.normalize)
+            while self.values[position] != value:
+                position += 1
+            del self.values[position]
+
+    def search(self, prefix: str, limit: int) -> list[str]:
+        prefix = self.normalize(prefix)
+        result = []
+        position = bisect_left(self.values, prefix, key=self.normalize)
+        while position < len(self.values) and len(result) < limit:
+            value = self.values[position]
+            if not self.normalize(value).startswith(prefix):
+                break
+            result.append(value)
+            position += 1
+        return result
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class ModelPrefixIndex:
+    #  Префиксные индексы нескольких строковых полей модели в памяти процесса. Строится целиком в фоне при
+    # старте; изменения строк приходят через инвалидации кеша записей (свои и других воркеров по NOTIFY):
+    # id помечаются как измененные и перечитываются одним запросом перед следующим поиском.
+    # Пока индекс не построен (или строк больше max_rows), suggest возвращает None - поиск идет по базе
+    def __init__(
+            self,
+            model: type["Base"],
+            fields: tuple[str, ...],
+            cache: EntityCache,
+            session_factory: Callable[[], AsyncSession],
+            max_rows: int,
+    ):
+        self.model = model
+        self.fields = fields
+        self.session_factory = session_factory
+        self.max_rows = max_rows
+        self.logger = logging.getLogger(__name__)
+        self.indexes: dict[str, PrefixIndex] = {field: PrefixIndex() for field in fields}
+        #  Текущие значения полей по id: по ним из индексов удаляются старые значения измененной строки
+        self.rows: dict[int, tuple] = {}
+        self.ready = False
+        self.build_seconds: Optional[float] = None
+        self.memory_bytes: Optional[int] = None
+        self.refreshes = 0
+        self._dirty: set[int] = set()
+        self._key_prefix = EntityCache.get_key(model, 0)[:-1]
+        self._lock = asyncio.Lock()
+        self._rebuild_task: Optional[asyncio.Task] = None
+        cache.subscribe(self._on_evict)
+
+    @property
+    def columns(self) -> list:
+        return [getattr(self.model, field) for field in self.fields]
+
+    def start(self) -> None:
+        if self.max_rows > 0:
+            self.schedule_rebuild()
+
+    async def stop(self) -> None:
+        if self._rebuild_task is not None:
+            self._rebuild_task.cancel()
+            try:
+                await self._rebuild_task
+            except asyncio.CancelledError:
+                pass
+            self._rebuild_task = None
+
+    def schedule_rebuild(self) -> None:
+        if self._rebuild_task is None or self._rebuild_task.done():
+            self._rebuild_task = asyncio.create_task(self.rebuild())
+
+    def _on_evict(self, keys: Optional[tuple[str, ...]]) -> None:
+        #  None - кеш сброшен целиком (переподключение шины): пропущенные изменения неизвестны
+        if keys is None:
+            if self.max_rows > 0:
+                self.schedule_rebuild()
+            return
+        for key in keys:
+            if key.startswith(self._key_prefix):
+                self._dirty.add(int(key[len(self._key_prefix):]))
+
+    async def rebuild(self) -> None:
+        started = time.perf_counter()
+        try:
+            async with self.session_factory() as session:
+                total = (await session.execute(select(func.count()).select_from(self.model))).scalar()
+                if total > self.max_rows:
+                    self.ready = False
+                    self.logger.warning(
+                        "Prefix index of %s disabled: %s rows, limit %s", self.model.__name__, total, self.max_rows
+                    )
+                    return
+                #  Изменения, закоммиченные после этого момента, останутся в _dirty и применятся при refresh
+                self._dirty.clear()
+                result = await session.execute(select(self.model.id, *self.columns))
+                rows = {row[0]: tuple(row[1:]) for row in result}
+        except Exception:
+            self.logger.exception("Prefix index of %s was not built", self.model.__name__)
+            return
+        #  Сортировка и оценка объема - в отдельном потоке, чтобы не останавливать цикл событий воркера
+        indexes = await asyncio.to_thread(self.build, rows)
+        self.memory_bytes = await asyncio.to_thread(self.memory, indexes, rows)
+        self.indexes, self.rows = indexes, rows
+        self.ready = True
+        self.build_seconds = time.perf_counter() - started
+        self.logger.info(
+            "Prefix index of %s built: %s rows in %.2f s, ~%.1f MB",
+            self.model.__name__, len(rows), self.build_seconds, self.memory_bytes / 2 ** 20,
+        )
+
+    def build(self, rows: dict[int, tuple]) -> dict[str, PrefixIndex]:
+        return {
+            field: PrefixIndex(values[position] for values in rows.values())
+            for position, field in enumerate(self.fields)
+        }
+
+    async def refresh(self, session: AsyncSession) -> None:
+        #  Во время перестроения изменения не применяются к старому индексу - они дождутся нового
+        if not self._dirty or (self._rebuild_task is not None and not self._rebuild_task.done()):
+            return
+        async with self._lock:
+            ids, self._dirty = self._dirty, set()
+            if not ids:
+                return
+            result = await session.execute(select(self.model.id, *self.columns).where(self.model.id.in_(ids)))
+            current = {row[0]: tuple(row[1:]) for row in result}
+            for id in ids:
+                old, new = self.rows.pop(id, None), current.get(id)
+                if old == new:
+                    if old is not None:
+                        self.rows[id] = old
+                    continue
+                for position, field in enumerate(self.fields):
+                    if old is not None:
+                        self.indexes[field].remove(old[position])
+                    if new is not None:
+                        self.indexes[field].add(new[position])
+                if new is not None:
+                    self.rows[id] = new
+            self.refreshes += 1
+
+    async def suggest(
+            self,
+            session: AsyncSession,
+            prefix: str,
+            limit: int,
+    ) -> Optional[list[tuple[str, str]]]:
+        #  Пары (поле, значение) в порядке значений, не более limit на все поля
+        if not self.ready:
+            return None
+        await self.refresh(session)
+        found = [
+            (field, value)
+            for field, index in self.indexes.items()
+            for value in index.search(prefix, limit)
+        ]
+        found.sort(key=lambda item: (PrefixIndex.normalize(item[1]), item[0]))
+        return found[:limit]
+
+    @staticmethod
+    def memory(indexes: dict[str, PrefixIndex], rows: dict[int, tuple]) -> int:
+        #  Приблизительный объем в байтах: массивы, словари, кортежи строк и сами строки (каждая - один раз).
+        # Считается при построении: при 10^6 строк обход занимает заметное время
+        size = sys.getsizeof(rows)
+        strings: dict[int, Any] = {}
+        for row_id, values in rows.items():
+            size += sys.getsizeof(row_id) + sys.getsizeof(values)
+            for value in values:
+                strings[id(value)] = value
+        for index in indexes.values():
+            size += sys.getsizeof(index.values) + sys.getsizeof(index.counts)
+        return size + sum(sys.getsizeof(value) for value in strings.values())
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "model": self.model.__name__,
+            "ready": self.ready,
+            "rows": len(self.rows),
+            "values": {field: len(index) for field, index in self.indexes.items()},
+            "build_seconds": round(self.build_seconds, 3) if self.build_seconds is not None else None,
+            "refreshes": self.refreshes,
+            "pending": len(self._dirty),
+            "memory_bytes": self.memory_bytes,
+        }
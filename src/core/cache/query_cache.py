@@ -0,0 +1,51 @@
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Optional
+
+from .backends import MemoryCacheBackend, MISSING
+from .entity_cache import EntityCache
+
+if TYPE_CHECKING:
+    from src.core.models import Base
+
+
+class ModelQueryCache:
+    #  Кеш результатов запросов по множеству строк модели (агрегаты, счетчики) в памяти процесса, ключ - подпись
+    # параметров запроса. Любая инвалидация строки модели (своя или другого воркера по NOTIFY) делает устаревшими
+    # все результаты: номер поколения входит в ключ, старые записи вытесняются по LRU и TTL
+    def __init__(
+            self,
+            model: type["Base"],
+            cache: EntityCache,
+            ttl: int,
+            max_size: int,
+    ):
+        self.model = model
+        self.backend = MemoryCacheBackend(ttl=ttl, max_size=max_size)
+        self.generation = 0
+        self._key_prefix = EntityCache.get_key(model, 0)[:-1]
+        cache.subscribe(self._on_evict)
+
+    def _on_evict(self, keys: Optional[tuple[str, ...]]) -> None:
+        if keys is None or any(key.startswith(self._key_prefix) for key in keys):
+            self.generation += 1
+
+    async def get_or_compute(
+            self,
+            signature: str,
+            compute: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        #  Поколение запоминается до запроса: результат, посчитанный во время инвалидации, ляжет под старым
+        # ключом и не будет прочитан
+        generation = self.generation
+        key = f"{generation}:{signature}"
+        value = await self.backend.get(key)
+        if value is MISSING:
+            value = await compute()
+            await self.backend.set(key, value)
+        return value
+
+    async def stats(self) -> dict[str, Any]:
+        return {
+            **await self.backend.stats(),
+            "model": self.model.__name__,
+            "generation": self.generation,
+        }
@@ -0,0 +1,91 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable, Iterable
+
+
+class SingleFlight:
+    #  Объединение одинаковых одновременных загрузок в процессе воркера: пока загрузка ключа выполняется,
+    # остальные запросы того же ключа ждут ее результат (или ошибку) вместо повторного запроса к базе.
+    # Результат не сохраняется - после завершения следующий вызов загружает заново (хранение - дело кеша).
+    # Если запрос-лидер отменен (клиент отключился), ожидающие не получают CancelledError, а загружают сами
+    def __init__(
+            self,
+            name: str,
+    ):
+        self.name = name
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+        self.errors = 0
+        self._futures: dict[Hashable, asyncio.Future] = {}
+
+    async def do(
+            self,
+            key: Hashable,
+            load: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        async def load_one(keys: list[Hashable]) -> dict[Hashable, Any]:
+            return {key: await load()}
+
+        return (await self.do_many([key], load_one))[key]
+
+    async def do_many(
+            self,
+            keys: Iterable[Hashable],
+            load: Callable[[list[Hashable]], Awaitable[dict[Hashable, Any]]],
+    ) -> dict[Hashable, Any]:
+        #  load(keys) получает только ключи, которые сейчас никто не загружает, и возвращает {ключ: значение};
+        # ключ, отсутствующий в ответе, - None
+        keys = list(dict.fromkeys(keys))
+        self.calls += len(keys)
+        waiting = {key: self._futures[key] for key in keys if key in self._futures}
+        leading = [key for key in keys if key not in waiting]
+        self.coalesced += len(waiting)
+
+        values: dict[Hashable, Any] = {}
+        if leading:
+            loop = asyncio.get_running_loop()
+            futures = {key: loop.create_future() for key in leading}
+            self._futures.update(futures)
+            self.executions += 1
+            try:
+                loaded = await load(leading)
+            except BaseException as exc:
+                self.errors += 1
+                for key, future in futures.items():
+                    del self._futures[key]
+                    if isinstance(exc, asyncio.CancelledError):
+                        future.cancel()
+                    else:
+                        future.set_exception(exc)
+                        #  Ошибка передается ожидающим; без них не должна попадать в лог как "never retrieved"
+                        future.exception()
+                raise
+            for key, future in futures.items():
+                del self._futures[key]
+                values[key] = loaded.get(key)
+                future.set_result(values[key])
+
+        retry = []
+        for key, future in waiting.items():
+            try:
+                values[key] = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                retry.append(key)
+        if retry:
+            self.calls -= len(retry)
+            self.coalesced -= len(retry)
+            values.update(await self.do_many(retry, load))
+        return values
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "in_flight": len(self._futures),
+            "coalescing_ratio": round(self.coalesced / self.calls, 4) if self.calls else 0.0,
+        }
@@ -2,3 +2,4 @@ from .app_config import AppConfigurer
 from .database_config import DBConfigurer
 from .swagger_config import SwaggerConfigurer
 from .exception_handler_config import ExceptionHandlerConfigurer
+from .cache_config import CacheConfigurer
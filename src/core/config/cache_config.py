@@ -0,0 +1,75 @@
+from sqlalchemy.engine import make_url
+
+from src.core.cache import (
+    CacheBackend,
+    EntityCache,
+    InvalidationBus,
+    MemoryCacheBackend,
+    RedisCacheBackend,
+)
+from src.core.settings import settings
+
+
+class CacheConfigurerInitializer:
+    def __init__(
+            self,
+            backend: str,
+            ttl: int,
+            negative_ttl: int,
+            max_size: int,
+            redis_url: str,
+            prefix: str,
+            channel: str,
+            db_url: str,
+    ):
+        self.backend: CacheBackend = self.create_backend(
+            backend=backend,
+            ttl=ttl,
+            max_size=max_size,
+            redis_url=redis_url,
+            prefix=prefix,
+        )
+        self.entities: EntityCache = EntityCache(
+            backend=self.backend,
+            negative_ttl=negative_ttl,
+            channel=channel,
+        )
+        #  Шина слушает NOTIFY через asyncpg напрямую, без диалекта SQLAlchemy в url
+        self.bus: InvalidationBus = InvalidationBus(
+            cache=self.entities,
+            dsn=make_url(db_url).set(drivername="postgresql").render_as_string(hide_password=False),
+        )
+
+    @staticmethod
+    def create_backend(
+            backend: str,
+            ttl: int,
+            max_size: int,
+            redis_url: str,
+            prefix: str,
+    ) -> CacheBackend:
+        if backend == "redis":
+            return RedisCacheBackend(ttl=ttl, url=redis_url, prefix=prefix)
+        return MemoryCacheBackend(ttl=ttl, max_size=max_size)
+
+    async def start(self) -> None:
+        #  Локальный кеш каждого воркера сбрасывается по изменениям, закоммиченным другими воркерами;
+        # при общем бэкенде шина нужна подписчикам кеша (индексы и кеши запросов в памяти воркера)
+        if not self.backend.shared or self.entities.has_listeners:
+            await self.bus.start()
+
+    async def dispose(self) -> None:
+        await self.bus.stop()
+        await self.backend.close()
+
+
+CacheConfigurer = CacheConfigurerInitializer(
+    backend=settings.cache.CACHE_BACKEND,
+    ttl=settings.cache.CACHE_TTL,
+    negative_ttl=settings.cache.CACHE_NEGATIVE_TTL,
+    max_size=settings.cache.CACHE_MAX_SIZE,
+    redis_url=settings.cache.CACHE_REDIS_URL,
+    prefix=f"{settings.app.APP_NAME}:",
+    channel=settings.cache.CACHE_CHANNEL,
+    db_url=settings.db.DB_URL,
+)
@@ -52,6 +52,20 @@ class DBConfigurerInitializer:
         async with self.Session() as session:
             yield session
 
+    async def snapshot_session(self) -> AsyncSession:
+        #  Сессия для длинного чтения (выгрузки): транзакция REPEATABLE READ READ ONLY начинается сразу, все запросы
+        # видят один снимок базы на момент ее начала. Закрывает сессию вызывающий - она переживает запрос, в
+        # котором создана (потоковый ответ отдается после завершения зависимостей)
+        session = self.Session()
+        try:
+            await session.connection(
+                execution_options={"isolation_level": "REPEATABLE READ", "postgresql_readonly": True}
+            )
+        except BaseException:
+            await session.close()
+            raise
+        return session
+
 
 DBConfigurer = DBConfigurerInitializer(
     connection_path=settings.db.DB_URL,
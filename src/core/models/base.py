@@ -17,9 +17,11 @@ class Base(DeclarativeBase):
         # return '_'.join([settings.db.DB_TABLE_PREFIX, cls.__name__.lower()])
 
     def to_dict(self):
+        #  Отложенные колонки (служебные, например поисковый вектор) не загружаются и не выгружаются
         result = {}
-        for column in self.__table__.columns:
-            result[column.name] = getattr(self, column.name)
+        for attr in self.__mapper__.column_attrs:
+            if not attr.deferred:
+                result[attr.key] = getattr(self, attr.key)
         return result
 
     def __str__(self):
@@ -1,6 +1,8 @@
+from datetime import datetime
 from typing import TYPE_CHECKING
 
-from sqlalchemy import String, Integer, CheckConstraint
+from sqlalchemy import String, Integer, CheckConstraint, DateTime, Computed, Index, func
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src.core.models import Base
@@ -13,9 +15,15 @@ if TYPE_CHECKING:
 
 
 class Book(IDIntPkMixin, Base):
+    #  Конфигурация полнотекстового поиска: в russian латинские слова обрабатываются english_stem,
+    # кириллические - russian_stem, поэтому смешанный каталог индексируется одной конфигурацией
+    # (при базе в UTF8 - в SQL_ASCII кириллица парсером не распознается)
+    SEARCH_CONFIG = "russian"
+
     __table_args__ = (
         CheckConstraint("quantity >= 0", name="check_quantity_min_value"),
         CheckConstraint("published_at >= 1000", name="check_published_at_min_value"),
+        Index("ix_pat_book_search_vector", "search_vector", postgresql_using="gin"),
     )
 
     name: Mapped[str] = mapped_column(
@@ -56,8 +64,51 @@ class Book(IDIntPkMixin, Base):
         default=1,
         server_default='1',
     )
+    #  Версия строки для ETag/Last-Modified: обновляется любым UPDATE через SQLAlchemy, в том числе
+    # изменением остатка при выдаче и возврате
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+    )
+    #  Поисковый вектор поддерживается самой базой (generated column): вес A - название, B - автор,
+    # C - описание. Отложенная колонка - ORM и кеш записей ее не читают
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('russian'::regconfig, coalesce(name, '')), 'A') || "
+            "setweight(to_tsvector('russian'::regconfig, coalesce(author, '')), 'B') || "
+            "setweight(to_tsvector('russian'::regconfig, coalesce(description, '')), 'C')",
+            persisted=True,
+        ),
+        deferred=True,
+    )
     borrowed_books: Mapped[list["BorrowedBook"]] = relationship(
         "BorrowedBook",
         back_populates="book",
         cascade="all, delete",
     )
+
+
+#  Подсказки по префиксу из базы (пока индекс в памяти не построен): операторы text_pattern_ops сравнивают
+# строки побайтно, поэтому диапазон [префикс, следующий префикс) и ORDER BY ... USING ~<~ обслуживаются одним
+# btree независимо от collation базы, в том числе для префиксов из 1-2 символов
+Index(
+    "ix_pat_book_name_prefix",
+    func.lower(Book.name).label("name_lower"),
+    postgresql_ops={"name_lower": "text_pattern_ops"},
+)
+Index(
+    "ix_pat_book_author_prefix",
+    func.lower(Book.author).label("author_lower"),
+    postgresql_ops={"author_lower": "text_pattern_ops"},
+)
+
+#  Фильтры и сортировки GET /books: сортировка по колонке - обход индекса (колонка, id) в порядке курсора,
+# фильтр по автору и диапазону лет - условие индекса; остаток по убыванию - обратный обход индекса (quantity, id).
+# Книги автора по годам - отдельный индекс: иначе обход по published_at отбрасывает книги других авторов
+Index("ix_pat_book_author_id", Book.author, Book.id)
+Index("ix_pat_book_author_published_at_id", Book.author, Book.published_at, Book.id)
+Index("ix_pat_book_name_id", Book.name, Book.id)
+Index("ix_pat_book_published_at_id", Book.published_at, Book.id)
+Index("ix_pat_book_quantity_id", Book.quantity, Book.id)
@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import TYPE_CHECKING
 
-from sqlalchemy import ForeignKey, DateTime, func
+from sqlalchemy import ForeignKey, DateTime, Index, func, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src.core.config import DBConfigurer
@@ -16,6 +16,41 @@ if TYPE_CHECKING:
 
 
 class BorrowedBook(IDIntPkMixin, Base):
+    __table_args__ = (
+        #  Одна и та же книга не может быть одновременно "на руках" у читателя дважды. Индекс частичный
+        # (только невозвращенные книги), поэтому он же - путь чтения "книги на руках у читателя":
+        # выдачи читателя упорядочены в нем по book_id, и история в него не попадает
+        Index(
+            "uq_pat_borrowed_book_active_reader_id_book_id",
+            "reader_id",
+            "book_id",
+            unique=True,
+            postgresql_where=text("return_date IS NULL"),
+        ),
+        #  История книги и читателя - страницы по (borrow_date, id) от новых к старым: ключ курсора продолжает
+        # префикс индекса, страница читается обратным проходом индекса без сортировки. Эти же индексы
+        # обслуживают каскадное удаление книги или читателя (ON DELETE CASCADE ищет выдачи по первой колонке)
+        Index(
+            "ix_pat_borrowed_book_book_id_borrow_date_id",
+            "book_id",
+            "borrow_date",
+            "id",
+        ),
+        Index(
+            "ix_pat_borrowed_book_reader_id_borrow_date_id",
+            "reader_id",
+            "borrow_date",
+            "id",
+        ),
+        #  Выдачи добавляются в порядке времени - BRIN по дате выдачи (несколько страниц на всю таблицу)
+        # отсекает диапазоны блоков вне периода выгрузки истории
+        Index(
+            "ix_pat_borrowed_book_borrow_date_brin",
+            "borrow_date",
+            postgresql_using="brin",
+        ),
+    )
+
     book_id: Mapped[int] = mapped_column(
         ForeignKey(f"{DBConfigurer.utils.camel2snake("Book")}.id", ondelete="CASCADE"),
         nullable=False,
@@ -1,7 +1,7 @@
 from typing import TYPE_CHECKING
 
 from pydantic import EmailStr
-from sqlalchemy import String
+from sqlalchemy import String, Integer, Boolean, CheckConstraint
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src.core.models import Base
@@ -14,6 +14,10 @@ if TYPE_CHECKING:
 
 
 class Reader(IDIntPkMixin, Base):
+    __table_args__ = (
+        CheckConstraint("active_loans >= 0", name="check_active_loans_min_value"),
+    )
+
     name: Mapped[str] = mapped_column(
         String,
     )
@@ -21,6 +25,18 @@ class Reader(IDIntPkMixin, Base):
         String,
         unique=True,
     )
+    """Количество книг "на руках", поддерживается выдачей и возвратом в их же транзакциях"""
+    active_loans: Mapped[int] = mapped_column(
+        Integer,
+        default=0,
+        server_default='0',
+    )
+    """Читатель, отсутствующий в последнем списке синхронизации (POST /readers/sync), деактивируется: книги ему не выдаются"""
+    is_active: Mapped[bool] = mapped_column(
+        Boolean,
+        default=True,
+        server_default='true',
+    )
     borrowed_books: Mapped[list["BorrowedBook"]] = relationship(
         "BorrowedBook",
         back_populates="reader",
@@ -98,11 +98,46 @@ class RunConfig(CustomSettings):
     app_src: AppRunConfig = AppRunConfig()
 
 
+class Book(CustomSettings):
+    BOOKS_SEARCH_RANK_WINDOW: int = 1000
+    BOOKS_SUGGEST_LIMIT: int = 10
+    BOOKS_SUGGEST_MAX_LIMIT: int = 50
+    BOOKS_SUGGEST_INDEX_MAX_ROWS: int = 1000000
+    BOOKS_FACETS_AUTHORS_LIMIT: int = 20
+    BOOKS_FACETS_CACHE_TTL: int = 300
+    BOOKS_FACETS_CACHE_MAX_SIZE: int = 1000
+    BOOKS_BATCH_MAX_SIZE: int = 100
+    BOOKS_IMPORT_CHUNK_SIZE: int = 5000
+    BOOKS_IMPORT_MAX_ERRORS: int = 1000
+    BOOKS_EXPORT_BATCH_SIZE: int = 1000
+
+
 class Reader(CustomSettings):
     READERS_MAX_ITEMS_AT_ONCE: int = 3
+    READERS_BATCH_MAX_SIZE: int = 100
+    READERS_SYNC_CHUNK_SIZE: int = 5000
+    READERS_SYNC_MAX_ERRORS: int = 1000
+
+
+class Library(CustomSettings):
+    LIBRARY_HISTORY_LIMIT: int = 10
+    LIBRARY_HISTORY_MAX_LIMIT: int = 100
+    LIBRARY_EXPORT_BATCH_SIZE: int = 100000
+
+
+class Cache(CustomSettings):
+    CACHE_BACKEND: Literal['memory', 'redis'] = 'memory'
+    CACHE_TTL: int = 60
+    CACHE_NEGATIVE_TTL: int = 10
+    CACHE_MAX_SIZE: int = 10000
+    CACHE_REDIS_URL: str = 'redis://localhost:6379/0'
+    CACHE_CHANNEL: str = 'cache_invalidation'
+    CACHE_COUNT_TTL: int = 10
+    CACHE_COUNT_MAX_SIZE: int = 1000
 
 
 class Tags(CustomSettings):
+    TECH_PREFIX: str
     TECH_TAG: str
     ROOT_TAG: str
     SWAGGER_TAG: str
@@ -134,7 +169,10 @@ class Settings(CustomSettings):
     db: DB = DB()
     auth: Auth = Auth()
     users: Users = Users()
+    book: Book = Book()
     reader: Reader = Reader()
+    library: Library = Library()
+    cache: Cache = Cache()
 
 
 settings = Settings()
@@ -9,17 +9,23 @@ from src.core.config import (
     AppConfigurer,
     SwaggerConfigurer,
     DBConfigurer,
+    CacheConfigurer,
     ExceptionHandlerConfigurer,
 )
 from src.api import router as router_api
+from src.api.v1.books.suggestions import suggestions
 
 
 @asynccontextmanager
 async def lifespan(application: FastAPI):
     # startup
+    await CacheConfigurer.start()
+    suggestions.start()
     yield
     # shutdown
+    await suggestions.stop()
     await DBConfigurer.dispose()
+    await CacheConfigurer.dispose()
 
 
 app = AppConfigurer.create_app(
@@ -0,0 +1,97 @@
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import select, func, cast, text
+from sqlalchemy.dialects.postgresql import REGCONFIG
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.core.config import DBConfigurer
+from src.core.models import Book
+
+
+#  Словарь каталога: слова выбираются со смещением к началу списка (частые и редкие термины)
+WORDS = (
+    "war", "peace", "love", "history", "world", "night", "city", "garden", "river", "house",
+    "secret", "shadow", "winter", "summer", "island", "kingdom", "empire", "journey", "letters", "stories",
+    "mountain", "ocean", "forest", "stranger", "daughter", "captain", "memory", "silence", "crown", "machine",
+    "война", "мир", "любовь", "история", "город", "сад", "река", "дом", "тайна", "тень",
+    "зима", "лето", "остров", "царство", "путешествие", "письма", "рассказы", "гора", "море", "лес",
+    "musketeers", "gatsby", "odyssey", "karamazov", "dracula", "frankenstein", "ulysses", "hamlet", "quixote", "oblomov",
+)
+QUERIES = (
+    "war",
+    "war peace",
+    '"war and peace"',
+    "garden -winter",
+    "karamazov",
+    "oblomov or quixote",
+    "война мир",
+    "nonexistentword",
+)
+
+
+async def seed(session: AsyncSession, rows: int) -> None:
+    #  Название - 3 слова, описание - 12; random()^3 дает распределение, близкое к Ципфу.
+    # Ссылки на n и g делают подзапросы коррелированными - слова выбираются для каждой строки заново
+    await session.execute(text(
+        f"INSERT INTO {Book.__tablename__} (name, author, description, published_at, quantity) "
+        "SELECT "
+        "  (SELECT string_agg(w[g * 0 + 1 + floor(random() ^ 3 * array_length(w, 1))::int], ' ') "
+        "   FROM generate_series(1, 3) g WHERE n > 0), "
+        "  'Author ' || n % 10000, "
+        "  (SELECT string_agg(w[g * 0 + 1 + floor(random() ^ 3 * array_length(w, 1))::int], ' ') "
+        "   FROM generate_series(1, 12) g WHERE n > 0), "
+        "  2000, 1 "
+        "FROM generate_series(1, :rows) n, (SELECT CAST(:words AS text[]) w) words"
+    ), {"rows": rows, "words": list(WORDS)})
+    await session.execute(text(f"ANALYZE {Book.__tablename__}"))
+
+
+async def report(session: AsyncSession, queries: tuple[str, ...], size: int, repeats: int) -> None:
+    from src.api.v1.books.repository import BookRepository
+
+    repository: BookRepository = BookRepository(
+        session=session
+    )
+    print(f"\n{'query':<24}{'matches':>10}{'first page, ms':>18}{'next page, ms':>16}")
+    for q in queries:
+        matches = (await session.execute(
+            select(func.count()).where(
+                Book.search_vector.op("@@")(func.websearch_to_tsquery(cast(Book.SEARCH_CONFIG, REGCONFIG), q))
+            )
+        )).scalar()
+        timings, after = [], None
+        for _ in range(2):
+            started = time.perf_counter()
+            for _ in range(repeats):
+                page = await repository.search(q=q, size=size, after=after)
+            timings.append((time.perf_counter() - started) / repeats * 1000)
+            if len(page) < size:
+                break
+            after = (page[-1].rank, page[-1].id)
+        next_page = f"{timings[1]:>16.1f}" if len(timings) > 1 else f"{'-':>16}"
+        print(f"{q:<24}{matches:>10}{timings[0]:>18.1f}{next_page}")
+
+
+async def benchmark(rows: int, queries: tuple[str, ...], size: int, repeats: int) -> None:
+    #  Тестовые книги вставляются в транзакции, которая откатывается; при --rows 0 - замер на текущем каталоге
+    async with DBConfigurer.Session() as session:
+        if rows:
+            started = time.perf_counter()
+            await seed(session, rows=rows)
+            print(f"Seeded {rows} books in {time.perf_counter() - started:.1f} s")
+        await report(session, queries=queries, size=size, repeats=repeats)
+        await session.rollback()
+    await DBConfigurer.dispose()
+
+
+if __name__ == "__main__":
+    # python -m src.scripts.benchmark_book_search --rows 1000000
+    parser = argparse.ArgumentParser(description="Latency of GET /books/search on a generated catalog")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--size", type=int, default=10)
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--query", action="append", dest="queries", help="Search query, may be repeated")
+    args = parser.parse_args()
+    asyncio.run(benchmark(rows=args.rows, queries=tuple(args.queries or QUERIES), size=args.size, repeats=args.repeats))
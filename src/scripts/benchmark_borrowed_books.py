@@ -0,0 +1,125 @@
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import select, delete, func, text, tuple_
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.core.config import DBConfigurer
+from src.core.models import Book, BorrowedBook, Reader
+
+
+#  Индексы выдач, которые снимаются для плана "до"
+LOAN_INDEXES = (
+    "ix_pat_borrowed_book_book_id_borrow_date_id",
+    "ix_pat_borrowed_book_reader_id_borrow_date_id",
+    "uq_pat_borrowed_book_active_reader_id_book_id",
+)
+
+
+def explain(stmt) -> str:
+    sql = stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+    return f"EXPLAIN (ANALYZE, BUFFERS, COSTS OFF) {sql}"
+
+
+async def seed(session: AsyncSession, rows: int, readers: int, books: int) -> tuple[int, int]:
+    #  Выдачи распределены по читателям по кругу: у каждого читателя последние 3 выдачи не возвращены
+    # (разные книги, как требует частичный уникальный индекс), остальное - история
+    first_reader = (await session.execute(text(
+        f"INSERT INTO {Reader.__tablename__} (name, email) "
+        "SELECT 'Benchmark reader ' || n, 'benchmark_' || n || '@mail.com' FROM generate_series(1, :count) n "
+        "RETURNING id"
+    ), {"count": readers})).scalars().first()
+    first_book = (await session.execute(text(
+        f"INSERT INTO {Book.__tablename__} (name, author, description, published_at, quantity) "
+        "SELECT 'Benchmark book ' || n, 'Benchmark author', 'Benchmark', 2000, 1000 FROM generate_series(1, :count) n "
+        "RETURNING id"
+    ), {"count": books})).scalars().first()
+    await session.execute(text(
+        f"INSERT INTO {BorrowedBook.__tablename__} (reader_id, book_id, borrow_date, return_date) "
+        "SELECT :first_reader + n % :readers, :first_book + (n / :readers) % :books, "
+        "  now() - (:rows - n) * interval '1 second', "
+        "  CASE WHEN n > :rows - 3 * :readers THEN NULL ELSE now() - (:rows - n) * interval '1 second' + interval '14 days' END "
+        "FROM generate_series(1, :rows) n"
+    ), {"first_reader": first_reader, "readers": readers, "first_book": first_book, "books": books, "rows": rows})
+    await session.execute(text(f"ANALYZE {Reader.__tablename__}, {Book.__tablename__}, {BorrowedBook.__tablename__}"))
+    return first_reader, first_book
+
+
+async def report(session: AsyncSession, title: str, reader_id: int, book_id: int) -> None:
+    from src.api.v1.library.repository import LibraryRepository
+
+    actual_books = (
+        select(Book)
+        .join(BorrowedBook, BorrowedBook.book_id == Book.id)
+        .where(BorrowedBook.reader_id == reader_id, BorrowedBook.return_date.is_(None))
+        .order_by(BorrowedBook.book_id)
+    )
+    reader_history = (
+        select(BorrowedBook)
+        .where(BorrowedBook.reader_id == reader_id)
+        .order_by(BorrowedBook.borrow_date.desc())
+        .limit(10)
+    )
+    reader_loans_page = (
+        select(BorrowedBook)
+        .where(
+            BorrowedBook.reader_id == reader_id,
+            tuple_(BorrowedBook.borrow_date, BorrowedBook.id) < tuple_(func.now() - text("interval '1 day'"), 0),
+        )
+        .order_by(BorrowedBook.borrow_date.desc(), BorrowedBook.id.desc())
+        .limit(10)
+    )
+    cascade_delete = delete(Book).where(Book.id == book_id)
+
+    print(f"\n===== {title} =====")
+    for name, stmt in (
+            ("/library/info/{reader_id}", actual_books),
+            ("reader history", reader_history),
+            ("/readers/{id}/loans (cursor page)", reader_loans_page),
+            ("book delete (ON DELETE CASCADE)", cascade_delete),
+    ):
+        #  Каждый запрос - в своей точке сохранения: удаление откатывается и не влияет на следующие планы
+        savepoint = await session.begin_nested()
+        started = time.perf_counter()
+        plan = (await session.execute(text(explain(stmt)))).scalars().all()
+        elapsed = (time.perf_counter() - started) * 1000
+        await savepoint.rollback()
+        print(f"\n--- {name}: {elapsed:.1f} ms")
+        print("\n".join(plan))
+
+    repository: LibraryRepository = LibraryRepository(
+        session=session
+    )
+    started = time.perf_counter()
+    await repository.get_actual_books(reader_id=reader_id)
+    print(f"\n--- LibraryRepository.get_actual_books: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
+async def benchmark(rows: int, readers: int, books: int) -> None:
+    #  Все изменения (тестовые данные и снятые индексы) делаются в одной транзакции и откатываются
+    async with DBConfigurer.Session() as session:
+        started = time.perf_counter()
+        first_reader, first_book = await seed(session, rows=rows, readers=readers, books=books)
+        print(f"Seeded {rows} loans for {readers} readers and {books} books in {time.perf_counter() - started:.1f} s")
+
+        savepoint = await session.begin_nested()
+        for index in LOAN_INDEXES:
+            await session.execute(text(f"DROP INDEX {index}"))
+        await report(session, "without loan indexes", reader_id=first_reader, book_id=first_book)
+        await savepoint.rollback()
+
+        await report(session, "with loan indexes", reader_id=first_reader, book_id=first_book)
+        await session.rollback()
+    await DBConfigurer.dispose()
+
+
+if __name__ == "__main__":
+    # python -m src.scripts.benchmark_borrowed_books --rows 10000000
+    parser = argparse.ArgumentParser(description="Query plans for borrowed books before and after loan indexes")
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--readers", type=int, default=100_000)
+    parser.add_argument("--books", type=int, default=10_000)
+    args = parser.parse_args()
+    asyncio.run(benchmark(rows=args.rows, readers=args.readers, books=args.books))
@@ -0,0 +1,109 @@
+import asyncio
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import orjson
+from fastapi.routing import APIRoute, serialize_response
+
+from src.core.models import Book, Reader
+
+
+PAGE_SIZES = (10, 100, 1000)
+HISTORY_SIZE = 10
+REPEATS = 20
+
+#  Строка истории выдач в том виде, в каком ее отдает LibraryRepository.get_history
+HistoryRow = namedtuple("HistoryRow", ("id", "book_id", "reader_id", "borrow_date", "return_date"))
+
+
+def make_page(model: str, size: int):
+    now = datetime.now()
+    if model == "books":
+        items = [
+            Book(id=i, name=f"Book {i}", author="Author", description="Description", published_at=2000,
+                 isbn=f"isbn-{i}", quantity=5)
+            for i in range(1, size + 1)
+        ]
+        owner = "book_id"
+    else:
+        items = [
+            Reader(id=i, name=f"Reader {i}", email=f"reader_{i}@mail.com", active_loans=1)
+            for i in range(1, size + 1)
+        ]
+        owner = "reader_id"
+    history = {
+        item.id: [
+            HistoryRow(
+                id=item.id * HISTORY_SIZE + n,
+                book_id=item.id if owner == "book_id" else n,
+                reader_id=item.id if owner == "reader_id" else n,
+                borrow_date=now - timedelta(days=n),
+                return_date=None if n == 0 else now - timedelta(days=n) + timedelta(hours=1),
+            ) for n in range(HISTORY_SIZE)
+        ] for item in items
+    }
+    totals = {item.id: HISTORY_SIZE for item in items}
+    return items, history, totals
+
+
+async def pydantic_path(route: APIRoute, serializer, items, history, totals) -> bytes:
+    #  Прежний путь: модель pydantic на каждый объект и выдачу, затем валидация и сериализация FastAPI
+    if history is None:
+        content = items
+    else:
+        content = [
+            await serializer.serialize(
+                model=item,
+                borrowed_books=history.get(item.id, []),
+                borrowed_total=totals.get(item.id, 0),
+            ) for item in items
+        ]
+    return orjson.dumps(await serialize_response(field=route.response_field, response_content=content))
+
+
+def fast_path(serializer, items, history, totals) -> bytes:
+    return orjson.dumps(serializer.project_many(items, history=history, totals=totals))
+
+
+async def benchmark() -> None:
+    from src.main import app
+    from src.api.v1.books import serializer as books_serializer
+    from src.api.v1.readers import serializer as readers_serializer
+
+    routes = {
+        (route.path, tuple(route.methods)): route for route in app.routes if isinstance(route, APIRoute)
+    }
+    cases = (
+        ("GET /books", "books", books_serializer, False),
+        ("GET /books/full", "books", books_serializer, True),
+        ("GET /readers", "readers", readers_serializer, False),
+        ("GET /readers/full", "readers", readers_serializer, True),
+    )
+    print(f"{'endpoint':<20}{'page':>6}{'pydantic, us/item':>20}{'fast, us/item':>16}{'speedup':>10}")
+    for title, model, serializer, full in cases:
+        method, path = title.split()
+        route = routes[(f"/api/v1{path}", (method,))]
+        for size in PAGE_SIZES:
+            items, history, totals = make_page(model, size)
+            if not full:
+                history = totals = None
+
+            slow_body = await pydantic_path(route, serializer, items, history, totals)
+            fast_body = fast_path(serializer, items, history, totals)
+            assert orjson.loads(slow_body) == orjson.loads(fast_body), title
+
+            started = time.perf_counter()
+            for _ in range(REPEATS):
+                await pydantic_path(route, serializer, items, history, totals)
+            slow = (time.perf_counter() - started) / REPEATS / size * 1e6
+            started = time.perf_counter()
+            for _ in range(REPEATS):
+                fast_path(serializer, items, history, totals)
+            fast = (time.perf_counter() - started) / REPEATS / size * 1e6
+            print(f"{title:<20}{size:>6}{slow:>20.2f}{fast:>16.2f}{slow / fast:>9.1f}x")
+
+
+if __name__ == "__main__":
+    # python -m src.scripts.benchmark_serialization
+    asyncio.run(benchmark())
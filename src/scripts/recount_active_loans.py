@@ -0,0 +1,22 @@
+import asyncio
+
+from src.core.config import DBConfigurer
+
+
+async def recount_active_loans() -> int:
+    from src.api.v1.readers.repository import ReaderRepository
+
+    async with DBConfigurer.Session() as session:
+        repository: ReaderRepository = ReaderRepository(
+            session=session
+        )
+        fixed = await repository.recount_active_loans()
+    await DBConfigurer.dispose()
+    return fixed
+
+
+if __name__ == "__main__":
+    # python -m src.scripts.recount_active_loans
+    fixed_count = asyncio.run(recount_active_loans())
+    #  Итог выводится в stdout, как в остальных скриптах: он не должен зависеть от LOGGING_LEVEL
+    print(f"Active loans counter recounted, {fixed_count} reader(s) fixed")
@@ -0,0 +1,57 @@
+import base64
+import binascii
+from typing import Any, Callable, Optional, Sequence
+
+import orjson
+from fastapi import Response
+
+from .errors_base import ErrorsBase
+from .exceptions import CustomException
+
+
+class Cursor:
+    HEADER = "X-Next-Cursor"
+
+    @staticmethod
+    def encode(*values: Any) -> str:
+        return base64.urlsafe_b64encode(orjson.dumps(values)).decode().rstrip("=")
+
+    @staticmethod
+    def decode(cursor: str, length: int = 1) -> list:
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            values = orjson.loads(base64.urlsafe_b64decode(padded))
+        except (binascii.Error, ValueError):
+            raise CustomException(msg=ErrorsBase.INVALID_CURSOR())
+        if not isinstance(values, list) or len(values) != length:
+            raise CustomException(msg=ErrorsBase.INVALID_CURSOR())
+        return values
+
+    @staticmethod
+    def is_id(value: Any) -> bool:
+        #  bool - подкласс int: true/false в курсоре не являются id
+        return isinstance(value, int) and not isinstance(value, bool)
+
+    @staticmethod
+    def decode_id(cursor: str) -> int:
+        #  Курсор списка по id - [id последней записи страницы]; значение не того типа - ошибка 400,
+        # а не ошибка базы при сравнении с колонкой id
+        after_id, = Cursor.decode(cursor)
+        if not Cursor.is_id(after_id):
+            raise CustomException(msg=ErrorsBase.INVALID_CURSOR())
+        return after_id
+
+    @staticmethod
+    def set_next(
+            response: Optional[Response],
+            items: Sequence[Any],
+            size: int,
+            key: Callable[[Any], Sequence[Any]] = lambda item: (item.id,),
+    ) -> Optional[str]:
+        #  Курсор отдается только для полной страницы - неполная страница последняя
+        if not items or len(items) < size:
+            return None
+        next_cursor = Cursor.encode(*key(items[-1]))
+        if response is not None:
+            response.headers[Cursor.HEADER] = next_cursor
+        return next_cursor
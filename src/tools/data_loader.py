@@ -0,0 +1,111 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable, Iterable, Mapping, Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+
+class DataLoader:
+    #  Пакетная загрузка по ключам в пределах запроса: load(key) ставит ключ в очередь, и все ключи,
+    # запрошенные за один проход цикла событий, загружаются одним вызовом batch_load(keys) -> {ключ: значение}.
+    # Результат запоминается на время жизни загрузчика: повторный load того же ключа не обращается к базе.
+    # Отсутствующий в ответе ключ - None, ошибка загрузки передается всем ожидающим и не запоминается
+    def __init__(
+            self,
+            batch_load: Callable[[list], Awaitable[Mapping[Hashable, Any]]],
+            lock: Optional[asyncio.Lock] = None,
+    ):
+        self.batch_load = batch_load
+        #  Одна AsyncSession не допускает параллельных запросов: загрузчики одной сессии работают по очереди
+        self.lock = lock or asyncio.Lock()
+        self.batches = 0
+        self._futures: dict[Hashable, asyncio.Future] = {}
+        self._queue: list[Hashable] = []
+        self._tasks: set[asyncio.Task] = set()
+
+    @classmethod
+    def of(
+            cls,
+            session: AsyncSession,
+            name: str,
+            batch_load: Callable[[list], Awaitable[Mapping[Hashable, Any]]],
+    ) -> "DataLoader":
+        #  Загрузчики хранятся в session.info: сессия создается на запрос (session_getter) и общая для всех его
+        # зависимостей, поэтому загрузчик и запомненные результаты живут ровно один запрос. После ROLLBACK
+        # запомненные ORM-объекты устарели - загрузчики сессии сбрасываются (clear_session)
+        loaders: dict[str, DataLoader] = session.info.setdefault("loaders", {})
+        if name not in loaders:
+            lock = session.info.setdefault("loaders_lock", asyncio.Lock())
+            loaders[name] = cls(batch_load, lock=lock)
+        return loaders[name]
+
+    def load(
+            self,
+            key: Hashable,
+    ) -> asyncio.Future:
+        future = self._futures.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._futures[key] = future
+            if not self._queue:
+                loop.call_soon(self._dispatch)
+            self._queue.append(key)
+        return future
+
+    async def load_many(
+            self,
+            keys: Iterable[Hashable],
+    ) -> list[Any]:
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def prime(
+            self,
+            key: Hashable,
+            value: Any,
+    ) -> None:
+        if key not in self._futures:
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(value)
+            self._futures[key] = future
+
+    def clear(
+            self,
+            key: Hashable,
+    ) -> None:
+        self._futures.pop(key, None)
+
+    def _dispatch(self) -> None:
+        keys, self._queue = self._queue, []
+        task = asyncio.create_task(self._run(keys))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(
+            self,
+            keys: list[Hashable],
+    ) -> None:
+        try:
+            async with self.lock:
+                self.batches += 1
+                values = await self.batch_load(keys)
+        except Exception as exc:
+            for key in keys:
+                future = self._futures.pop(key, None)
+                if future is not None and not future.done():
+                    future.set_exception(exc)
+            return
+        for key in keys:
+            future = self._futures.get(key)
+            if future is not None and not future.done():
+                future.set_result(values.get(key))
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def clear_session(
+        session: Session,
+        previous_transaction: Any,
+) -> None:
+    #  info у AsyncSession и ее sync_session - один словарь
+    session.info.pop("loaders", None)
@@ -22,6 +22,26 @@ class ErrorsBase:
     def ALREADY_EXISTS(cls):
         return f"{cls.CLASS} already exists"
 
+    @classmethod
+    def PRECONDITION_FAILED(cls):
+        return f"{cls.CLASS} was modified, If-Match precondition failed"
+
+    @staticmethod
+    def INVALID_CURSOR():
+        return "Invalid pagination cursor"
+
+    @staticmethod
+    def INVALID_FIELDS(unknown: list[str], allowed: tuple[str, ...]):
+        return "Unknown fields requested: %s. Allowed fields: %s" % (", ".join(unknown) or "none", ", ".join(allowed))
+
+    @staticmethod
+    def INVALID_PERIOD():
+        return "borrowed_from must be earlier than borrowed_to"
+
+    @staticmethod
+    def FORMAT_UNAVAILABLE(format: str, package: str):
+        return "Format %s is not available: %s is not installed" % (format, package)
+
     @classmethod
     def NO_RIGHTS(cls):
         return "You are not authorized for this operation"
@@ -0,0 +1,65 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Optional
+
+import orjson
+from fastapi import Response, status
+
+
+class ETag:
+    #  Слабые ETag (списки): совпадение означает одинаковое содержимое ответа, а не побайтовое равенство.
+    # Сильные ETag (одна запись): ответ однозначно определяется версией записи и набором полей
+    @staticmethod
+    def make(*parts: Any, weak: bool = True) -> str:
+        digest = hashlib.blake2b(orjson.dumps(parts), digest_size=8).hexdigest()
+        return f'W/"{digest}"' if weak else f'"{digest}"'
+
+    @staticmethod
+    def of(orm_model: Any, *parts: Any) -> str:
+        return ETag.make(orm_model.id, orm_model.updated_at, *parts, weak=False)
+
+    @staticmethod
+    def matches(header: Optional[str], etag: str, weak: bool = True) -> bool:
+        #  weak=False - сильное сравнение для If-Match (RFC 9110, 13.1.1): слабый тег не совпадает ни с чем
+        if not header:
+            return False
+        if header.strip() == "*":
+            return True
+        if weak:
+            opaque = etag.removeprefix("W/")
+            return any(
+                candidate.strip().removeprefix("W/") == opaque for candidate in header.split(",")
+            )
+        return not etag.startswith("W/") and any(candidate.strip() == etag for candidate in header.split(","))
+
+    @staticmethod
+    def get_headers(etag: str, last_modified: Optional[datetime] = None) -> dict[str, str]:
+        headers = {"ETag": etag}
+        if last_modified is not None:
+            headers["Last-Modified"] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+        return headers
+
+    @staticmethod
+    def is_not_modified(
+            etag: str,
+            last_modified: Optional[datetime] = None,
+            if_none_match: Optional[str] = None,
+            if_modified_since: Optional[str] = None,
+    ) -> bool:
+        #  If-Modified-Since учитывается, только если клиент не прислал If-None-Match (RFC 9110)
+        if if_none_match is not None:
+            return ETag.matches(if_none_match, etag)
+        if if_modified_since is None or last_modified is None:
+            return False
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified.replace(microsecond=0) <= since
+
+    @staticmethod
+    def not_modified(headers: dict[str, str]) -> Response:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
@@ -0,0 +1,95 @@
+import operator
+from typing import Any, Callable, Iterable, Mapping, Optional
+
+import orjson
+from fastapi import Response, status
+from pydantic import BaseModel
+
+from .errors_base import ErrorsBase
+from .exceptions import CustomException
+
+
+class Projection:
+    #  Заранее собранное отображение объекта (ORM-модель, Row, mapping) в dict полей схемы: поля и их порядок
+    # берутся из схемы ответа один раз, значения читаются одним attrgetter без создания моделей pydantic.
+    # Поля, которые сервис заполняет сам (вложенные списки, счетчики), перечисляются в exclude
+    def __init__(
+            self,
+            schema: type[BaseModel],
+            exclude: Iterable[str] = (),
+            include: Optional[Iterable[str]] = None,
+    ):
+        exclude, include = set(exclude), set(include) if include is not None else None
+        self.schema = schema
+        self.fields = tuple(
+            field for field in schema.model_fields
+            if field not in exclude and (include is None or field in include)
+        )
+        self._subsets: dict[tuple[str, ...], "Projection"] = {}
+        getter = operator.attrgetter(*self.fields)
+        self._getter = getter if len(self.fields) > 1 else lambda obj: (getter(obj),)
+        item_getter = operator.itemgetter(*self.fields)
+        self._item_getter = item_getter if len(self.fields) > 1 else lambda values: (item_getter(values),)
+
+    def __call__(self, obj: Any) -> dict[str, Any]:
+        return dict(zip(self.fields, self._getter(obj)))
+
+    def from_mapping(self, values: Mapping[str, Any]) -> dict[str, Any]:
+        return dict(zip(self.fields, self._item_getter(values)))
+
+    def many(self, objs: Iterable[Any]) -> list[dict[str, Any]]:
+        return [dict(zip(self.fields, self._getter(obj))) for obj in objs]
+
+    def batch(
+            self,
+            keys: Iterable[Any],
+            rows: Iterable[Any],
+            by: str = "id",
+            extend: Optional[Callable[[Any], Mapping[str, Any]]] = None,
+    ) -> list[dict[str, Any]]:
+        #  Пакетный поиск: результаты в порядке ключей запроса (с повторами), ненайденный ключ - found=false.
+        # extend дополняет найденную запись вычисляемыми полями (доступность книги или читателя)
+        found = {getattr(row, by): row for row in rows}
+        items = []
+        for key in keys:
+            row = found.get(key)
+            if row is None:
+                items.append({"key": key, "found": False, "item": None})
+                continue
+            item = self(row)
+            if extend is not None:
+                item.update(extend(row))
+            items.append({"key": key, "found": True, "item": item})
+        return items
+
+    def only(self, fields: Optional[str]) -> "Projection":
+        #  Sparse fieldsets: fields=id,name,author - подмножество полей проекции в порядке схемы.
+        # Неизвестное поле - ошибка 400, а не молча урезанный ответ. Подмножества собираются один раз
+        if not fields:
+            return self
+        requested = {field.strip() for field in fields.split(",")} - {""}
+        unknown = requested - set(self.fields)
+        if not requested or unknown:
+            raise CustomException(msg=ErrorsBase.INVALID_FIELDS(sorted(unknown), self.fields))
+        key = tuple(field for field in self.fields if field in requested)
+        if key not in self._subsets:
+            self._subsets[key] = Projection(self.schema, include=key)
+        return self._subsets[key]
+
+
+class FastJSON:
+    #  Готовый ответ из уже подготовленных dict: FastAPI не валидирует возвращенный Response по
+    # response_model повторно (схема в OpenAPI остается прежней). Заголовки, выставленные сервисом
+    # во временный response (курсор, ETag), переносятся в ответ
+    @staticmethod
+    def response(
+            content: Any,
+            response: Optional[Response] = None,
+            status_code: int = status.HTTP_200_OK,
+    ) -> Response:
+        return Response(
+            content=orjson.dumps(content),
+            status_code=status_code,
+            media_type="application/json",
+            headers=dict(response.headers) if response is not None else None,
+        )
@@ -0,0 +1,105 @@
+import codecs
+import csv
+from typing import Any, AsyncIterator, Literal, Optional
+
+import orjson
+
+
+Row = tuple[int, Optional[dict[str, Any]], Optional[str]]
+
+
+class RowStream:
+    #  Построчный разбор тела запроса (CSV с заголовком или NDJSON) по мере поступления: в памяти только
+    # текущий фрагмент тела и незавершенная строка. Каждая запись - (номер строки, dict или None, ошибка или None);
+    # пустые значения CSV пропускаются, чтобы сработали значения по умолчанию схемы
+    FORMATS = ("csv", "ndjson")
+
+    @staticmethod
+    def get_format(
+            content_type: Optional[str],
+            format: Optional[Literal["csv", "ndjson"]] = None,
+    ) -> Literal["csv", "ndjson"]:
+        if format is not None:
+            return format
+        content_type = (content_type or "").lower()
+        return "ndjson" if "ndjson" in content_type or "jsonl" in content_type else "csv"
+
+    @staticmethod
+    async def lines(
+            chunks: AsyncIterator[bytes],
+    ) -> AsyncIterator[tuple[int, str]]:
+        decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+        pending, number = "", 0
+        async for chunk in chunks:
+            pending += decoder.decode(chunk)
+            *complete, pending = pending.split("\n")
+            for line in complete:
+                number += 1
+                yield number, line.rstrip("\r")
+        pending += decoder.decode(b"", final=True)
+        if pending:
+            yield number + 1, pending.rstrip("\r")
+
+    @classmethod
+    async def csv(
+            cls,
+            chunks: AsyncIterator[bytes],
+    ) -> AsyncIterator[Row]:
+        #  Значение в кавычках может содержать перевод строки: запись собирается, пока кавычек нечетное число
+        header: Optional[list[str]] = None
+        record, start = None, 0
+        async for number, line in cls.lines(chunks):
+            if record is None:
+                record, start = line, number
+            else:
+                record += "\n" + line
+            if record.count('"') % 2:
+                continue
+            values, record = next(csv.reader([record]), []), None
+            if not values:
+                continue
+            if header is None:
+                header = [value.strip() for value in values]
+                continue
+            if len(values) != len(header):
+                yield start, None, "Expected %s fields, got %s" % (len(header), len(values))
+                continue
+            yield start, {key: value for key, value in zip(header, values) if value != ""}, None
+        if record is not None:
+            yield start, None, "Unterminated quoted field"
+
+    @classmethod
+    async def ndjson(
+            cls,
+            chunks: AsyncIterator[bytes],
+    ) -> AsyncIterator[Row]:
+        async for number, line in cls.lines(chunks):
+            if not line.strip():
+                continue
+            try:
+                row = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                yield number, None, "Invalid JSON"
+                continue
+            if not isinstance(row, dict):
+                yield number, None, "Expected a JSON object"
+                continue
+            yield number, row, None
+
+    @classmethod
+    def rows(
+            cls,
+            chunks: AsyncIterator[bytes],
+            format: Literal["csv", "ndjson"],
+    ) -> AsyncIterator[Row]:
+        return cls.csv(chunks) if format == "csv" else cls.ndjson(chunks)
+
+    @staticmethod
+    def errors(exc: Exception) -> str:
+        #  Ошибки pydantic одной строкой: "поле: сообщение; ..."
+        if hasattr(exc, "errors"):
+            return "; ".join(
+                "%s: %s" % (".".join(str(loc) for loc in error["loc"]) or "row", error["msg"])
+                for error in exc.errors()
+            )
+        return str(exc)
@@ -0,0 +1,54 @@
+from typing import Optional
+
+from fastapi import Response
+from sqlalchemy import Select, func, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+class TotalCount:
+    #  Общее количество строк списка - в заголовке ответа, тело остается массивом. exact - COUNT(*) по фильтру,
+    # estimated - без чтения таблицы: статистика pg_class для списка без фильтра, оценка планировщика для фильтра
+    HEADER = "X-Total-Count"
+
+    #  Как у планировщика: плотность строк по последнему ANALYZE, умноженная на текущее число страниц таблицы
+    # (reltuples = -1 - таблица еще не анализировалась)
+    TABLE_ESTIMATE = text(
+        "SELECT CASE WHEN relpages > 0 "
+        "THEN reltuples / relpages * (pg_relation_size(oid) / current_setting('block_size')::int) "
+        "ELSE reltuples END::bigint "
+        "FROM pg_class WHERE oid = CAST(:table AS regclass)"
+    )
+
+    @staticmethod
+    async def exact(
+            session: AsyncSession,
+            stmt: Select,
+    ) -> int:
+        return await session.scalar(stmt.with_only_columns(func.count(), maintain_column_froms=True))
+
+    @staticmethod
+    async def estimated(
+            session: AsyncSession,
+            stmt: Select,
+    ) -> int:
+        if stmt.whereclause is None:
+            table = stmt.get_final_froms()[0]
+            estimate = await session.scalar(TotalCount.TABLE_ESTIMATE, {"table": table.name})
+            if estimate is not None and estimate >= 0:
+                return estimate
+        #  EXPLAIN без ANALYZE только строит план: число строк - оценка по статистике колонок фильтра
+        connection = await session.connection()
+        compiled = stmt.compile(dialect=connection.dialect)
+        result = await connection.exec_driver_sql(
+            f"EXPLAIN (FORMAT JSON) {compiled}",
+            tuple(compiled.params[name] for name in compiled.positiontup),
+        )
+        return result.scalar()[0]["Plan"]["Plan Rows"]
+
+    @staticmethod
+    def set(
+            response: Optional[Response],
+            total: int,
+    ) -> None:
+        if response is not None:
+            response.headers[TotalCount.HEADER] = str(total)
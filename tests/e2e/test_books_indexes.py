@@ -0,0 +1,76 @@
+import re
+from itertools import combinations
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+
+from src.api.v1.books.repository import BookRepository
+from src.core.config import DBConfigurer
+
+FILTERS = {
+    "author": {"author": "Tester"},
+    "published": {"published_from": 1990, "published_to": 2010},
+    "available": {"available": True},
+}
+CURSORS = {
+    "name": ("Book", 10),
+    "author": ("Tester", 10),
+    "published_at": (2000, 10),
+    "-quantity": (5, 10),
+}
+#  Условие keyset: id > 10 без сортировки, сравнение строк ROW(колонка, id) > | < ROW(...) с сортировкой
+KEYSET = re.compile(r"\bid\)? [<>] ")
+
+
+def walk(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from walk(child)
+
+
+def get_combinations():
+    for count in range(len(FILTERS) + 1):
+        for names in combinations(FILTERS, count):
+            for sort in (None, *BookRepository.SORTS):
+                for keyset in (False, True):
+                    yield names, sort, keyset
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_books_list_uses_indexes():
+    """
+    Проверка по EXPLAIN, что каждая комбинация фильтров, сортировки и пагинации GET /books обслуживается индексом:
+    нет Seq Scan, нет полного обхода индекса с последующей сортировкой, а условие курсора - граница диапазона
+    индекса (Index Cond), а не построчный фильтр: стоимость глубокой страницы не растет с глубиной.
+    """
+    async with DBConfigurer.Session() as session:
+        #  В тестовой базе мало строк, и последовательное чтение для планировщика дешевле любого индекса.
+        # С enable_seqscan=off Seq Scan в плане остается, только если подходящего индекса нет
+        await session.execute(text("SET LOCAL enable_seqscan = off"))
+        repository = BookRepository(session=session)
+        for names, sort, keyset in get_combinations():
+            filters = {key: value for name in names for key, value in FILTERS[name].items()}
+            stmt = repository.get_all_stmt(
+                size=10,
+                sort=sort,
+                after_id=10 if keyset and sort is None else None,
+                after=CURSORS[sort] if keyset and sort is not None else None,
+                **filters,
+            )
+            sql = stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+            #  На маленькой базе планировщику бывает дешевле прочитать диапазон фильтра и отсортировать его.
+            # Для курсора без Sort остается только обход индекса сортировки - он и должен ограничиваться курсором
+            await session.execute(text(f"SET LOCAL enable_sort = {'off' if keyset else 'on'}"))
+            plan = (await session.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))).scalar()[0]["Plan"]
+            nodes = list(walk(plan))
+            case = f"filters={names} sort={sort} keyset={keyset}: {[node['Node Type'] for node in nodes]}"
+
+            assert not any(node["Node Type"] == "Seq Scan" for node in nodes), case
+            assert (
+                any("Index Cond" in node for node in nodes)
+                or not any(node["Node Type"] in ("Sort", "Incremental Sort") for node in nodes)
+            ), case
+            if keyset:
+                assert any(KEYSET.search(node.get("Index Cond", "")) for node in nodes), case
+                assert not any(KEYSET.search(node.get("Filter", "")) for node in nodes), case
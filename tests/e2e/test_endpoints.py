@@ -1,4 +1,15 @@
+import asyncio
+import random
+import string
+
+import orjson
 import pytest
+from sqlalchemy import select
+
+from src.core.cache import EntityCache, InvalidationBus, MemoryCacheBackend, MISSING
+from src.core.config import CacheConfigurer, DBConfigurer
+from src.core.models import Book, Reader
+from src.tools.cursor import Cursor
 
 from .fixtures import *
 
@@ -37,3 +48,844 @@ async def test_readers_full_with_invalid_token(test_client, token):
     }
     response = await test_client.get("/api/v1/readers/full", headers=headers)
     assert response.status_code == 401
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_books_cursor_pagination(test_client, token):
+    """
+    Проверка keyset-пагинации: страницы по курсору идут подряд по id без пропусков и повторов.
+    """
+    headers = {
+        "Authorization": f"Bearer {token}"
+    }
+    for i in range(3):
+        response = await test_client.post(
+            "/api/v1/books",
+            json={"name": f"Cursor book {i}", "author": "Tester", "quantity": 1},
+            headers=headers,
+        )
+        assert response.status_code == 201
+
+    first = await test_client.get("/api/v1/books/full", params={"size": 2}, headers=headers)
+    assert first.status_code == 200
+    next_cursor = first.headers["X-Next-Cursor"]
+
+    second = await test_client.get(
+        "/api/v1/books/full", params={"size": 2, "cursor": next_cursor}, headers=headers
+    )
+    assert second.status_code == 200
+    first_ids = [item["id"] for item in first.json()]
+    second_ids = [item["id"] for item in second.json()]
+    assert second_ids
+    assert max(first_ids) < min(second_ids)
+    assert second_ids == sorted(second_ids)
+
+    invalid = await test_client.get("/api/v1/books", params={"cursor": "not-a-cursor"})
+    assert invalid.status_code == 400
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_books_cache_invalidation(test_client, token):
+    """
+    Проверка кеша книг: изменение, выдача и удаление сразу видны в GET /books/{id}, 404 тоже кешируется.
+    """
+    headers = {
+        "Authorization": f"Bearer {token}"
+    }
+    response = await test_client.post(
+        "/api/v1/books",
+        json={"name": "Cached book", "author": "Tester", "quantity": 2},
+        headers=headers,
+    )
+    assert response.status_code == 201
+    book_id = response.json()["id"]
+    reader = await test_client.post(
+        "/api/v1/readers",
+        json={"name": "Cache reader", "email": f"cache_{book_id}@mail.com"},
+        headers=headers,
+    )
+    assert reader.status_code == 201
+    reader_id = reader.json()["id"]
+
+    assert (await test_client.get(f"/api/v1/books/{book_id}", headers=headers)).json()["name"] == "Cached book"
+
+    edited = await test_client.patch(f"/api/v1/books/{book_id}", json={"name": "Edited book"}, headers=headers)
+    assert edited.status_code == 200
+    assert (await test_client.get(f"/api/v1/books/{book_id}", headers=headers)).json()["name"] == "Edited book"
+
+    served = await test_client.post(
+        "/api/v1/library/serve", params={"book_id": book_id, "reader_id": reader_id}, headers=headers
+    )
+    assert served.status_code == 201
+    assert (await test_client.get(f"/api/v1/books/{book_id}", headers=headers)).json()["quantity"] == 1
+    assert (await test_client.get(f"/api/v1/readers/{reader_id}", headers=headers)).json()["active_loans"] == 1
+
+    deleted = await test_client.delete(f"/api/v1/books/{book_id}", headers=headers)
+    assert deleted.status_code == 204
+    assert (await test_client.get(f"/api/v1/books/{book_id}", headers=headers)).status_code == 404
+    assert (await test_client.get(f"/api/v1/readers/{reader_id}", headers=headers)).json()["active_loans"] == 0
+
+    stats = await test_client.get("/api/v1/tech/cache", headers=headers)
+    assert stats.status_code == 200
+    assert stats.json()["hits"] > 0
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_cache_invalidation_bus(test_client, token):
+    """
+    Проверка шины инвалидации: изменение книги через API вытесняет ее из кеша другого воркера по NOTIFY.
+    """
+    headers = {
+        "Authorization": f"Bearer {token}"
+    }
+    response = await test_client.post(
+        "/api/v1/books",
+        json={"name": "Bus book", "author": "Tester", "quantity": 1},
+        headers=headers,
+    )
+    assert response.status_code == 201
+    book = response.json()
+
+    #  Кеш "другого воркера" со своей шиной на том же канале
+    worker_cache = EntityCache(
+        backend=MemoryCacheBackend(ttl=60, max_size=10),
+        negative_ttl=10,
+        channel=CacheConfigurer.entities.channel,
+    )
+    worker_bus = InvalidationBus(cache=worker_cache, dsn=CacheConfigurer.bus.dsn)
+    await worker_bus.start()
+    try:
+        key = worker_cache.get_key(Book, book["id"])
+        await worker_cache.backend.set(key, book)
+
+        edited = await test_client.patch(f"/api/v1/books/{book['id']}", json={"quantity": 5}, headers=headers)
+        assert edited.status_code == 200
+        for _ in range(50):
+            if await worker_cache.backend.get(key) is MISSING:
+                break
+            await asyncio.sleep(0.02)
+        assert await worker_cache.backend.get(key) is MISSING
+        assert worker_bus.received >= 1
+    finally:
+        await worker_bus.stop()
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_books_conditional_requests(test_client, token):
+    """
+    Проверка ETag: 304 на If-None-Match/If-Modified-Since, 412 на устаревший If-Match, смена версии при выдаче.
+    """
+    headers = {
+        "Authorization": f"Bearer {token}"
+    }
+    response = await test_client.post(
+        "/api/v1/books",
+        json={"name": "Conditional book", "author": "Tester", "quantity": 2},
+        headers=headers,
+    )
+    assert response.status_code == 201
+    book_id = response.json()["id"]
+
+    first = await test_client.get(f"/api/v1/books/{book_id}", headers=headers)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert etag.startswith('"')
+
+    cached = await test_client.get(f"/api/v1/books/{book_id}", headers={**headers, "If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    weak_cached = await test_client.get(f"/api/v1/books/{book_id}", headers={**headers, "If-None-Match": f"W/{etag}"})
+    assert weak_cached.status_code == 304
+    since = await test_client.get(
+        f"/api/v1/books/{book_id}", headers={**headers, "If-Modified-Since": first.headers["Last-Modified"]}
+    )
+    assert since.status_code == 304
+
+    weak_match = await test_client.patch(
+        f"/api/v1/books/{book_id}", json={"name": "Weak"}, headers={**headers, "If-Match": f"W/{etag}"}
+    )
+    assert weak_match.status_code == 412
+    edited = await test_client.patch(
+        f"/api/v1/books/{book_id}", json={"name": "Edited"}, headers={**headers, "If-Match": etag}
+    )
+    assert edited.status_code == 200
+    assert edited.headers["ETag"] != etag
+    assert (await test_client.get(f"/api/v1/books/{book_id}", headers=headers)).headers["ETag"] == edited.headers["ETag"]
+    stale = await test_client.patch(
+        f"/api/v1/books/{book_id}", json={"name": "Lost update"}, headers={**headers, "If-Match": etag}
+    )
+    assert stale.status_code == 412
+    assert (await test_client.get(f"/api/v1/books/{book_id}", headers=headers)).json()["name"] == "Edited"
+
+    reader = await test_client.post(
+        "/api/v1/readers",
+        json={"name": "Conditional reader", "email": f"conditional_{book_id}@mail.com"},
+        headers=headers,
+    )
+    served = await test_client.post(
+        "/api/v1/library/serve", params={"book_id": book_id, "reader_id": reader.json()["id"]}, headers=headers
+    )
+    assert served.status_code == 201
+    after_serve = await test_client.get(
+        f"/api/v1/books/{book_id}", headers={**headers, "If-None-Match": edited.headers["ETag"]}
+    )
+    assert after_serve.status_code == 200
+
+    page = await test_client.get("/api/v1/books", params={"size": 5})
+    not_modified = await test_client.get("/api/v1/books", params={"size": 5}, headers={"If-None-Match": page.headers["ETag"]})
+    assert not_modified.status_code == 304
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_sparse_fieldsets(test_client, token):
+    """
+    Проверка fields=: ответ содержит только запрошенные поля в порядке схемы, курсор сохраняется, неизвестное поле - 400.
+    """
+    headers = {
+        "Authorization": f"Bearer {token}"
+    }
+    response = await test_client.post(
+        "/api/v1/books",
+        json={"name": "Sparse book", "author": "Tester", "description": "Long description", "quantity": 1},
+        headers=headers,
+    )
+    assert response.status_code == 201
+    book_id = response.json()["id"]
+
+    page = await test_client.get("/api/v1/books", params={"size": 1, "fields": "author, id,name"})
+    assert page.status_code == 200
+    assert list(page.json()[0]) == ["name", "author", "id"]
+    assert "X-Next-Cursor" in page.headers
+    assert "description" in (await test_client.get("/api/v1/books", params={"size": 1})).json()[0]
+
+    names = await test_client.get("/api/v1/books", params={"size": 3, "fields": "name"})
+    described = await test_client.get("/api/v1/books", params={"size": 3, "fields": "name,description"})
+    assert names.headers["ETag"] != described.headers["ETag"]
+    stale = await test_client.get(
+        "/api/v1/books", params={"size": 3, "fields": "name,description"}, headers={"If-None-Match": names.headers["ETag"]}
+    )
+    assert stale.status_code == 200
+
+    one = await test_client.get(f"/api/v1/books/{book_id}", params={"fields": "id,quantity"}, headers=headers)
+    assert one.json() == {"id": book_id, "quantity": 1}
+    assert "ETag" in one.headers
+    assert one.headers["ETag"] != (await test_client.get(f"/api/v1/books/{book_id}", headers=headers)).headers["ETag"]
+
+    readers = await test_client.get("/api/v1/readers", params={"fields": "id"}, headers=headers)
+    assert readers.status_code == 200
+    assert all(list(item) == ["id"] for item in readers.json())
+
+    for url in ("/api/v1/books", f"/api/v1/books/{book_id}", "/api/v1/readers"):
+        invalid = await test_client.get(url, params={"fields": "id,title"}, headers=headers)
+        assert invalid.status_code == 400
+        assert "title" in invalid.json()["detail"]
+    assert (await test_client.get("/api/v1/books", params={"fields": ","})).status_code == 400
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_books_filters_and_sort(test_client, token):
+    """
+    Проверка фильтров и сортировок GET /books: автор, годы, наличие, keyset-курсор по (значение, id), NULL в конце.
+    """
+    headers = {
+        "Authorization": f"Bearer {token}"
+    }
+    author = "Sorter " + "".join(random.choices(string.ascii_lowercase, k=8))
+    books = [
+        {"name": "Delta", "author": author, "published_at": 1995, "quantity": 0},
+        {"name": "Alpha", "author": author, "published_at": 2005, "quantity": 3},
+        {"name": "Charlie", "author": author, "quantity": 1},
+        {"name": "Bravo", "author": author, "published_at": 2005, "quantity": 7},
+        {"name": "Echo", "author": author, "published_at": 1980, "quantity": 2},
+    ]
+    ids = {}
+    for book in books:
+        response = await test_client.post("/api/v1/books", json=book, headers=headers)
+        assert response.status_code == 201
+        ids[book["name"]] = response.json()["id"]
+
+    async def get_names(**params):
+        names, cursor = [], None
+        while True:
+            page = await test_client.get(
+                "/api/v1/books",
+                params={"author": author, "size": 2, "fields": "name", **params, **({"cursor": cursor} if cursor else {})},
+            )
+            assert page.status_code == 200
+            names.extend(item["name"] for item in page.json())
+            cursor = page.headers.get("X-Next-Cursor")
+            if not cursor:
+                return names
+
+    assert await get_names() == ["Delta", "Alpha", "Charlie", "Bravo", "Echo"]
+    assert await get_names(sort="name") == ["Alpha", "Bravo", "Charlie", "Delta", "Echo"]
+    assert await get_names(sort="published_at") == ["Echo", "Delta", "Alpha", "Bravo", "Charlie"]
+    assert await get_names(sort="-quantity") == ["Bravo", "Alpha", "Echo", "Charlie", "Delta"]
+    assert await get_names(sort="published_at", published_from=1990, published_to=2005) == ["Delta", "Alpha", "Bravo"]
+    assert await get_names(sort="name", available="true") == ["Alpha", "Bravo", "Charlie", "Echo"]
+    assert await get_names(available="false") == ["Delta"]
+
+    page = await test_client.get("/api/v1/books", params={"author": author, "size": 2, "sort": "name"})
+    cursor = page.headers["X-Next-Cursor"]
+    assert (await test_client.get("/api/v1/books", params={"sort": "-quantity", "cursor": cursor})).status_code == 400
+    assert (await test_client.get("/api/v1/books", params={"cursor": cursor})).status_code == 400
+    assert (await test_client.get("/api/v1/books", params={"sort": "isbn"})).status_code == 400
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_books_search(test_client, token):
+    """
+    Проверка полнотекстового поиска: стемминг, вес названия выше описания, исключение слова, keyset-курсор.
+    """
+    headers = {
+        "Authorization": f"Bearer {token}"
+    }
+    marker = "zanzibar" + "".join(random.choices(string.ascii_lowercase, k=8))
+    books = [
+        {"name": f"{marker} voyages", "author": "Tester", "description": "Sea stories"},
+        {"name": "Harbour notes", "author": "Tester", "description": f"About {marker} voyage"},
+        {"name": f"{marker} cooking", "author": "Tester", "description": "Recipes"},
+    ]
+    ids = []
+    for book in books:
+        response = await test_client.post("/api/v1/books", json=book, headers=headers)
+        assert response.status_code == 201
+        ids.append(response.json()["id"])
+
+    found = await test_client.get("/api/v1/books/search", params={"q": f"{marker} voyage"})
+    assert found.status_code == 200
+    assert [item["id"] for item in found.json()] == [ids[0], ids[1]]
+
+    excluded = await test_client.get("/api/v1/books/search", params={"q": f"{marker} -cooking", "fields": "id"})
+    assert excluded.json() == [{"id": ids[0]}, {"id": ids[1]}]
+
+    pages, cursor = [], None
+    while True:
+        params = {"q": marker, "size": 2, "fields": "id"}
+        if cursor:
+            params["cursor"] = cursor
+        page = await test_client.get("/api/v1/books/search", params=params)
+        pages.extend(item["id"] for item in page.json())
+        cursor = page.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert sorted(pages) == sorted(ids) and len(pages) == 3
+
+    assert (await test_client.get("/api/v1/books/search", params={"q": marker, "cursor": "bad"})).status_code == 400
+    wrong_types = Cursor.encode("a", "b")
+    assert (await test_client.get("/api/v1/books/search", params={"q": marker, "cursor": wrong_types})).status_code == 400
+    assert (await test_client.get("/api/v1/books/search", params={"q": ""})).status_code == 400
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_books_suggest(test_client, token):
+    """
+    Проверка подсказок по префиксу: поиск по базе, индекс в памяти и его обновление при изменении и удалении книги.
+    """
+    from src.api.v1.books.suggestions import suggestions
+
+    headers = {
+        "Authorization": f"Bearer {token}"
+    }
+    marker = "Qz" + "".join(random.choices(string.ascii_lowercase, k=8))
+    books = [
+        {"name": f"{marker} atlas", "author": "Tester"},
+        {"name": f"{marker} zoology", "author": f"{marker} Author"},
+    ]
+    ids = []
+    for book in books:
+        response = await test_client.post("/api/v1/books", json=book, headers=headers)
+        assert response.status_code == 201
+        ids.append(response.json()["id"])
+    expected = [
+        {"field": "name", "value": f"{marker} atlas"},
+        {"field": "author", "value": f"{marker} Author"},
+        {"field": "name", "value": f"{marker} zoology"},
+    ]
+
+    found = await test_client.get("/api/v1/books/suggest", params={"prefix": marker.lower()})
+    assert found.status_code == 200
+    assert found.json() == expected
+    assert (await test_client.get("/api/v1/books/suggest", params={"prefix": marker, "limit": 1})).json() == expected[:1]
+
+    try:
+        await suggestions.rebuild()
+        assert suggestions.ready
+        assert (await test_client.get("/api/v1/books/suggest", params={"prefix": marker.upper()})).json() == expected
+
+        edited = await test_client.patch(f"/api/v1/books/{ids[0]}", json={"name": f"{marker} maps"}, headers=headers)
+        assert edited.status_code == 200
+        deleted = await test_client.delete(f"/api/v1/books/{ids[1]}", headers=headers)
+        assert deleted.status_code == 204
+        assert (await test_client.get("/api/v1/books/suggest", params={"prefix": marker})).json() == [
+            {"field": "name", "value": f"{marker} maps"},
+        ]
+
+        stats = await test_client.get("/api/v1/tech/suggestions", headers=headers)
+        assert stats.status_code == 200
+        assert stats.json()["ready"] and stats.json()["refreshes"] > 0
+    finally:
+        suggestions.ready = False
+
+    assert (await test_client.get("/api/v1/books/suggest", params={"prefix": ""})).status_code == 400
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_books_facets(test_client, token):
+    """
+    Проверка счетчиков по автору, десятилетию и наличию для фильтра и их сброса при изменении книги.
+    """
+    headers = {
+        "Authorization": f"Bearer {token}"
+    }
+    author = "Faceted " + "".join(random.choices(string.ascii_lowercase, k=8))
+    books = [
+        {"name": "First", "author": author, "published_at": 1994, "quantity": 2},
+        {"name": "Second", "author": author, "published_at": 1999, "quantity": 0},
+        {"name": "Third", "author": author, "published_at": 2001, "quantity": 1},
+        {"name": "Fourth", "author": author},
+    ]
+    ids = []
+    for book in books:
+        response = await test_client.post("/api/v1/books", json=book, headers=headers)
+        assert response.status_code == 201
+        ids.append(response.json()["id"])
+
+    facets = await test_client.get("/api/v1/books/facets", params={"author": author})
+    assert facets.status_code == 200
+    assert facets.json() == {
+        "total": 4,
+        "author": [{"value": author, "count": 4}],
+        "decade": [{"value": 1990, "count": 2}, {"value": 2000, "count": 1}, {"value": None, "count": 1}],
+        "available": [{"value": True, "count": 3}, {"value": False, "count": 1}],
+    }
+    filtered = await test_client.get("/api/v1/books/facets", params={"author": author, "published_to": 1999})
+    assert filtered.json()["total"] == 2
+    assert filtered.json()["available"] == [{"value": True, "count": 1}, {"value": False, "count": 1}]
+
+    stats = (await test_client.get("/api/v1/tech/facets", headers=headers)).json()
+    assert (await test_client.get("/api/v1/books/facets", params={"author": author})).json()["total"] == 4
+    assert (await test_client.get("/api/v1/tech/facets", headers=headers)).json()["hits"] == stats["hits"] + 1
+
+    edited = await test_client.patch(f"/api/v1/books/{ids[1]}", json={"quantity": 5}, headers=headers)
+    assert edited.status_code == 200
+    deleted = await test_client.delete(f"/api/v1/books/{ids[3]}", headers=headers)
+    assert deleted.status_code == 204
+    facets = (await test_client.get("/api/v1/books/facets", params={"author": author})).json()
+    assert facets["total"] == 3
+    assert facets["available"] == [{"value": True, "count": 3}]
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_list_total_count(test_client, token):
+    """
+    Проверка X-Total-Count: точное количество по фильтру (с учетом новых книг), оценка - целое число, без параметра
+    заголовка нет.
+    """
+    headers = {
+        "Authorization": f"Bearer {token}"
+    }
+    author = "Counted " + "".join(random.choices(string.ascii_lowercase, k=8))
+    for name in ("One", "Two"):
+        response = await test_client.post("/api/v1/books", json={"name": name, "author": author}, headers=headers)
+        assert response.status_code == 201
+
+    params = {"author": author, "size": 1, "include_total": "exact"}
+    assert (await test_client.get("/api/v1/books", params=params)).headers["X-Total-Count"] == "2"
+    response = await test_client.post("/api/v1/books", json={"name": "Three", "author": author}, headers=headers)
+    assert response.status_code == 201
+    assert (await test_client.get("/api/v1/books", params=params)).headers["X-Total-Count"] == "3"
+
+    for url, extra in (("/api/v1/books", {"author": author}), ("/api/v1/books", {}), ("/api/v1/readers", {})):
+        estimated = await test_client.get(url, params={**extra, "include_total": "estimated"}, headers=headers)
+        assert estimated.status_code == 200
+        assert int(estimated.headers["X-Total-Count"]) >= 0
+    readers = await test_client.get("/api/v1/readers", params={"include_total": "exact"}, headers=headers)
+    assert int(readers.headers["X-Total-Count"]) >= 1
+    assert "X-Total-Count" not in (await test_client.get("/api/v1/books")).headers
+    assert (await test_client.get("/api/v1/books", params={"include_total": "all"})).status_code == 400
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_batch_lookup(test_client, token):
+    """
+    Проверка пакетного чтения книг и читателей: порядок запроса, повторы, ненайденные ключи, наличие.
+    """
+    headers = {
+        "Authorization": f"Bearer {token}"
+    }
+    marker = "".join(random.choices(string.ascii_lowercase, k=10))
+    first = await test_client.post(
+        "/api/v1/books", json={"name": "Batch one", "author": "Tester", "isbn": f"isbn-{marker}", "quantity": 0},
+        headers=headers,
+    )
+    second = await test_client.post("/api/v1/books", json={"name": "Batch two", "author": "Tester"}, headers=headers)
+    first_id, second_id = first.json()["id"], second.json()["id"]
+
+    batch = await test_client.post("/api/v1/books/batch", json={"ids": [second_id, 0, first_id, second_id]}, headers=headers)
+    assert batch.status_code == 200
+    assert [(item["key"], item["found"]) for item in batch.json()] == [
+        (second_id, True), (0, False), (first_id, True), (second_id, True),
+    ]
+    assert batch.json()[1]["item"] is None
+    assert batch.json()[2]["item"]["name"] == "Batch one" and batch.json()[2]["item"]["available"] is False
+    assert batch.json()[0]["item"]["available"] is True
+
+    by_isbn = await test_client.post("/api/v1/books/batch", json={"isbns": [f"isbn-{marker}", "missing"]}, headers=headers)
+    assert [item["found"] for item in by_isbn.json()] == [True, False]
+    assert by_isbn.json()[0]["item"]["id"] == first_id
+
+    email = f"batch_{marker}@mail.com"
+    reader = await test_client.post("/api/v1/readers", json={"name": "Batch reader", "email": email}, headers=headers)
+    readers = await test_client.post(
+        "/api/v1/readers/batch", json={"emails": [f"none_{marker}@mail.com", email]}, headers=headers,
+    )
+    assert readers.status_code == 200
+    assert readers.json()[0] == {"key": f"none_{marker}@mail.com", "found": False, "item": None}
+    assert readers.json()[1]["item"]["id"] == reader.json()["id"] and readers.json()[1]["item"]["can_borrow"] is True
+
+    assert (await test_client.post("/api/v1/books/batch", json={"ids": [1], "isbns": ["x"]}, headers=headers)).status_code == 400
+    assert (await test_client.post("/api/v1/readers/batch", json={}, headers=headers)).status_code == 400
+    assert (await test_client.post("/api/v1/books/batch", json={"ids": [1]})).status_code == 401
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_book_full_single_flight(test_client, token):
+    """
+    Проверка объединения одновременных GET /books/{id}/full: одинаковые ответы, счетчики, свежесть после изменения.
+    """
+    headers = {
+        "Authorization": f"Bearer {token}"
+    }
+    book = await test_client.post("/api/v1/books", json={"name": "Hot book", "author": "Tester"}, headers=headers)
+    book_id = book.json()["id"]
+    before = {item["name"]: item for item in (await test_client.get("/api/v1/tech/flights", headers=headers)).json()}
+
+    responses = await asyncio.gather(
+        *(test_client.get(f"/api/v1/books/{book_id}/full", headers=headers) for _ in range(8))
+    )
+    assert {response.status_code for response in responses} == {200}
+    assert all(response.json() == responses[0].json() for response in responses)
+    assert responses[0].json()["name"] == "Hot book"
+
+    after = {item["name"]: item for item in (await test_client.get("/api/v1/tech/flights", headers=headers)).json()}
+    calls = after["books_full"]["calls"] - before["books_full"]["calls"]
+    executions = after["books_full"]["executions"] - before["books_full"]["executions"]
+    coalesced = after["books_full"]["coalesced"] - before["books_full"]["coalesced"]
+    assert calls == 8 and executions + coalesced == 8
+
+    await test_client.patch(f"/api/v1/books/{book_id}", json={"name": "Hotter book"}, headers=headers)
+    assert (await test_client.get(f"/api/v1/books/{book_id}/full", headers=headers)).json()["name"] == "Hotter book"
+    missing = await test_client.get("/api/v1/books/0/full", headers=headers)
+    assert missing.status_code == 404
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_books_import(test_client, token):
+    """
+    Проверка импорта книг: CSV и NDJSON, upsert по isbn, построчный отчет об ошибках.
+    """
+    headers = {
+        "Authorization": f"Bearer {token}"
+    }
+    marker = "".join(random.choices(string.ascii_lowercase, k=10))
+    body = (
+        "name,author,description,published_at,isbn,quantity\n"
+        f'Imported one,Tester,"Two-line\n""quoted"" description",1999,imp-{marker}-1,3\n'
+        "No author,,,,,\n"
+        f"Future book,Tester,,3000,imp-{marker}-2,\n"
+        f"Imported two,Tester,,,imp-{marker}-2,\n"
+        "Without isbn,Tester,,,,2\n"
+        "Too,many,fields,1,2,3,4\n"
+    )
+
+    async def chunks():
+        #  Тело приходит фрагментами, граница проходит внутри значения в кавычках
+        yield body[:60].encode()
+        yield body[60:].encode()
+
+    response = await test_client.post(
+        "/api/v1/books/import", content=chunks(), headers={**headers, "Content-Type": "text/csv"},
+    )
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["rows"], report["inserted"], report["updated"], report["failed"]) == (6, 3, 0, 3)
+    assert [error["line"] for error in report["errors"]] == [4, 5, 8]
+    assert report["errors"][0]["detail"].startswith("author")
+    assert report["errors"][1]["detail"] == "Published year can't be greater than current year"
+
+    batch = await test_client.post(
+        "/api/v1/books/batch", json={"isbns": [f"imp-{marker}-1", f"imp-{marker}-2"]}, headers=headers,
+    )
+    first, second = (item["item"] for item in batch.json())
+    assert first["description"] == 'Two-line\n"quoted" description' and first["quantity"] == 3
+    assert second["description"] == "Unknown" and second["quantity"] == 1
+    assert (await test_client.get(f"/api/v1/books/{first['id']}", headers=headers)).json()["published_at"] == 1999
+
+    ndjson = (
+        f'{{"name": "Renamed one", "author": "Tester", "isbn": "imp-{marker}-1", "quantity": 10}}\n'
+        f'{{"name": "Imported two", "author": "Tester", "isbn": "imp-{marker}-2"}}\n'
+        "not json\n"
+    )
+    response = await test_client.post(
+        "/api/v1/books/import", content=ndjson.encode(), headers={**headers, "Content-Type": "application/x-ndjson"},
+    )
+    report = response.json()
+    assert (report["rows"], report["inserted"], report["updated"], report["unchanged"], report["failed"]) == (3, 0, 1, 1, 1)
+    renamed = (await test_client.get(f"/api/v1/books/{first['id']}", headers=headers)).json()
+    assert renamed["name"] == "Renamed one" and renamed["quantity"] == 3
+    assert (await test_client.post("/api/v1/books/import", content=b"")).status_code == 401
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_readers_sync(test_client, token):
+    """
+    Проверка синхронизации списка читателей: upsert по email, отчет, деактивация отсутствующих и повторная активация.
+    """
+    headers = {
+        "Authorization": f"Bearer {token}"
+    }
+    marker = "".join(random.choices(string.ascii_lowercase, k=10))
+    target = await test_client.post(
+        "/api/v1/readers", json={"name": "Sync target", "email": f"sync_a_{marker}@mail.com"}, headers=headers,
+    )
+    kept = await test_client.post(
+        "/api/v1/readers", json={"name": "Sync kept", "email": f"sync_b_{marker}@mail.com"}, headers=headers,
+    )
+    target_id, kept_id = target.json()["id"], kept.json()["id"]
+
+    roster = (
+        "name,email\n"
+        f"Sync target,sync_a_{marker}@mail.com\n"
+        f"Sync old name,sync_b_{marker}@mail.com\n"
+        f"Sync renamed,sync_b_{marker}@mail.com\n"
+        f"Sync new,sync_c_{marker}@mail.com\n"
+        "Broken,not-an-email\n"
+    )
+    response = await test_client.post(
+        "/api/v1/readers/sync", content=roster.encode(), headers={**headers, "Content-Type": "text/csv"},
+    )
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["rows"], report["inserted"], report["updated"], report["unchanged"], report["failed"]) == (5, 1, 1, 2, 1)
+    assert report["deactivated"] == 0 and report["errors"][0]["line"] == 6
+    assert (await test_client.get(f"/api/v1/readers/{kept_id}", headers=headers)).json()["name"] == "Sync renamed"
+
+    #  Список - все активные читатели базы, кроме одного: деактивируется только он
+    async with DBConfigurer.Session() as session:
+        emails = (await session.scalars(select(Reader.email).where(Reader.is_active, Reader.id != target_id))).all()
+    ndjson = "".join(orjson.dumps({"name": email.split("@")[0], "email": email}).decode() + "\n" for email in emails)
+    response = await test_client.post(
+        "/api/v1/readers/sync", params={"deactivate_missing": "true", "format": "ndjson"},
+        content=ndjson.encode(), headers=headers,
+    )
+    assert response.status_code == 200
+    assert response.json()["deactivated"] == 1
+    reader = (await test_client.get(f"/api/v1/readers/{target_id}", headers=headers)).json()
+    assert reader["is_active"] is False
+
+    book = await test_client.post("/api/v1/books", json={"name": "Sync book", "author": "Tester"}, headers=headers)
+    served = await test_client.post(
+        "/api/v1/library/serve", params={"book_id": book.json()["id"], "reader_id": target_id}, headers=headers,
+    )
+    assert served.status_code == 400 and served.json()["detail"] == "Reader is not active"
+    batch = await test_client.post("/api/v1/readers/batch", json={"ids": [target_id]}, headers=headers)
+    assert batch.json()[0]["item"]["can_borrow"] is False
+
+    response = await test_client.post(
+        "/api/v1/readers/sync", content=f"name,email\nSync target,sync_a_{marker}@mail.com\n".encode(),
+        headers=headers,
+    )
+    assert response.json()["updated"] == 1
+    assert (await test_client.get(f"/api/v1/readers/{target_id}", headers=headers)).json()["is_active"] is True
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_books_export(test_client, token):
+    """
+    Проверка выгрузки каталога: NDJSON по id, gzip, снимок не видит изменений после начала выгрузки.
+    """
+    headers = {
+        "Authorization": f"Bearer {token}"
+    }
+    marker = "".join(random.choices(string.ascii_lowercase, k=10))
+    book = await test_client.post("/api/v1/books", json={"name": f"Export {marker}", "author": "Tester"}, headers=headers)
+    book_id = book.json()["id"]
+
+    response = await test_client.get("/api/v1/books/export", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert response.headers["x-export-as-of"]
+    items = [orjson.loads(line) for line in response.text.splitlines()]
+    ids = [item["id"] for item in items]
+    assert ids == sorted(ids) and len(ids) == len(set(ids))
+    assert {"id": book_id, "name": f"Export {marker}", "quantity": 1}.items() <= next(
+        item for item in items if item["id"] == book_id
+    ).items()
+
+    compressed = await test_client.get("/api/v1/books/export", params={"gzip": "true"}, headers=headers)
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert [orjson.loads(line)["id"] for line in compressed.text.splitlines()][:len(ids)] == ids
+
+    #  Книга, измененная после начала выгрузки, выгружается в состоянии на момент снимка
+    async with test_client.stream("GET", "/api/v1/books/export", headers=headers) as stream:
+        lines = stream.aiter_lines()
+        await anext(lines)
+        await test_client.patch(f"/api/v1/books/{book_id}", json={"name": f"Changed {marker}"}, headers=headers)
+        rest = [orjson.loads(line) async for line in lines if line]
+    if book_id in {item["id"] for item in rest}:
+        assert next(item for item in rest if item["id"] == book_id)["name"] == f"Export {marker}"
+    assert (await test_client.get("/api/v1/books/export")).status_code == 401
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_loans_export(test_client, token):
+    """
+    Проверка выгрузки истории выдач в Parquet и Arrow: фильтр по дате выдачи, неверный период, авторизация.
+    """
+    pa = pytest.importorskip("pyarrow")
+    pytest.importorskip("pyarrow.parquet")
+    pytest.importorskip("pyarrow.ipc")
+    headers = {
+        "Authorization": f"Bearer {token}"
+    }
+    marker = "".join(random.choices(string.ascii_lowercase, k=10))
+    book = await test_client.post("/api/v1/books", json={"name": f"Loan {marker}", "author": "Tester"}, headers=headers)
+    reader = await test_client.post(
+        "/api/v1/readers", json={"name": "Loan reader", "email": f"loan_{marker}@mail.com"}, headers=headers,
+    )
+    served = await test_client.post(
+        "/api/v1/library/serve", params={"book_id": book.json()["id"], "reader_id": reader.json()["id"]}, headers=headers,
+    )
+    loan = served.json()
+
+    period = {"borrowed_from": loan["borrow_date"]}
+    response = await test_client.get("/api/v1/library/loans/export", params=period, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.apache.parquet"
+    assert response.headers["x-export-as-of"]
+    table = pa.parquet.read_table(pa.BufferReader(response.content))
+    assert table.column_names == ["id", "book_id", "reader_id", "borrow_date", "return_date"]
+    rows = {row["id"]: row for row in table.to_pylist()}
+    assert rows[loan["id"]]["book_id"] == book.json()["id"]
+    assert rows[loan["id"]]["return_date"] is None
+
+    stream = await test_client.get("/api/v1/library/loans/export", params={**period, "format": "arrow"}, headers=headers)
+    assert stream.headers["content-type"] == "application/vnd.apache.arrow.stream"
+    assert pa.ipc.open_stream(stream.content).read_all().equals(table)
+
+    empty = await test_client.get(
+        "/api/v1/library/loans/export", params={"borrowed_to": "2000-01-01T00:00:00"}, headers=headers,
+    )
+    assert pa.parquet.read_table(pa.BufferReader(empty.content)).num_rows == 0
+
+    invalid = await test_client.get(
+        "/api/v1/library/loans/export", params={"borrowed_from": loan["borrow_date"], "borrowed_to": "2000-01-01T00:00:00"},
+        headers=headers,
+    )
+    assert invalid.status_code == 400
+
+    #  Моменты с поясом приводятся к UTC: ...Z - тот же момент, +03:00 - на три часа раньше выдачи
+    aware = await test_client.get(
+        "/api/v1/library/loans/export", params={"borrowed_from": loan["borrow_date"] + "Z"}, headers=headers,
+    )
+    assert aware.status_code == 200
+    assert loan["id"] in pa.parquet.read_table(pa.BufferReader(aware.content)).column("id").to_pylist()
+    shifted = await test_client.get(
+        "/api/v1/library/loans/export",
+        params={"borrowed_from": "2000-01-01T00:00:00", "borrowed_to": loan["borrow_date"] + "+03:00"},
+        headers=headers,
+    )
+    assert loan["id"] not in pa.parquet.read_table(pa.BufferReader(shifted.content)).column("id").to_pylist()
+    mixed = await test_client.get(
+        "/api/v1/library/loans/export",
+        params={"borrowed_from": loan["borrow_date"] + "Z", "borrowed_to": "2000-01-01T00:00:00"},
+        headers=headers,
+    )
+    assert mixed.status_code == 400
+    assert (await test_client.get("/api/v1/library/loans/export")).status_code == 401
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_loans_history(test_client, token):
+    """
+    Проверка постраничной истории выдач книги и читателя: порядок, курсор, фильтры, краткая история в /full.
+    """
+    headers = {
+        "Authorization": f"Bearer {token}"
+    }
+    marker = "".join(random.choices(string.ascii_lowercase, k=10))
+    book = await test_client.post(
+        "/api/v1/books", json={"name": f"History {marker}", "author": "Tester", "quantity": 3}, headers=headers,
+    )
+    book_id = book.json()["id"]
+    readers = [
+        (await test_client.post(
+            "/api/v1/readers", json={"name": "History reader", "email": f"history_{marker}_{n}@mail.com"}, headers=headers,
+        )).json()["id"]
+        for n in range(3)
+    ]
+    loans = []
+    for reader_id in (*readers, readers[0]):
+        if len(loans) == 3:
+            await test_client.post("/api/v1/library/return", params={"borrow_id": loans[0]["id"]}, headers=headers)
+        served = await test_client.post(
+            "/api/v1/library/serve", params={"book_id": book_id, "reader_id": reader_id}, headers=headers,
+        )
+        assert served.status_code == 201
+        loans.append(served.json())
+    newest_first = [loan["id"] for loan in reversed(loans)]
+
+    first = await test_client.get(f"/api/v1/books/{book_id}/loans", params={"size": 3}, headers=headers)
+    assert first.status_code == 200
+    assert [item["id"] for item in first.json()] == newest_first[:3]
+    second = await test_client.get(
+        f"/api/v1/books/{book_id}/loans", params={"size": 3, "cursor": first.headers["x-next-cursor"]}, headers=headers,
+    )
+    assert [item["id"] for item in second.json()] == newest_first[3:]
+    assert "x-next-cursor" not in second.headers
+
+    active = await test_client.get(f"/api/v1/books/{book_id}/loans", params={"status": "active"}, headers=headers)
+    assert [item["id"] for item in active.json()] == newest_first[:3]
+    returned = await test_client.get(f"/api/v1/books/{book_id}/loans", params={"status": "returned"}, headers=headers)
+    assert [item["id"] for item in returned.json()] == [loans[0]["id"]]
+    period = await test_client.get(
+        f"/api/v1/books/{book_id}/loans",
+        params={"borrowed_from": loans[1]["borrow_date"], "borrowed_to": loans[3]["borrow_date"]},
+        headers=headers,
+    )
+    assert [item["id"] for item in period.json()] == [loans[2]["id"], loans[1]["id"]]
+    #  Границы с поясом (...Z, в том числе вместе с границей без пояса) - те же моменты в UTC
+    for borrowed_to in (loans[3]["borrow_date"] + "Z", loans[3]["borrow_date"]):
+        aware = await test_client.get(
+            f"/api/v1/books/{book_id}/loans",
+            params={"borrowed_from": loans[1]["borrow_date"] + "Z", "borrowed_to": borrowed_to},
+            headers=headers,
+        )
+        assert aware.status_code == 200
+        assert [item["id"] for item in aware.json()] == [loans[2]["id"], loans[1]["id"]]
+    reader_aware = await test_client.get(
+        f"/api/v1/readers/{readers[0]}/loans", params={"borrowed_to": loans[3]["borrow_date"] + "Z"}, headers=headers,
+    )
+    assert [item["id"] for item in reader_aware.json()] == [loans[0]["id"]]
+
+    reader_loans = await test_client.get(f"/api/v1/readers/{readers[0]}/loans", headers=headers)
+    assert [item["id"] for item in reader_loans.json()] == [loans[3]["id"], loans[0]["id"]]
+
+    full = (await test_client.get(f"/api/v1/books/{book_id}/full", params={"history_limit": 1}, headers=headers)).json()
+    assert [item["id"] for item in full["borrowed_books"]] == newest_first[:1]
+    assert full["borrowed_total"] == 4
+    reader_full = (await test_client.get(f"/api/v1/readers/{readers[0]}/full", headers=headers)).json()
+    assert reader_full["borrowed_total"] == 2 and len(reader_full["borrowed_books"]) == 2
+
+    invalid = await test_client.get(f"/api/v1/books/{book_id}/loans", params={"cursor": "broken"}, headers=headers)
+    assert invalid.status_code == 400
+    reversed_period = await test_client.get(
+        f"/api/v1/readers/{readers[0]}/loans",
+        params={"borrowed_from": loans[3]["borrow_date"], "borrowed_to": loans[0]["borrow_date"]},
+        headers=headers,
+    )
+    assert reversed_period.status_code == 400
+    assert (await test_client.get("/api/v1/books/0/loans", headers=headers)).status_code == 404
+    assert (await test_client.get("/api/v1/readers/0/loans", headers=headers)).status_code == 404
+    assert (await test_client.get(f"/api/v1/books/{book_id}/loans")).status_code == 401
@@ -0,0 +1,91 @@
+import asyncio
+import uuid
+
+import pytest
+
+from src.core.settings import settings
+
+from .fixtures import *
+
+CONCURRENT_REQUESTS = 200
+
+
+async def create_reader(test_client, headers) -> int:
+    response = await test_client.post(
+        "/api/v1/readers",
+        json={"name": "Stress reader", "email": f"{uuid.uuid4().hex}@mail.com"},
+        headers=headers,
+    )
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+async def create_book(test_client, headers, quantity: int) -> int:
+    response = await test_client.post(
+        "/api/v1/books",
+        json={"name": "Stress book", "author": "Tester", "quantity": quantity},
+        headers=headers,
+    )
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+async def serve_concurrently(test_client, headers, pairs):
+    responses = await asyncio.gather(*(
+        test_client.post(
+            "/api/v1/library/serve",
+            params={"book_id": book_id, "reader_id": reader_id},
+            headers=headers,
+        ) for book_id, reader_id in pairs
+    ))
+    return [response.status_code for response in responses]
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_serve_concurrent_reader_limit(test_client, token):
+    """
+    Сотни одновременных выдач разных книг одному читателю: на руках оказывается ровно
+    READERS_MAX_ITEMS_AT_ONCE книг, остальные запросы отклоняются.
+    """
+    headers = {
+        "Authorization": f"Bearer {token}"
+    }
+    reader_id = await create_reader(test_client, headers)
+    book_ids = [await create_book(test_client, headers, quantity=CONCURRENT_REQUESTS) for _ in range(10)]
+
+    statuses = await serve_concurrently(
+        test_client,
+        headers,
+        [(book_ids[i % len(book_ids)], reader_id) for i in range(CONCURRENT_REQUESTS)],
+    )
+
+    assert set(statuses) <= {201, 400}
+    assert statuses.count(201) == settings.reader.READERS_MAX_ITEMS_AT_ONCE
+
+    response = await test_client.get(f"/api/v1/library/info/{reader_id}", headers=headers)
+    assert len(response.json()) == settings.reader.READERS_MAX_ITEMS_AT_ONCE
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_serve_concurrent_same_book(test_client, token):
+    """
+    Сотни одновременных выдач одной и той же книги одному читателю: выдается ровно один экземпляр,
+    остаток уменьшается ровно на 1.
+    """
+    headers = {
+        "Authorization": f"Bearer {token}"
+    }
+    reader_id = await create_reader(test_client, headers)
+    book_id = await create_book(test_client, headers, quantity=CONCURRENT_REQUESTS)
+
+    statuses = await serve_concurrently(
+        test_client,
+        headers,
+        [(book_id, reader_id)] * CONCURRENT_REQUESTS,
+    )
+
+    assert set(statuses) <= {201, 400}
+    assert statuses.count(201) == 1
+
+    response = await test_client.get(f"/api/v1/books/{book_id}", headers=headers)
+    assert response.json()["quantity"] == CONCURRENT_REQUESTS - 1
@@ -0,0 +1,55 @@
+import sys
+from datetime import datetime
+
+import pytest
+
+from src.tools.columnar_stream import ColumnarStream
+from src.tools.exceptions import CustomException
+
+
+COLUMNS = {"id": "int64", "borrow_date": "timestamp[us]", "return_date": "timestamp[us]"}
+
+
+async def batches(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("format", ColumnarStream.FORMATS)
+async def test_columnar_stream_writes_batch_per_rows(format):
+    """Проверка, что CSV режется на пачки по строкам независимо от границ фрагментов и читается pyarrow целиком"""
+
+    pa = pytest.importorskip("pyarrow")
+    pytest.importorskip("pyarrow.parquet")
+    moment = datetime(2024, 5, 1, 12, 30)
+    csv = b"1,2024-05-01 12:30:00,\n2,2024-05-01 12:30:00,2024-05-01 12:30:00\n3,2024-05-01 12:30:00,\n"
+    chunks = [
+        chunk async for chunk in ColumnarStream.write(
+            batches(csv[:10], csv[10:70], csv[70:]), COLUMNS, format, batch_size=2,
+        )
+    ]
+    assert len(chunks) == 3
+
+    data = b"".join(chunks)
+    if format == "parquet":
+        parquet = pa.parquet.ParquetFile(pa.BufferReader(data))
+        assert parquet.metadata.num_row_groups == 2
+        table = parquet.read()
+    else:
+        table = pa.ipc.open_stream(data).read_all()
+    assert table.schema.names == list(COLUMNS)
+    assert table.to_pylist() == [
+        {"id": 1, "borrow_date": moment, "return_date": None},
+        {"id": 2, "borrow_date": moment, "return_date": moment},
+        {"id": 3, "borrow_date": moment, "return_date": None},
+    ]
+
+
+def test_columnar_stream_without_pyarrow(monkeypatch):
+    """Проверка, что без pyarrow формат недоступен с ошибкой 501, а не ImportError"""
+
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    with pytest.raises(CustomException) as exc:
+        ColumnarStream.get_arrow("parquet")
+    assert exc.value.status_code == 501
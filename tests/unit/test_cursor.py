@@ -0,0 +1,26 @@
+import pytest
+
+from src.tools.cursor import Cursor
+from src.tools.exceptions import CustomException
+
+
+def test_cursor_decode_id():
+    """Проверка, что курсор списка по id возвращает id последней записи"""
+
+    assert Cursor.decode_id(Cursor.encode(42)) == 42
+
+
+@pytest.mark.parametrize("value", ["42", 4.2, {"id": 42}, [42], None, True])
+def test_cursor_decode_id_wrong_type(value):
+    """Проверка, что корректно закодированный курсор со значением не того типа - ошибка курсора"""
+
+    with pytest.raises(CustomException):
+        Cursor.decode_id(Cursor.encode(value))
+
+
+@pytest.mark.parametrize("cursor", ["", "not-base64!", Cursor.encode(1, 2)])
+def test_cursor_decode_id_malformed(cursor):
+    """Проверка, что поврежденный курсор или курсор другой длины - ошибка курсора"""
+
+    with pytest.raises(CustomException):
+        Cursor.decode_id(cursor)
@@ -0,0 +1,145 @@
+import asyncio
+from unittest.mock import MagicMock, AsyncMock
+
+import pytest
+from sqlalchemy.orm import Session
+
+from src.api.v1.books.repository import BookRepository
+from src.core.cache import EntityCache, MemoryCacheBackend
+from src.core.config import CacheConfigurer
+from src.core.models import Book
+from src.tools.data_loader import DataLoader
+from src.tools.exceptions import CustomException
+
+from .fixtures import *
+
+
+@pytest.mark.asyncio
+async def test_data_loader_batches_one_tick():
+    """Проверка, что ключи, запрошенные за один проход цикла событий, загружаются одним вызовом и запоминаются"""
+
+    batch_load = AsyncMock(side_effect=lambda keys: {key: key * 10 for key in keys if key != 3})
+    loader = DataLoader(batch_load)
+
+    assert await asyncio.gather(loader.load(1), loader.load(2), loader.load(1), loader.load(3)) == [10, 20, 10, None]
+    batch_load.assert_awaited_once_with([1, 2, 3])
+
+    assert await loader.load_many([2, 4]) == [20, 40]
+    assert batch_load.await_args.args == ([4],)
+    assert loader.batches == 2
+
+
+@pytest.mark.asyncio
+async def test_data_loader_does_not_memoise_errors():
+    """Проверка, что ошибку загрузки получают все ожидающие, а следующий load повторяет запрос"""
+
+    batch_load = AsyncMock(side_effect=[RuntimeError("db is down"), {1: "one"}])
+    loader = DataLoader(batch_load)
+
+    results = await asyncio.gather(loader.load(1), loader.load(1), return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert await loader.load(1) == "one"
+    assert batch_load.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_data_loader_scoped_to_session():
+    """Проверка, что загрузчики одной сессии общие и не выполняют запросы одновременно"""
+
+    running, overlapped = 0, False
+
+    async def batch_load(keys):
+        nonlocal running, overlapped
+        running += 1
+        overlapped = overlapped or running > 1
+        await asyncio.sleep(0.01)
+        running -= 1
+        return {key: key for key in keys}
+
+    session, other = MagicMock(info={}), MagicMock(info={})
+    books = DataLoader.of(session, "books", batch_load)
+    readers = DataLoader.of(session, "readers", batch_load)
+
+    assert DataLoader.of(session, "books", batch_load) is books
+    assert DataLoader.of(other, "books", batch_load) is not books
+    assert await asyncio.gather(books.load(1), readers.load(2)) == [1, 2]
+    assert not overlapped
+
+
+@pytest.mark.asyncio
+async def test_data_loader_cleared_on_rollback():
+    """Проверка, что после ROLLBACK сессии запомненные загрузчиком объекты не возвращаются"""
+
+    batch_load = AsyncMock(side_effect=lambda keys: {key: object() for key in keys})
+    session = Session()
+    session.begin()
+    stale = await DataLoader.of(session, "books", batch_load).load(1)
+    session.rollback()
+
+    fresh = await DataLoader.of(session, "books", batch_load).load(1)
+    assert fresh is not stale
+    assert batch_load.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_book_repository_get_one_batched():
+    """Проверка, что get_one из разных зависимостей одного запроса выполняет один запрос id IN (...)"""
+
+    result = MagicMock()
+    result.mappings.return_value = [
+        {"id": 1, "name": "First", "author": "Tester", "quantity": 1},
+        {"id": 2, "name": "Second", "author": "Tester", "quantity": 0},
+    ]
+    session = MagicMock(info={})
+    session.execute = AsyncMock(return_value=result)
+    session.merge = AsyncMock(side_effect=lambda orm_model, load: orm_model)
+
+    entities = CacheConfigurer.entities
+    CacheConfigurer.entities = EntityCache(
+        backend=MemoryCacheBackend(ttl=60, max_size=10), negative_ttl=10, channel="test_cache_invalidation"
+    )
+    try:
+        first, second, missing = await asyncio.gather(
+            BookRepository(session=session).get_one(1),
+            BookRepository(session=session).get_one(2),
+            BookRepository(session=session).get_one(3),
+            return_exceptions=True,
+        )
+        again = await BookRepository(session=session).get_one(1)
+    finally:
+        CacheConfigurer.entities = entities
+
+    assert (first.name, second.name) == ("First", "Second")
+    assert again is first
+    assert isinstance(missing, CustomException) and missing.status_code == 404
+    assert session.execute.await_count == 1
+    assert isinstance(first, Book)
+
+
+@pytest.mark.asyncio
+async def test_book_repository_get_many_by_id_batched():
+    """Проверка, что пакетный поиск по id - один запрос id IN (...), а найденные книги доступны get_one без запросов"""
+
+    result = MagicMock()
+    result.mappings.return_value = [
+        {"id": 1, "name": "First", "author": "Tester", "quantity": 1},
+        {"id": 2, "name": "Second", "author": "Tester", "quantity": 0},
+    ]
+    session = MagicMock(info={})
+    session.execute = AsyncMock(return_value=result)
+    session.merge = AsyncMock(side_effect=lambda orm_model, load: orm_model)
+
+    entities = CacheConfigurer.entities
+    CacheConfigurer.entities = EntityCache(
+        backend=MemoryCacheBackend(ttl=60, max_size=10), negative_ttl=10, channel="test_cache_invalidation"
+    )
+    try:
+        repository = BookRepository(session=session)
+        found = await repository.get_many(keys=[2, 1, 2, 3])
+        again = await repository.get_one(1)
+    finally:
+        CacheConfigurer.entities = entities
+
+    assert [orm_model.name for orm_model in found] == ["Second", "First"]
+    assert again is found[1]
+    assert session.execute.await_count == 1
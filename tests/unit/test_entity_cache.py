@@ -0,0 +1,118 @@
+from unittest.mock import MagicMock, AsyncMock, patch
+
+import pytest
+
+from src.core.cache import EntityCache, MemoryCacheBackend, ModelQueryCache, MISSING
+from src.core.models import Book, Reader
+
+from .fixtures import *
+
+
+def make_result(values):
+    # Результат Core-запроса по первичному ключу
+    result = MagicMock()
+    result.mappings.return_value.one_or_none.return_value = values
+    return result
+
+
+@pytest.fixture
+def mock_cache_session():
+    # Сессия: execute читает строку из "базы", merge возвращает присоединяемый объект
+    session = MagicMock()
+    session.execute = AsyncMock(
+        return_value=make_result({"id": 1, "name": "Cached", "author": "Tester", "quantity": 5})
+    )
+    session.merge = AsyncMock(side_effect=lambda orm_model, load: orm_model)
+    return session
+
+
+@pytest.mark.asyncio
+async def test_entity_cache_read_through(
+        mock_cache_session,
+):
+    """Проверка, что повторное чтение берется из кеша и присоединяется к сессии без запроса к базе"""
+
+    cache = EntityCache(backend=MemoryCacheBackend(ttl=60, max_size=10), negative_ttl=10, channel="test_cache_invalidation")
+
+    first = await cache.get(mock_cache_session, Book, 1)
+    second = await cache.get(mock_cache_session, Book, 1)
+
+    assert mock_cache_session.execute.await_count == 1
+    assert mock_cache_session.merge.await_count == 2
+    assert mock_cache_session.merge.await_args.kwargs["load"] is False
+    assert (second.id, second.name) == (first.id, first.name)
+    assert (cache.backend.hits, cache.backend.misses) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_entity_cache_negative_lookup(
+        mock_cache_session,
+):
+    """Проверка, что отсутствие записи кешируется и сбрасывается инвалидацией"""
+
+    mock_cache_session.execute = AsyncMock(return_value=make_result(None))
+    cache = EntityCache(backend=MemoryCacheBackend(ttl=60, max_size=10), negative_ttl=10, channel="test_cache_invalidation")
+
+    assert await cache.get(mock_cache_session, Book, 1) is None
+    assert await cache.get(mock_cache_session, Book, 1) is None
+    assert mock_cache_session.execute.await_count == 1
+    assert cache.negative_hits == 1
+
+    await cache.invalidate(Book, 1)
+    assert await cache.get(mock_cache_session, Book, 1) is None
+    assert mock_cache_session.execute.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_entity_cache_skips_store_after_invalidation(
+        mock_cache_session,
+):
+    """Проверка, что значение, прочитанное до конкурентной инвалидации, не попадает в кеш"""
+
+    cache = EntityCache(backend=MemoryCacheBackend(ttl=60, max_size=10), negative_ttl=10, channel="test_cache_invalidation")
+    result = mock_cache_session.execute.return_value
+
+    async def execute_with_concurrent_edit(stmt):
+        await cache.invalidate(Book, 1)
+        return result
+
+    mock_cache_session.execute = AsyncMock(side_effect=execute_with_concurrent_edit)
+    await cache.get(mock_cache_session, Book, 1)
+
+    assert await cache.backend.get(cache.get_key(Book, 1)) is MISSING
+
+
+@pytest.mark.asyncio
+async def test_memory_backend_lru_and_ttl():
+    """Проверка вытеснения давно не читавшегося ключа и истечения TTL"""
+
+    backend = MemoryCacheBackend(ttl=60, max_size=2)
+    with patch("src.core.cache.backends.time.monotonic", return_value=0):
+        await backend.set("a", 1)
+        await backend.set("b", 2)
+        assert await backend.get("a") == 1
+        await backend.set("c", 3)
+        assert await backend.get("b") is MISSING
+    with patch("src.core.cache.backends.time.monotonic", return_value=61):
+        assert await backend.get("a") is MISSING
+
+    assert backend.evictions == 2
+    assert (await backend.stats())["size"] == 1
+
+
+@pytest.mark.asyncio
+async def test_query_cache_invalidated_by_model_writes():
+    """Проверка, что результаты запросов сбрасываются изменением строки своей модели и не сбрасываются чужой"""
+
+    cache = EntityCache(backend=MemoryCacheBackend(ttl=60, max_size=10), negative_ttl=10, channel="test_cache_invalidation")
+    queries = ModelQueryCache(model=Book, cache=cache, ttl=60, max_size=10)
+    compute = AsyncMock(side_effect=[1, 2, 3])
+
+    assert await queries.get_or_compute("filter", compute) == 1
+    assert await queries.get_or_compute("filter", compute) == 1
+    await cache.invalidate(Reader, 1)
+    assert await queries.get_or_compute("filter", compute) == 1
+    await cache.invalidate(Book, 1)
+    assert await queries.get_or_compute("filter", compute) == 2
+    await cache.clear()
+    assert await queries.get_or_compute("filter", compute) == 3
@@ -9,6 +9,7 @@ from fastapi.responses import ORJSONResponse
 from src.api.v1.library.service import LibraryService
 from src.api.v1.library.exceptions import Errors
 from src.core.models import BorrowedBook
+from src.tools.exceptions import CustomException
 
 from .fixtures import *
 
@@ -23,7 +24,7 @@ async def test_borrow_one_below_limit(
 
     # Мокирование репозитория для возврата обновленного экземпляра
     mock_repo = MagicMock()
-    mock_repo.create_one = AsyncMock(
+    mock_repo.borrow_one = AsyncMock(
         return_value=BorrowedBook(
             book_id=mock_book_q5.id,
             reader_id=mock_reader.id,
@@ -37,8 +38,8 @@ async def test_borrow_one_below_limit(
             session=mock_session
         )
         response = await service.borrow_one(
-            book=mock_book_q5,
-            reader=mock_reader
+            book_id=mock_book_q5.id,
+            reader_id=mock_reader.id
         )
 
     assert isinstance(response, BorrowedBook)
@@ -56,14 +57,22 @@ async def test_borrow_one_limit_reached(
         mock_reader_limit,
 ):
     """Проверка, если читатель достиг лимита, но книга есть в наличии"""
-    service: LibraryService = LibraryService(
-        session=mock_session
-    )
-    response = await service.borrow_one(
-        book=mock_book_q5,
-        reader=mock_reader_limit
+
+    # Условный UPDATE остатка не прошел проверку лимита книг "на руках"
+    mock_repo = MagicMock()
+    mock_repo.borrow_one = AsyncMock(
+        side_effect=CustomException(msg=Errors.LIMIT_REACHED())
     )
 
+    with patch('src.api.v1.library.service.LibraryRepository', return_value=mock_repo):
+        service: LibraryService = LibraryService(
+            session=mock_session
+        )
+        response = await service.borrow_one(
+            book_id=mock_book_q5.id,
+            reader_id=mock_reader_limit.id
+        )
+
     assert isinstance(response, ORJSONResponse)
     assert response.status_code == 400
     assert json.loads(response.body.decode()) == {
@@ -79,14 +88,22 @@ async def test_borrow_not_enough_quantity(
         mock_book_q0
 ):
     """Проверка, если книги нет в наличии (количество книг на руках читателя не важно)"""
-    service: LibraryService = LibraryService(
-        session=mock_session
-    )
-    response = await service.borrow_one(
-        book=mock_book_q0,
-        reader=mock_reader
+
+    # Условный UPDATE остатка не вернул строку - репозиторий сообщает о нехватке экземпляров
+    mock_repo = MagicMock()
+    mock_repo.borrow_one = AsyncMock(
+        side_effect=CustomException(msg=Errors.NOT_ENOUGH_QUANTITY())
     )
 
+    with patch('src.api.v1.library.service.LibraryRepository', return_value=mock_repo):
+        service: LibraryService = LibraryService(
+            session=mock_session
+        )
+        response = await service.borrow_one(
+            book_id=mock_book_q0.id,
+            reader_id=mock_reader.id
+        )
+
     assert isinstance(response, ORJSONResponse)
     assert response.status_code == 400
     assert json.loads(response.body.decode()) == {
@@ -103,14 +120,22 @@ async def test_borrow_one_with_book_on_hands(
 ):
     """Проверка, если читатель не достиг лимита, книга есть в наличии,
     но такая кинга у него уже есть на руках"""
-    service: LibraryService = LibraryService(
-        session=mock_session
-    )
-    response = await service.borrow_one(
-        book=mock_book_q5,
-        reader=mock_reader_with_1
+
+    # INSERT выдачи нарушил частичный уникальный индекс (reader_id, book_id)
+    mock_repo = MagicMock()
+    mock_repo.borrow_one = AsyncMock(
+        side_effect=CustomException(msg=Errors.SIMILAR_EXISTS())
     )
 
+    with patch('src.api.v1.library.service.LibraryRepository', return_value=mock_repo):
+        service: LibraryService = LibraryService(
+            session=mock_session
+        )
+        response = await service.borrow_one(
+            book_id=mock_book_q5.id,
+            reader_id=mock_reader_with_1.id
+        )
+
     assert isinstance(response, ORJSONResponse)
     assert response.status_code == 400
     assert json.loads(response.body.decode()) == {
@@ -130,7 +155,7 @@ async def test_borrow_one_without_book_on_hands(
 
     # Мокирование репозитория для возврата обновленного экземпляра
     mock_repo = MagicMock()
-    mock_repo.create_one = AsyncMock(
+    mock_repo.borrow_one = AsyncMock(
         return_value=BorrowedBook(
             book_id=mock_book_q5.id,
             reader_id=mock_reader_without_1.id,
@@ -144,8 +169,8 @@ async def test_borrow_one_without_book_on_hands(
             session=mock_session
         )
         response = await service.borrow_one(
-            book=mock_book_q5,
-            reader=mock_reader_without_1
+            book_id=mock_book_q5.id,
+            reader_id=mock_reader_without_1.id
         )
 
     assert isinstance(response, BorrowedBook)
@@ -162,13 +187,21 @@ async def test_return_one_already_returned(
         mock_borrowed_book_returned,
 ):
     """Проверка попытки возврата уже возвращенной книги"""
-    service: LibraryService = LibraryService(
-        session=mock_session
-    )
-    response = await service.return_one(
-        orm_model=mock_borrowed_book_returned
+
+    # Условный UPDATE выдачи не вернул строку - выдача уже закрыта
+    mock_repo = MagicMock()
+    mock_repo.return_one = AsyncMock(
+        side_effect=CustomException(msg=Errors.INVALID_OPERATION())
     )
 
+    with patch('src.api.v1.library.service.LibraryRepository', return_value=mock_repo):
+        service: LibraryService = LibraryService(
+            session=mock_session
+        )
+        response = await service.return_one(
+            id=mock_borrowed_book_returned.id
+        )
+
     assert isinstance(response, ORJSONResponse)
     assert response.status_code == 400
     assert json.loads(response.body.decode()) == {
@@ -186,7 +219,7 @@ async def test_return_one_not_returned(
 
     # Мокирование репозитория для возврата обновленного экземпляра
     mock_repo = MagicMock()
-    mock_repo.save = AsyncMock(
+    mock_repo.return_one = AsyncMock(
         return_value=BorrowedBook(
             id=mock_borrowed_book.id,
             book_id=mock_borrowed_book.book_id,
@@ -201,7 +234,7 @@ async def test_return_one_not_returned(
             session=mock_session
         )
         response = await service.return_one(
-            orm_model=mock_borrowed_book
+            id=mock_borrowed_book.id
         )
 
     assert isinstance(response, BorrowedBook)
@@ -0,0 +1,27 @@
+from src.core.cache import PrefixIndex
+
+
+def test_prefix_index_search():
+    """Проверка поиска по префиксу без учета регистра, с лимитом и без дублей"""
+
+    index = PrefixIndex(["Война и мир", "война и мир", "Вой", "Master", "master class", "Mastery", "Map", None, ""])
+
+    assert index.search("вой", 10) == ["Вой", "Война и мир", "война и мир"]
+    assert index.search("MAST", 2) == ["Master", "master class"]
+    assert index.search("x", 10) == []
+    assert len(index) == 7
+
+
+def test_prefix_index_add_remove():
+    """Проверка, что значение пропадает из индекса только с последней строкой, в которой оно встречается"""
+
+    index = PrefixIndex(["Atlas", "Atlas", "Atlantis"])
+
+    index.remove("Atlas")
+    assert index.search("atl", 10) == ["Atlantis", "Atlas"]
+    index.remove("Atlas")
+    assert index.search("atl", 10) == ["Atlantis"]
+    index.remove("Atlas")
+    index.add("atlas")
+    index.add("Atlas")
+    assert sorted(index.search("atlas", 10)) == ["Atlas", "atlas"]
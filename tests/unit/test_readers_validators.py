@@ -0,0 +1,34 @@
+import pytest
+from pydantic import ValidationError
+
+from src.api.v1.readers.schemas import ReaderCreate, ReaderSyncItem
+
+from .fixtures import *
+
+
+def validated_email(schema, email):
+    try:
+        return schema.model_validate({"name": "Reader", "email": email}).email
+    except ValidationError as exc:
+        return exc.errors()[0]["msg"]
+
+
+@pytest.mark.parametrize("email", [
+    "reader@mail.com",
+    "First.Last+tag@Mail.COM",
+    "reader@localhost",
+    "reader@example.test",
+    "double..dot@mail.com",
+    "reader@-mail.com",
+    "reader@mail..com",
+    "reader@1.2.3.4",
+    "тест@почта.рф",
+    "Reader Name <reader@mail.com>",
+    " reader@mail.com",
+    "a" * 65 + "@mail.com",
+    "a@" + "b" * 250 + ".com",
+])
+def test_sync_email_matches_email_str(email):
+    """Проверка, что быстрая проверка email списка синхронизации дает тот же результат и ошибки, что и EmailStr"""
+
+    assert validated_email(ReaderSyncItem, email) == validated_email(ReaderCreate, email)
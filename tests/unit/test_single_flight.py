@@ -0,0 +1,91 @@
+import asyncio
+from unittest.mock import MagicMock, AsyncMock
+
+import pytest
+
+from src.core.cache import EntityCache, MemoryCacheBackend, SingleFlight
+from src.core.models import Book
+
+from .fixtures import *
+
+
+@pytest.mark.asyncio
+async def test_single_flight_coalesces_concurrent_calls():
+    """Проверка, что одновременные загрузки одного ключа выполняются один раз, а ошибка передается всем"""
+
+    flight = SingleFlight("test")
+    release = asyncio.Event()
+
+    async def load():
+        return await release.wait()
+
+    calls = [asyncio.create_task(flight.do("book:1", load)) for _ in range(5)]
+    await asyncio.sleep(0)
+    assert flight.stats()["in_flight"] == 1
+    release.set()
+    assert await asyncio.gather(*calls) == [True] * 5
+    assert flight.stats()["executions"] == 1
+
+    async def failing():
+        await asyncio.sleep(0)
+        raise RuntimeError("db is down")
+
+    results = await asyncio.gather(*(flight.do("book:1", failing) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+    stats = flight.stats()
+    assert (stats["calls"], stats["executions"], stats["coalesced"], stats["errors"]) == (8, 2, 6, 1)
+    assert stats["coalescing_ratio"] == 0.75 and stats["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_single_flight_leader_cancelled():
+    """Проверка, что при отмене запроса-лидера ожидающие загружают сами, а не получают CancelledError"""
+
+    flight = SingleFlight("test")
+    started = asyncio.Event()
+
+    async def slow():
+        started.set()
+        await asyncio.sleep(10)
+
+    leader = asyncio.create_task(flight.do("book:1", slow))
+    await started.wait()
+    follower = asyncio.create_task(flight.do("book:1", AsyncMock(return_value="loaded")))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    assert await follower == "loaded"
+    assert flight.stats()["coalesced"] == 0
+
+
+@pytest.mark.asyncio
+async def test_entity_cache_coalesces_misses():
+    """Проверка, что одновременные промахи кеша по одной книге читаются одним запросом, но не после инвалидации"""
+
+    cache = EntityCache(backend=MemoryCacheBackend(ttl=60, max_size=10), negative_ttl=10, channel="test_cache_invalidation")
+    release = asyncio.Event()
+
+    async def execute(stmt):
+        await release.wait()
+        row = {"id": 1, "name": "Hot", "author": "Tester", "quantity": 1}
+        result = MagicMock()
+        result.mappings.return_value.__iter__.side_effect = lambda: iter([row])
+        result.mappings.return_value.one_or_none.return_value = row
+        return result
+
+    session = MagicMock()
+    session.execute = AsyncMock(side_effect=execute)
+
+    calls = [asyncio.create_task(cache.get_values(session, Book, 1)) for _ in range(3)]
+    calls.append(asyncio.create_task(cache.get_many_values(session, Book, [1])))
+    await asyncio.sleep(0)
+    await cache.invalidate(Book, 2)
+    calls.append(asyncio.create_task(cache.get_values(session, Book, 1)))
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*calls)
+
+    assert [result["name"] for result in results[:3]] == ["Hot"] * 3
+    assert results[3][1]["name"] == "Hot"
+    assert session.execute.await_count == 2